@@ -9,7 +9,7 @@ setup(
     author='Ben Longbons',
     author_email='b.r.longbons@gmail.com',
     url='https://github.com/o11c/python-vterm',
-    packages=['vterm', 'vterm.backports'],
+    packages=['vterm', 'vterm.backports', 'vterm.bench'],
     setup_requires=['cffi'],
     install_requires=['cffi'],
     cffi_modules=['vterm/_c_build.py:ffibuilder']
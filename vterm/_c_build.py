@@ -399,15 +399,112 @@ extern "Python" {
 }
 ''')
 ffibuilder.cdef('''
+#define VTERM_PY_ATTR_BOLD_SHIFT ...
+#define VTERM_PY_ATTR_UNDERLINE_SHIFT ...
+#define VTERM_PY_ATTR_ITALIC_SHIFT ...
+#define VTERM_PY_ATTR_BLINK_SHIFT ...
+#define VTERM_PY_ATTR_REVERSE_SHIFT ...
+#define VTERM_PY_ATTR_STRIKE_SHIFT ...
+#define VTERM_PY_ATTR_FONT_SHIFT ...
+#define VTERM_PY_ATTR_DWL_SHIFT ...
+#define VTERM_PY_ATTR_DHL_SHIFT ...
+uint16_t vterm_py_cell_attrs(const VTermScreenCell *cell);
+void vterm_py_screen_snapshot(const VTermScreen *screen, VTermRect rect, uint32_t *chars, int8_t *width, uint16_t *attrs, uint8_t *fg, uint8_t *bg);
+void vterm_py_screen_copy_rect(const VTermScreen *screen, VTermRect rect, size_t stride, uint32_t *chars, int8_t *width, uint16_t *attrs, uint8_t *fg, uint8_t *bg);
+size_t vterm_py_screen_get_lines(const VTermScreen *screen, int start_row, int end_row, int cols, unsigned char *dirty, uint32_t *chars, size_t *lengths, unsigned char *continued);
+''')
+ffibuilder.cdef('''
+uint64_t vterm_py_cell_style(const VTermScreenCell *cell);
+void vterm_py_cell_set_style(VTermScreenCell *cell, uint64_t style);
+int vterm_py_line_encode(const VTermScreenCell *cells, int ncells, uint32_t *run_lens, uint64_t *run_styles, int *nruns, uint32_t *chars, size_t *nchars, int *simple, uint64_t *fill_style);
+void vterm_py_line_decode(VTermScreenCell *cells, int ncells, int nkept, const uint32_t *run_lens, const uint64_t *run_styles, int nruns, const uint32_t *chars, int simple, uint64_t fill_style);
+size_t vterm_py_chars_len(const void *chars, size_t max_len);
+size_t vterm_py_screen_get_spans(const VTermScreen *screen, VTermRect rect, int *row_nruns, int *run_cols, uint64_t *run_styles, size_t *run_nchars, uint32_t *chars);
+''')
+ffibuilder.cdef('''
+void vterm_py_trigram_bloom(const unsigned char *text, size_t len, uint8_t *bits, unsigned nbits_log2);
+''')
+ffibuilder.cdef('''
+typedef enum {
+  VTERM_PY_EVENT_PUTGLYPH = 1,
+  VTERM_PY_EVENT_MOVECURSOR,
+  VTERM_PY_EVENT_SCROLLRECT,
+  VTERM_PY_EVENT_MOVERECT,
+  VTERM_PY_EVENT_ERASE,
+  VTERM_PY_EVENT_INITPEN,
+  VTERM_PY_EVENT_SETPENATTR,
+  VTERM_PY_EVENT_SETTERMPROP,
+  VTERM_PY_EVENT_BELL,
+  VTERM_PY_EVENT_RESIZE,
+  VTERM_PY_EVENT_SETLINEINFO,
+  VTERM_PY_EVENT_DAMAGE,
+} VTermPyEventType;
+#define VTERM_PY_MAX_EVENT_ARGS 11
+typedef struct {
+  int type;
+  int32_t args[VTERM_PY_MAX_EVENT_ARGS];
+} VTermPyEvent;
+typedef struct {
+  VTermPyEvent *events;
+  size_t capacity;
+  size_t count;
+  size_t lost;
+  void (*full)(void *user);
+  void *full_user;
+  const VTermStateCallbacks *state_fallback;
+  const VTermScreenCallbacks *screen_fallback;
+  void *fallback_user;
+} VTermPyEventBatch;
+const VTermStateCallbacks *vterm_py_batch_state_callbacks(void);
+const VTermScreenCallbacks *vterm_py_batch_screen_callbacks(void);
+''')
+ffibuilder.cdef('''
+extern "Python" {
+  void cb_batch_full(void *user);
+}
+''')
+ffibuilder.cdef('''
+typedef struct {
+  const VTermScreenCallbacks *next;
+  void *next_user;
+  int damaged;
+  unsigned char *dirty_rows;
+  int dirty_rows_len;
+  VTermScreenCallbacks callbacks;
+} VTermPyDamageTap;
+void vterm_py_damage_tap_set_next(VTermPyDamageTap *tap, const VTermScreenCallbacks *next, void *next_user);
+const VTermScreenCallbacks *vterm_py_damage_tap_callbacks(VTermPyDamageTap *tap);
+typedef struct {
+  size_t bytes_read;
+  size_t bytes_written;
+  size_t output_pending;
+  int eof;
+  int error;
+  int damaged;
+} VTermPyPumpResult;
+void vterm_py_pump(VTerm *vt, int fd, char *buf, size_t buflen, char *out, size_t outlen, size_t max_bytes, VTermPyDamageTap *tap, VTermPyPumpResult *result);
+''')
+ffibuilder.cdef('''
+void vterm_py_seqlock_write_begin(uint64_t *seq);
+void vterm_py_seqlock_write_end(uint64_t *seq);
+uint64_t vterm_py_seqlock_read(const uint64_t *seq);
+''')
+ffibuilder.cdef('''
 char *vterm_py_spawn_and_forget(char *cmd, char **argv, char **envp, int nfds, int *fds, int tty_fd);
 void free(void *ptr);
 ''')
 
 ffibuilder.set_source('vterm._c', '''
 #include <vterm.h>
+#include "c-sources/cells.h"
+#include "c-sources/events.h"
+#include "c-sources/pump.h"
+#include "c-sources/screen.h"
+#include "c-sources/search.h"
+#include "c-sources/seqlock.h"
 #include "c-sources/spawn.h"
 ''',
-    sources=['vterm/c-sources/spawn.c', 'vterm/c-sources/correct-strerror_r.c'],
+    sources=['vterm/c-sources/cells.c', 'vterm/c-sources/events.c', 'vterm/c-sources/pump.c', 'vterm/c-sources/screen.c', 'vterm/c-sources/search.c', 'vterm/c-sources/seqlock.c', 'vterm/c-sources/spawn.c', 'vterm/c-sources/correct-strerror_r.c'],
     include_dirs=None,
     define_macros=None,
     undef_macros=None,
@@ -0,0 +1,281 @@
+''' asyncio integration for `pty.VTermPty`.
+
+    `open_pty` spawns a program and returns a `PtyTransport` that pumps the
+    pty from the event loop: output of the program goes into the terminal,
+    and the terminal's own output (e.g. replies to queries) goes back.
+'''
+import asyncio
+import errno
+import os
+
+from . import damage, pty
+
+
+class PtyProtocol(asyncio.BaseProtocol):
+    ''' Receives events from a `PtyTransport`.
+
+        The screen itself is reported through the VTerm's callbacks; this
+        only hears about batches of input as a whole.
+    '''
+    def input_received(self, nbytes):
+        ''' Called after a batch of `nbytes` of the program's output was
+            fed to the terminal.
+        '''
+
+    def damage_flushed(self):
+        ''' Called after the terminal's damage was flushed: after each
+            batch of input, or at most `max_fps` times per second.
+        '''
+
+    def eof_received(self):
+        ''' Called when the program closes the pty. The transport closes
+            itself afterwards.
+        '''
+
+
+class PtyTransport(asyncio.Transport):
+    ''' Reads and writes the master side of a `VTermPty` without blocking.
+
+        Each time the pty is readable, up to `max_read` bytes are read
+        (in `read_size` pieces, into a reusable buffer) and fed to the
+        terminal; then damage is flushed once and the terminal's output is
+        written back. If `max_fps` is given, damage is instead flushed by a
+        `damage.DamageScheduler`, and at once after `write`.
+
+        `write` sends bytes to the program, as if typed. Bytes that the pty
+        won't take yet are buffered: past the high-water mark the protocol
+        is asked to pause writing, and reading from the program is paused
+        too, since reading would only queue up more replies.
+    '''
+    def __init__(self, loop, vt, protocol, *, read_size=65536, max_read=262144, max_fps=None, extra=None):
+        super().__init__(extra)
+        self._loop = loop
+        self._vt = vt
+        self._fd = vt._master_fd
+        self._protocol = protocol
+        self._buffer = bytearray(read_size)
+        self._output = bytearray(4096)
+        self._output_view = memoryview(self._output)
+        self._max_read = max_read
+        self._pending = bytearray()
+        self._high_water = 65536
+        self._low_water = 16384
+        self._writing_paused = False
+        self._reading = True
+        self._writer_added = False
+        self._closing = False
+        self._scheduler = None
+        if max_fps is not None:
+            self._scheduler = damage.DamageScheduler(vt, loop.call_later, max_fps=max_fps, on_flush=protocol.damage_flushed)
+
+        os.set_blocking(self._fd, False)
+        self._extra.setdefault('vterm', vt)
+        self._extra.setdefault('pipe', self._fd)
+        loop.call_soon(protocol.connection_made, self)
+        loop.call_soon(self._start_reading)
+
+    def __repr__(self):
+        return '<%s fd=%d pending=%d%s>' % (type(self).__name__, self._fd, len(self._pending), ' closing' if self._closing else '')
+
+    @property
+    def vt(self):
+        return self._vt
+
+    def _start_reading(self):
+        if self._reading and not self._writing_paused and not self._closing:
+            self._loop.add_reader(self._fd, self._read_ready)
+
+    def _read_ready(self):
+        nbytes = 0
+        fd = self._fd
+        buf = self._buffer
+        vt = self._vt
+        while nbytes < self._max_read:
+            try:
+                n = vt.input_from_fd(fd, buf)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                # Linux reports EIO once the last slave fd is closed.
+                if e.errno != errno.EIO:
+                    self._fatal_error(e)
+                    return
+                n = 0
+            if not n:
+                self._eof(nbytes)
+                return
+            nbytes += n
+            if n < len(buf):
+                break
+        if nbytes:
+            self._processed(nbytes)
+
+    def _processed(self, nbytes):
+        if self._scheduler is None:
+            self._vt.flush_damage()
+            self._protocol.damage_flushed()
+        else:
+            self._scheduler.input_processed(nbytes)
+        self.flush()
+        self._protocol.input_received(nbytes)
+
+    def _eof(self, nbytes):
+        if nbytes:
+            self._processed(nbytes)
+        self._loop.remove_reader(self._fd)
+        self._reading = False
+        self._protocol.eof_received()
+        self.close()
+
+    def flush(self):
+        ''' Write back whatever output the terminal has queued, e.g. after
+            calling its `keyboard_*` methods.
+        '''
+        vt = self._vt
+        view = self._output_view
+        while True:
+            n = vt.output_read_into(self._output)
+            if n:
+                self._send(view[:n])
+            if n < len(view):
+                break
+
+    def write(self, data):
+        if self._vt.recorder is not None:
+            self._vt.recorder.input(data)
+        if self._scheduler is not None:
+            self._scheduler.user_input()
+        self._send(data)
+
+    def _send(self, data):
+        if self._closing or not data:
+            return
+        if not self._pending:
+            try:
+                n = os.write(self._fd, data)
+            except (BlockingIOError, InterruptedError):
+                n = 0
+            except OSError as e:
+                self._fatal_error(e)
+                return
+            data = memoryview(data)[n:]
+            if not data:
+                return
+        self._pending += data
+        if not self._writer_added:
+            self._loop.add_writer(self._fd, self._write_ready)
+            self._writer_added = True
+        self._maybe_pause()
+
+    def _write_ready(self):
+        try:
+            n = os.write(self._fd, self._pending)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self._fatal_error(e)
+            return
+        del self._pending[:n]
+        if not self._pending:
+            self._loop.remove_writer(self._fd)
+            self._writer_added = False
+            if self._closing:
+                self._finish_close()
+                return
+        self._maybe_resume()
+
+    def _maybe_pause(self):
+        if not self._writing_paused and len(self._pending) > self._high_water:
+            self._writing_paused = True
+            if self._reading:
+                self._loop.remove_reader(self._fd)
+            self._protocol.pause_writing()
+
+    def _maybe_resume(self):
+        if self._writing_paused and len(self._pending) <= self._low_water:
+            self._writing_paused = False
+            self._start_reading()
+            self._protocol.resume_writing()
+
+    def get_write_buffer_size(self):
+        return len(self._pending)
+
+    def get_write_buffer_limits(self):
+        return self._low_water, self._high_water
+
+    def set_write_buffer_limits(self, high=None, low=None):
+        if high is None:
+            high = 65536 if low is None else 4 * low
+        if low is None:
+            low = high // 4
+        if not 0 <= low <= high:
+            raise ValueError('high (%r) must be >= low (%r) must be >= 0' % (high, low))
+        self._high_water = high
+        self._low_water = low
+        self._maybe_pause()
+
+    def can_write_eof(self):
+        return False
+
+    def is_reading(self):
+        return self._reading and not self._closing
+
+    def pause_reading(self):
+        if self.is_reading():
+            self._reading = False
+            if not self._writing_paused:
+                self._loop.remove_reader(self._fd)
+
+    def resume_reading(self):
+        if not self._reading and not self._closing:
+            self._reading = True
+            self._start_reading()
+
+    def is_closing(self):
+        return self._closing
+
+    def close(self):
+        if self._closing:
+            return
+        self._closing = True
+        self._loop.remove_reader(self._fd)
+        if not self._pending:
+            self._finish_close()
+
+    def abort(self):
+        self._finish_close()
+
+    def _fatal_error(self, exc):
+        self._finish_close(exc)
+
+    def _finish_close(self, exc=None):
+        self._closing = True
+        if self._fd == -1:
+            return
+        if self._scheduler is not None:
+            self._scheduler.close()
+        self._loop.remove_reader(self._fd)
+        if self._writer_added:
+            self._loop.remove_writer(self._fd)
+            self._writer_added = False
+        self._pending.clear()
+        self._fd = -1
+        self._vt.close()
+        self._loop.call_soon(self._protocol.connection_lost, exc)
+
+
+async def open_pty(args, protocol_factory=PtyProtocol, *, read_size=65536, max_read=262144, max_fps=None, **kwargs):
+    ''' Spawn `args` in a new `pty.VTermPty`, and connect it to the running loop.
+
+        Extra keyword arguments are passed to `VTermPty`.
+        Returns a (transport, protocol) pair.
+    '''
+    loop = asyncio.get_running_loop()
+    vt = pty.VTermPty(args, **kwargs)
+    try:
+        protocol = protocol_factory()
+        transport = PtyTransport(loop, vt, protocol, read_size=read_size, max_read=max_read, max_fps=max_fps)
+    except BaseException:
+        vt.close()
+        raise
+    return transport, protocol
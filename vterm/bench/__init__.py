@@ -0,0 +1,2 @@
+''' Benchmarks; run each module with `python3 -m vterm.bench.<name>`.
+'''
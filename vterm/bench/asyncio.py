@@ -0,0 +1,72 @@
+''' vterm.asyncio: output throughput, and keystroke echo latency, as the
+    number of sessions on one loop grows.
+
+    Run as `python3 -m vterm.bench.asyncio [SESSIONS...]`.
+'''
+import asyncio
+import statistics
+import sys
+import time
+
+from .. import asyncio as vterm_asyncio
+
+
+class Session(vterm_asyncio.PtyProtocol):
+    def __init__(self):
+        self.nbytes = 0
+        self.echo = None
+        self.done = asyncio.get_running_loop().create_future()
+
+    def input_received(self, nbytes):
+        self.nbytes += nbytes
+        if self.echo is not None and not self.echo.done():
+            self.echo.set_result(time.perf_counter())
+
+    def connection_lost(self, exc):
+        if not self.done.done():
+            self.done.set_result(self.nbytes)
+
+
+async def throughput(nsessions, nbytes):
+    line = '0123456789' * 7 + 'abcdefghi'
+    args = ['sh', '-c', 'yes %s | head -c %d' % (line, nbytes)]
+    start = time.perf_counter()
+    sessions = [await vterm_asyncio.open_pty(args, Session) for _ in range(nsessions)]
+    total = sum(await asyncio.gather(*[protocol.done for transport, protocol in sessions]))
+    elapsed = time.perf_counter() - start
+    print('%6d sessions  throughput %8.1f MB/s' % (nsessions, total / elapsed / 1e6))
+
+
+async def latency(nsessions, nkeys):
+    loop = asyncio.get_running_loop()
+    sessions = [await vterm_asyncio.open_pty(['cat'], Session) for _ in range(nsessions)]
+    # Let every `cat` start, and swallow anything printed at startup.
+    await asyncio.sleep(0.5 + nsessions / 1000)
+    samples = []
+    for _ in range(nkeys):
+        start = time.perf_counter()
+        for transport, protocol in sessions:
+            protocol.echo = loop.create_future()
+            transport.write(b'x')
+        ends = await asyncio.gather(*[protocol.echo for transport, protocol in sessions])
+        samples.extend(end - start for end in ends)
+    for transport, protocol in sessions:
+        transport.close()
+    await asyncio.gather(*[protocol.done for transport, protocol in sessions])
+    samples.sort()
+    print('%6d sessions  echo latency median %7.3f ms  p99 %7.3f ms' % (
+            nsessions, statistics.median(samples) * 1e3, samples[int(len(samples) * 0.99)] * 1e3))
+
+
+async def run(counts):
+    for n in counts:
+        await throughput(n, 16 * 1024 * 1024 // n)
+        await latency(n, 20)
+
+
+def main(argv=sys.argv[1:]):
+    asyncio.run(run([int(a) for a in argv] or [1, 10, 100, 500]))
+
+
+if __name__ == '__main__':
+    main()
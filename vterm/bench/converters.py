@@ -0,0 +1,112 @@
+''' Per-callback cost of argument conversion, generic vs specialised.
+
+    The "generic" callbacks reproduce how the trampolines used to convert
+    their arguments, via `to_native`/`from_native` and per-call FFI lookups
+    of the value type; "fast" calls the current trampolines.
+
+    Glyph and cell text is compared the same way: "generic" is the chr()
+    per codepoint loop that `core._read_str` used to be.
+'''
+import timeit
+
+from .. import c, core
+
+
+class Callbacks(core.StateCallbacks):
+    def movecursor(self, pos, oldpos, visible):
+        return 0
+    def setpenattr(self, attr, val):
+        return 0
+    def settermprop(self, prop, val):
+        return 0
+
+
+class ScreenCallbacks(core.ScreenCallbacks):
+    def damage(self, rect):
+        return 0
+
+
+def _generic_value(c_val, value_type):
+    cls, ufield = core._value_type_to_cls[core.ValueType(value_type)]
+    rv = getattr(c_val, ufield)
+    if cls is core.Color:
+        rv = core.from_native(rv, cls=cls)
+    elif cls is bool:
+        rv = bool(rv)
+    elif cls is bytes:
+        rv = c.ffi.string(rv)
+    return rv
+
+def generic_movecursor(pos, oldpos, visible, user):
+    callbacks = c.ffi.from_handle(user)
+    pos = core.from_native(pos, cls=core.Pos)
+    oldpos = core.from_native(oldpos, cls=core.Pos)
+    return callbacks.movecursor(pos, oldpos, visible)
+
+def generic_setpenattr(attr, val, user):
+    callbacks = c.ffi.from_handle(user)
+    attr = core.from_native(attr, cls=core.Attr)
+    val = _generic_value(val, c.vterm_get_attr_type(attr.value))
+    return callbacks.setpenattr(attr, val)
+
+def generic_settermprop(prop, val, user):
+    callbacks = c.ffi.from_handle(user)
+    prop = core.from_native(prop, cls=core.Prop)
+    val = _generic_value(val, c.vterm_get_prop_type(prop.value))
+    return callbacks.settermprop(prop, val)
+
+def generic_damage(rect, user):
+    callbacks = c.ffi.from_handle(user)
+    rect = core.from_native(rect, cls=core.Rect)
+    return callbacks.damage(rect)
+
+
+def generic_read_str(ctp, *, max_len=float('inf')):
+    if max_len and ctp[0] == 0xFFffFFff:
+        return ''
+    rv = []
+    i = 0
+    while i < max_len and ctp[i]:
+        rv.append(chr(ctp[i]))
+        i += 1
+    return ''.join(rv)
+
+
+def main(number=200000):
+    vt = core.VTerm()
+    state_user = c.ffi.new_handle(Callbacks(vt))
+    screen_user = c.ffi.new_handle(ScreenCallbacks(vt))
+    pos = c.ffi.new('VTermPos*', [3, 4])[0]
+    oldpos = c.ffi.new('VTermPos*', [3, 3])[0]
+    rect = c.ffi.new('VTermRect*', [0, 1, 0, 80])[0]
+    color = c.ffi.new('VTermValue*')
+    color.color = [0xe0, 0x00, 0x00]
+    boolean = c.ffi.new('VTermValue*')
+    boolean.boolean = 1
+
+    cases = [
+        ('movecursor', (pos, oldpos, 1, state_user), generic_movecursor, core.cb_state_movecursor),
+        ('setpenattr(FOREGROUND)', (c.VTERM_ATTR_FOREGROUND, color, state_user), generic_setpenattr, core.cb_state_setpenattr),
+        ('settermprop(CURSORVISIBLE)', (c.VTERM_PROP_CURSORVISIBLE, boolean, state_user), generic_settermprop, core.cb_state_settermprop),
+        ('damage', (rect, screen_user), generic_damage, core.cb_screen_damage),
+    ]
+    print('%-28s %12s %12s %8s' % ('callback', 'generic ns', 'fast ns', 'speedup'))
+    for name, args, generic, fast in cases:
+        t_generic = min(timeit.repeat(lambda: generic(*args), number=number, repeat=3)) / number
+        t_fast = min(timeit.repeat(lambda: fast(*args), number=number, repeat=3)) / number
+        print('%-28s %12.0f %12.0f %7.1fx' % (name, t_generic * 1e9, t_fast * 1e9, t_generic / t_fast))
+
+    print()
+    print('%-28s %12s %12s %8s' % ('text', 'generic ns', 'fast ns', 'speedup'))
+    for name, chars in [('ascii', 'a'), ('wide', '\u4e2d'), ('combining', 'e\u0301\u0302')]:
+        glyph = c.ffi.new('uint32_t[]', [ord(ch) for ch in chars] + [0])
+        cell = c.ffi.new('uint32_t[]', c.VTERM_MAX_CHARS_PER_CELL)
+        cell[0:len(chars)] = [ord(ch) for ch in chars]
+        for kind, ctp, kwargs in [('glyph', glyph, {}), ('cell', cell, {'max_len': c.VTERM_MAX_CHARS_PER_CELL})]:
+            t_generic = min(timeit.repeat(lambda: generic_read_str(ctp, **kwargs), number=number, repeat=3)) / number
+            t_fast = min(timeit.repeat(lambda: core._read_str(ctp, **kwargs), number=number, repeat=3)) / number
+            print('%-28s %12.0f %12.0f %7.1fx' % ('%s %s' % (kind, name), t_generic * 1e9, t_fast * 1e9, t_generic / t_fast))
+
+
+if __name__ == '__main__':
+    main()
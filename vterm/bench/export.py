@@ -0,0 +1,55 @@
+''' vterm.export: writing a long scrollback plus the screen as HTML, SVG
+    and ANSI, and how much memory the export needs.
+
+    Run as `python3 -m vterm.bench.export [LINES]` (default 500000).
+'''
+import itertools
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from .. import core, export, pty
+from .scrollback import _output
+
+
+def make_history(nlines, size=core.Size(24, 120)):
+    vt = core.VTerm(size)
+    callbacks = pty.PtyCallbacks(vt, scrollback_lines=nlines)
+    vt.set_callbacks(callbacks)
+    vt.screen_reset(True)
+    output = _output(nlines)
+    while True:
+        batch = b''.join(itertools.islice(output, 1000))
+        if not batch:
+            break
+        vt.input_write(batch)
+    return vt, callbacks.scrollback
+
+
+def main(argv=sys.argv[1:]):
+    nlines = int(argv[0]) if argv else 500000
+    start = time.perf_counter()
+    vt, scrollback = make_history(nlines)
+    print('history  %d lines in %.1f s' % (len(scrollback), time.perf_counter() - start))
+    with tempfile.TemporaryDirectory() as tmp:
+        for format in ['html', 'svg', 'ansi']:
+            path = os.path.join(tmp, 'export.' + format)
+            with open(path, 'w', encoding='utf-8') as f:
+                start = time.perf_counter()
+                export.export(vt, f, format, scrollback=scrollback)
+                elapsed = time.perf_counter() - start
+            nbytes = os.path.getsize(path)
+            print('%-5s %8.0f lines/s  %6.1f MB/s  %7.1f MB' % (format, len(scrollback) / elapsed, nbytes / elapsed / 1e6, nbytes / 1e6))
+
+        tracemalloc.start()
+        with open(os.path.join(tmp, 'export.html'), 'w', encoding='utf-8') as f:
+            export.export(vt, f, 'html', scrollback=scrollback)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print('html peak memory while exporting: %.2f MB' % (peak / 1e6))
+
+
+if __name__ == '__main__':
+    main()
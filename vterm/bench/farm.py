@@ -0,0 +1,60 @@
+''' vterm.farm: parsing throughput as the number of workers grows, and
+    the cost of reading a published screen from the front process.
+
+    Run as `python3 -m vterm.bench.farm [WORKERS...]`.
+'''
+import os
+import sys
+import time
+
+from .. import core, farm
+
+
+def make_chunk():
+    lines = []
+    for i in range(200):
+        lines.append('\x1b[3%dm%06d\x1b[m the quick brown fox jumps over the lazy dog 0123456789\r\n' % (i % 8, i))
+    return ''.join(lines).encode()
+
+
+def throughput(nworkers, nterminals, chunks):
+    chunk = make_chunk()
+    with farm.Farm(nworkers) as f:
+        terminals = [f.open() for _ in range(nterminals)]
+        start = time.perf_counter()
+        for _ in range(chunks):
+            for terminal in terminals:
+                terminal.feed(chunk)
+        # Resizing is queued behind the feeds, so once every terminal shows
+        # the new size, all of them are parsed.
+        for terminal in terminals:
+            terminal.resize(core.Size(rows=24, cols=80))
+        for terminal in terminals:
+            while terminal.read().size.rows != 24:
+                time.sleep(0.001)
+        elapsed = time.perf_counter() - start
+        nbytes = len(chunk) * chunks * nterminals
+        print('%3d workers  %8.1f MB/s' % (nworkers, nbytes / elapsed / 1e6))
+
+
+def read_cost(nreads=10000):
+    with farm.Farm(1) as f:
+        terminal = f.open()
+        terminal.feed(make_chunk())
+        screen = terminal.read()
+        start = time.perf_counter()
+        for _ in range(nreads):
+            screen = terminal.read(out=screen)
+        elapsed = time.perf_counter() - start
+        print('read %dx%d screen  %7.2f us' % (screen.size.rows, screen.size.cols, elapsed / nreads * 1e6))
+
+
+def main(argv=sys.argv[1:]):
+    counts = [int(a) for a in argv] or sorted({1, 2, 4, os.cpu_count() or 1})
+    for n in counts:
+        throughput(n, 4 * max(counts), 50)
+    read_cost()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+''' `cat` of a big file through a VTerm: fresh `bytes` per chunk vs
+    the reusable buffers of `input_from_fd`/`output_read_into`.
+
+    Every so often the file asks for the cursor position, so the output
+    path is exercised too.
+'''
+import os
+import tempfile
+import time
+
+from .. import c, core
+
+
+def make_file(nbytes):
+    f = tempfile.TemporaryFile()
+    line = b'%06d the quick brown fox jumps over the lazy dog 0123456789\r\n'
+    i = 0
+    written = 0
+    while written < nbytes:
+        chunk = b''.join([line % (i + j) for j in range(99)]) + b'\x1b[6n\r\n'
+        f.write(chunk)
+        written += len(chunk)
+        i += 99
+    f.flush()
+    return f, written
+
+
+def copying_output_read(vt):
+    # What output_read used to do.
+    len_ = c.vterm_output_get_buffer_current(vt._vt)
+    if len_ == 0:
+        return b''
+    buf = c.ffi.new('char[]', len_)
+    rv = c.vterm_output_read(vt._vt, buf, len_)
+    return c.ffi.unpack(buf, rv)
+
+
+def copying(vt, fd, chunk):
+    while True:
+        data = os.read(fd, chunk)
+        if not data:
+            break
+        vt.input_write(data)
+        copying_output_read(vt)
+
+
+def reusing(vt, fd, chunk):
+    buf = bytearray(chunk)
+    out = bytearray(4096)
+    while vt.input_from_fd(fd, buf):
+        vt.output_read_into(out)
+
+
+def main(nbytes=64 * 1024 * 1024, chunk=65536):
+    f, nbytes = make_file(nbytes)
+    with f:
+        fd = f.fileno()
+        for name, fn in [('copying', copying), ('reusing', reusing)]:
+            best = float('inf')
+            for _ in range(3):
+                vt = core.VTerm()
+                os.lseek(fd, 0, os.SEEK_SET)
+                start = time.perf_counter()
+                fn(vt, fd, chunk)
+                best = min(best, time.perf_counter() - start)
+            print('%-8s %8.1f MB/s' % (name, nbytes / best / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+''' vterm.keyframes: building an index of a big recording, and seeking in
+    it, compared to replaying from the start.
+
+    Run as `python3 -m vterm.bench.keyframes [GIGABYTES]` (default 2); the
+    recording is written to a temporary directory.
+'''
+import os
+import random
+import sys
+import tempfile
+import time
+
+from .. import keyframes, record
+
+
+def make_recording(path, nbytes, chunk=4096):
+    ''' A binary recording of colored log lines, one chunk every 10ms.
+    '''
+    lines = []
+    for i in range(1000):
+        lines.append(b'\x1b[3%dm%06d\x1b[m %s\r\n' % (i % 8, i, b'the quick brown fox jumps over the lazy dog ' * (i % 3 + 1)))
+    text = b''.join(lines)
+    chunks = [text[i:i + chunk] for i in range(0, len(text) - chunk, chunk)]
+    frame = record._BINARY_FRAME
+    written = 0
+    usec = 0
+    with open(path, 'wb') as f:
+        f.write(record.MAGIC + record._BINARY_HEADER.pack(25, 80, time.time()))
+        while written < nbytes:
+            batch = []
+            for data in chunks:
+                batch.append(frame.pack(usec, b'o', len(data)))
+                batch.append(data)
+                usec += 10000
+                written += len(data)
+            f.write(b''.join(batch))
+    return written, usec / 1e6
+
+
+def main(argv=sys.argv[1:]):
+    gigabytes = float(argv[0]) if argv else 2
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'session.rec')
+        nbytes, duration = make_recording(path, int(gigabytes * 1e9))
+
+        start = time.perf_counter()
+        with keyframes.open_index(path) as index:
+            elapsed = time.perf_counter() - start
+            print('build  %7.1f MB/s  %d keyframes  index %.1f MB' % (
+                    nbytes / elapsed / 1e6, len(index.keyframes), os.path.getsize(keyframes.index_path(path)) / 1e6))
+        print('replay from the start, to the middle: ~%.2f s' % (elapsed / 2))
+
+        start = time.perf_counter()
+        index = keyframes.open_index(path)
+        print('load   %7.3f ms' % ((time.perf_counter() - start) * 1e3))
+
+        rng = random.Random(0)
+        with index:
+            samples = []
+            for _ in range(50):
+                t = rng.uniform(0, duration)
+                start = time.perf_counter()
+                index.seek(t)
+                samples.append(time.perf_counter() - start)
+        samples.sort()
+        print('seek   median %7.2f ms  max %7.2f ms' % (samples[len(samples) // 2] * 1e3, samples[-1] * 1e3))
+
+
+if __name__ == '__main__':
+    main()
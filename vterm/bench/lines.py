@@ -0,0 +1,48 @@
+''' VTerm.screen_get_lines: reading the screen text after each update, by
+    asking libvterm for each row vs. getting the lines, which only reads
+    the rows that were damaged.
+'''
+import time
+
+from .. import core
+from .mirror import make_chunks
+
+
+def via_get_text(vt, rects):
+    return [vt.get_text(rect).decode('utf-8', 'replace').rstrip() for rect in rects]
+
+
+def via_get_chars(vt, rects):
+    return [vt.get_chars(rect).rstrip() for rect in rects]
+
+
+def via_get_lines(vt, rects):
+    return vt.get_lines()
+
+
+def run(fn, chunks):
+    vt = core.VTerm()
+    size = vt.get_size()
+    rects = [core.Rect(start_row=row, end_row=row + 1, start_col=0, end_col=size.cols) for row in range(size.rows)]
+    for chunk in chunks:
+        vt.input_write(chunk)
+        text = fn(vt, rects)
+    return text
+
+
+def main(nchunks=20000):
+    for name, lines_per_chunk in [('scrolling', 5), ('one line', 0)]:
+        if lines_per_chunk:
+            chunks = make_chunks(nchunks, lines_per_chunk)
+        else:
+            # A status line updated in place.
+            chunks = [b'\r\x1b[Kprogress %d' % i for i in range(nchunks)]
+        for fn in [via_get_text, via_get_chars, via_get_lines]:
+            start = time.perf_counter()
+            run(fn, chunks)
+            elapsed = time.perf_counter() - start
+            print('%-9s %-14s %8.1f us per update' % (name, fn.__name__[4:], elapsed / nchunks * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+''' vterm.manager: cost of a poll with many idle sessions, and throughput
+    and fairness with many sessions printing as fast as they can.
+
+    Run as `python3 -m vterm.bench.manager [SESSIONS...]`; 10k sessions
+    need as many processes and twice as many fds as that.
+'''
+import resource
+import statistics
+import sys
+import time
+
+from .. import manager
+
+
+def raise_fd_limit(nsessions):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    want = nsessions * 2 + 64
+    if soft < want:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(want, hard), hard))
+
+
+def spawn(nsessions, args):
+    mgr = manager.SessionManager()
+    start = time.perf_counter()
+    for _ in range(nsessions):
+        mgr.spawn(args)
+    return mgr, time.perf_counter() - start
+
+
+def idle(nsessions, npolls=200):
+    mgr, elapsed = spawn(nsessions, ['sleep', '3600'])
+    try:
+        # Let every `sleep` start.
+        deadline = time.perf_counter() + 0.5 + nsessions / 2000
+        mgr.run(until=lambda: time.perf_counter() >= deadline, timeout=0.1)
+        start = time.perf_counter()
+        for _ in range(npolls):
+            mgr.poll(0)
+        per_poll = (time.perf_counter() - start) / npolls
+        print('%6d idle    spawn %6.3f ms/session  poll %8.3f ms' % (nsessions, elapsed / nsessions * 1e3, per_poll * 1e3))
+    finally:
+        mgr.close()
+
+
+def active(nsessions, seconds=3.0):
+    mgr, elapsed = spawn(nsessions, ['yes', '0123456789' * 7 + 'abcdefghi'])
+    try:
+        deadline = time.perf_counter() + seconds
+        start = time.perf_counter()
+        mgr.run(until=lambda: time.perf_counter() >= deadline, timeout=0.1)
+        elapsed = time.perf_counter() - start
+        counts = [session.stats.bytes_read for session in mgr]
+        mean = statistics.mean(counts)
+        print('%6d active  throughput %8.1f MB/s  min/mean %5.2f  max/mean %5.2f  throttled %d/%d pumps' % (
+                nsessions, mgr.stats.bytes_read / elapsed / 1e6, min(counts) / mean, max(counts) / mean,
+                mgr.stats.throttled, mgr.stats.pumps))
+    finally:
+        mgr.close()
+
+
+def main(argv=sys.argv[1:]):
+    counts = [int(a) for a in argv] or [1000, 5000, 10000]
+    raise_fd_limit(max(counts))
+    for n in counts:
+        idle(n)
+        active(n)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+''' vterm.mirror: keeping the screen text current while output scrolls,
+    by asking libvterm for every row vs. reading changed rows from a
+    `ScreenMirror`.
+'''
+import time
+
+from .. import core, mirror
+
+
+def make_chunks(nchunks, lines_per_chunk=5):
+    chunks = []
+    for i in range(nchunks):
+        chunks.append(b''.join(b'\x1b[3%dm%06d\x1b[m the quick brown fox jumps over the lazy dog\r\n' % (j % 8, i * lines_per_chunk + j) for j in range(lines_per_chunk)))
+    return chunks
+
+
+def via_ffi(chunks):
+    vt = core.VTerm()
+    size = vt.get_size()
+    rects = [core.Rect(start_row=row, end_row=row + 1, start_col=0, end_col=size.cols) for row in range(size.rows)]
+    for chunk in chunks:
+        vt.input_write(chunk)
+        text = [vt.get_text(rect) for rect in rects]
+    return text
+
+
+def via_mirror(chunks):
+    vt = core.VTerm()
+    vt.set_damage_merge(core.DamageSize.SCROLL)
+    screen = mirror.ScreenMirror(vt)
+    vt.set_callbacks(screen)
+    text = [screen.row_text(row) for row in range(screen.rows)]
+    seen = screen.generation
+    for chunk in chunks:
+        vt.input_write(chunk)
+        vt.flush_damage()
+        for row in screen.changed_rows(seen):
+            text[row] = screen.row_text(row)
+        seen = screen.generation
+    return text
+
+
+def main(nchunks=20000):
+    chunks = make_chunks(nchunks)
+    for name, fn in [('ffi', via_ffi), ('mirror', via_mirror)]:
+        start = time.perf_counter()
+        fn(chunks)
+        elapsed = time.perf_counter() - start
+        print('%-6s %8.1f us per update' % (name, elapsed / nchunks * 1e6))
+
+
+if __name__ == '__main__':
+    main()
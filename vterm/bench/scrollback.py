@@ -0,0 +1,74 @@
+''' Scrollback push/pop throughput, and memory per line vs raw cells.
+
+    The lines are captured from a terminal fed synthetic shell and log
+    output, so they have the usual mix of prompts, colours and blank tails.
+'''
+import timeit
+
+from .. import c, core, scrollback
+
+
+class Capture(core.ScreenCallbacks):
+    def __init__(self, vt):
+        super().__init__(vt)
+        self.lines = []
+
+    def sb_pushline(self, cells):
+        copy = c.ffi.new('VTermScreenCell[]', len(cells))
+        c.ffi.memmove(copy, cells, c.ffi.sizeof(copy))
+        self.lines.append(copy)
+        return 1
+
+
+def _output(nlines):
+    prompt = b'\x1b[1;32muser@host\x1b[0m:\x1b[1;34m~/src/project\x1b[0m$ '
+    levels = [b'\x1b[32mINFO\x1b[0m ', b'\x1b[33mWARN\x1b[0m ', b'\x1b[1;31mERROR\x1b[0m']
+    for i in range(nlines):
+        if i % 20 == 0:
+            yield prompt + b'ls -l build/ | grep %d\r\n' % i
+        elif i % 7 == 0:
+            yield b'\r\n'
+        else:
+            yield b'2024-01-01 12:%02d:%02d %s worker-%d: processed request %d in %dms\r\n' % (
+                    i // 60 % 60, i % 60, levels[i % len(levels)], i % 8, i, i * 37 % 500)
+
+
+def capture(nlines, size=core.Size(24, 120)):
+    vt = core.VTerm(size)
+    callbacks = Capture(vt)
+    vt.screen_set_callbacks(callbacks)
+    vt.screen_reset(True)
+    for chunk in _output(nlines + size.rows):
+        vt.input_write(chunk)
+    return callbacks.lines[:nlines]
+
+
+def main(nlines=10000):
+    lines = capture(nlines)
+    cols = len(lines[0])
+    raw = len(lines) * c.ffi.sizeof(lines[0])
+    cells_mut = c.ffi.new('VTermScreenCell[]', cols)
+
+    def push():
+        sb = scrollback.Scrollback(max_lines=None)
+        for line in lines:
+            sb.push(line)
+        return sb
+
+    def pop():
+        sb = push()
+        while sb.pop(cells_mut):
+            pass
+
+    sb = push()
+    t_push = min(timeit.repeat(push, number=1, repeat=3))
+    t_both = min(timeit.repeat(pop, number=1, repeat=3))
+    print('%d lines of %d cells, %d styles' % (len(lines), cols, len(sb.codec.styles)))
+    print('raw cells    %10d bytes  %8.1f per line' % (raw, raw / len(lines)))
+    print('scrollback   %10d bytes  %8.1f per line  %.1fx smaller' % (sb.nbytes, sb.nbytes / len(lines), raw / sb.nbytes))
+    print('push         %10.0f lines/s' % (len(lines) / t_push))
+    print('pop          %10.0f lines/s' % (len(lines) / max(t_both - t_push, 1e-9)))
+
+
+if __name__ == '__main__':
+    main()
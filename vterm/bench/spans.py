@@ -0,0 +1,55 @@
+''' VTerm.screen_get_spans: splitting the screen into runs of cells of the
+    same style, by comparing the cells of a snapshot vs. in one C call.
+'''
+import time
+
+from .. import core
+
+
+def make_screen(vt):
+    size = vt.get_size()
+    for row in range(size.rows):
+        words = []
+        for i in range(size.cols // 8):
+            words.append(b'\x1b[%d;3%dm%-7s\x1b[m ' % (row % 2, (row + i) % 8, b'word%d' % i))
+        vt.input_write(b''.join(words).rstrip() + (b'\r\n' if row < size.rows - 1 else b''))
+
+
+def via_snapshot(vt):
+    size = vt.get_size()
+    snapshot = vt.snapshot()
+    rv = []
+    for row in range(size.rows):
+        spans = []
+        for col in range(size.cols):
+            cell = snapshot.get_cell(core.Pos(row=row, col=col))
+            style = (cell.attrs, cell.fg, cell.bg)
+            text = cell.chars or ' '
+            if spans and spans[-1][2] == style:
+                start_col, _, _, prev = spans[-1]
+                spans[-1] = (start_col, col + 1, style, prev + text)
+            else:
+                spans.append((col, col + 1, style, text))
+        rv.append(spans)
+    return rv
+
+
+def via_spans(vt):
+    return vt.get_spans()
+
+
+def main(number=200):
+    vt = core.VTerm()
+    make_screen(vt)
+    nspans = sum(len(spans) for spans in via_spans(vt))
+    print('%d spans' % nspans)
+    for fn in [via_snapshot, via_spans]:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn(vt)
+        elapsed = time.perf_counter() - start
+        print('%-9s %8.1f us per screen' % (fn.__name__[4:], elapsed / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+#include "cells.h"
+
+#include <string.h>
+
+#include "screen.h"
+
+#define FIELD(bits, shift, mask) (((bits) >> (shift)) & (mask))
+
+uint64_t vterm_py_cell_style(const VTermScreenCell *cell)
+{
+    uint64_t rv = vterm_py_cell_attrs(cell);
+    rv |= (uint64_t)cell->fg.red << 16;
+    rv |= (uint64_t)cell->fg.green << 24;
+    rv |= (uint64_t)cell->fg.blue << 32;
+    rv |= (uint64_t)cell->bg.red << 40;
+    rv |= (uint64_t)cell->bg.green << 48;
+    rv |= (uint64_t)cell->bg.blue << 56;
+    return rv;
+}
+
+void vterm_py_cell_set_style(VTermScreenCell *cell, uint64_t style)
+{
+    cell->attrs.bold = FIELD(style, VTERM_PY_ATTR_BOLD_SHIFT, 0x1);
+    cell->attrs.underline = FIELD(style, VTERM_PY_ATTR_UNDERLINE_SHIFT, 0x3);
+    cell->attrs.italic = FIELD(style, VTERM_PY_ATTR_ITALIC_SHIFT, 0x1);
+    cell->attrs.blink = FIELD(style, VTERM_PY_ATTR_BLINK_SHIFT, 0x1);
+    cell->attrs.reverse = FIELD(style, VTERM_PY_ATTR_REVERSE_SHIFT, 0x1);
+    cell->attrs.strike = FIELD(style, VTERM_PY_ATTR_STRIKE_SHIFT, 0x1);
+    cell->attrs.font = FIELD(style, VTERM_PY_ATTR_FONT_SHIFT, 0xf);
+    cell->attrs.dwl = FIELD(style, VTERM_PY_ATTR_DWL_SHIFT, 0x1);
+    cell->attrs.dhl = FIELD(style, VTERM_PY_ATTR_DHL_SHIFT, 0x3);
+    cell->fg.red = FIELD(style, 16, 0xff);
+    cell->fg.green = FIELD(style, 24, 0xff);
+    cell->fg.blue = FIELD(style, 32, 0xff);
+    cell->bg.red = FIELD(style, 40, 0xff);
+    cell->bg.green = FIELD(style, 48, 0xff);
+    cell->bg.blue = FIELD(style, 56, 0xff);
+}
+
+size_t vterm_py_chars_len(const void *chars, size_t max_len)
+{
+    const uint32_t *p = chars;
+    size_t n = 0;
+    while (n < max_len && p[n])
+        ++n;
+    return n;
+}
+
+static int cell_nchars(const VTermScreenCell *cell)
+{
+    int i;
+    for (i = 0; i < VTERM_MAX_CHARS_PER_CELL && cell->chars[i]; ++i)
+    {
+    }
+    return i;
+}
+
+static int cell_is_blank(const VTermScreenCell *cell)
+{
+    return !cell->chars[0] && cell->width == 1;
+}
+
+/*
+ * Compress a line of cells.
+ *
+ * Trailing blank cells that share the style of the last cell are dropped
+ * (that style is returned in `fill_style`); the number of cells kept is
+ * returned. The styles of the kept cells are run-length encoded into
+ * `run_lens`/`run_styles`, which need room for `ncells` entries.
+ *
+ * If every kept cell has width 1 and at most one char, `simple` is set
+ * and `chars` gets exactly one entry per cell (0 for an empty cell).
+ * Otherwise `chars` gets, for each cell, a header word (width in the low
+ * byte, number of chars in the next byte) followed by the chars; it needs
+ * room for `ncells * (1 + VTERM_MAX_CHARS_PER_CELL)` entries.
+ */
+int vterm_py_line_encode(const VTermScreenCell *cells, int ncells, uint32_t *run_lens, uint64_t *run_styles, int *nruns, uint32_t *chars, size_t *nchars, int *simple, uint64_t *fill_style)
+{
+    int nkept = ncells;
+    int i;
+    size_t j;
+
+    *nruns = 0;
+    *nchars = 0;
+    *simple = 1;
+    *fill_style = 0;
+    if (!ncells)
+        return 0;
+
+    *fill_style = vterm_py_cell_style(&cells[ncells - 1]);
+    while (nkept && cell_is_blank(&cells[nkept - 1]) && vterm_py_cell_style(&cells[nkept - 1]) == *fill_style)
+        --nkept;
+
+    for (i = 0; i < nkept; ++i)
+    {
+        uint64_t style = vterm_py_cell_style(&cells[i]);
+        if (*nruns && run_styles[*nruns - 1] == style)
+        {
+            ++run_lens[*nruns - 1];
+        }
+        else
+        {
+            run_lens[*nruns] = 1;
+            run_styles[*nruns] = style;
+            ++*nruns;
+        }
+        if (cells[i].width != 1 || cell_nchars(&cells[i]) > 1 || cells[i].chars[0] == (uint32_t)-1)
+            *simple = 0;
+    }
+
+    j = 0;
+    for (i = 0; i < nkept; ++i)
+    {
+        if (*simple)
+        {
+            chars[j++] = cells[i].chars[0];
+        }
+        else
+        {
+            int n = cell_nchars(&cells[i]);
+            chars[j++] = (uint8_t)cells[i].width | (uint32_t)n << 8;
+            memcpy(&chars[j], cells[i].chars, n * sizeof(uint32_t));
+            j += n;
+        }
+    }
+    *nchars = j;
+    return nkept;
+}
+
+/*
+ * The inverse of vterm_py_line_encode; `ncells` may differ from the
+ * original number of cells, in which case the line is cut or padded.
+ */
+void vterm_py_line_decode(VTermScreenCell *cells, int ncells, int nkept, const uint32_t *run_lens, const uint64_t *run_styles, int nruns, const uint32_t *chars, int simple, uint64_t fill_style)
+{
+    int i = 0;
+    int run;
+    size_t j = 0;
+
+    memset(cells, 0, ncells * sizeof(VTermScreenCell));
+    if (nkept > ncells)
+        nkept = ncells;
+    for (run = 0; run < nruns && i < nkept; ++run)
+    {
+        uint32_t k;
+        for (k = 0; k < run_lens[run] && i < nkept; ++k, ++i)
+        {
+            vterm_py_cell_set_style(&cells[i], run_styles[run]);
+            if (simple)
+            {
+                cells[i].chars[0] = chars[j++];
+                cells[i].width = 1;
+            }
+            else
+            {
+                int n = FIELD(chars[j], 8, 0xff);
+                cells[i].width = (char)FIELD(chars[j], 0, 0xff);
+                ++j;
+                memcpy(cells[i].chars, &chars[j], n * sizeof(uint32_t));
+                j += n;
+            }
+        }
+    }
+    for (; i < ncells; ++i)
+    {
+        vterm_py_cell_set_style(&cells[i], fill_style);
+        cells[i].width = 1;
+    }
+}
+
+/*
+ * Split each row of `rect` into runs of cells of the same style (see
+ * vterm_py_cell_style), and return the number of runs.
+ *
+ * `row_nruns` gets the number of runs of each row. For each run, in
+ * order, `run_cols` gets its start and end column, `run_styles` its style
+ * and `run_nchars` the number of entries of its text in `chars`: one
+ * codepoint per entry, the characters of each cell or a space for a blank
+ * one, without the right halves of wide characters. The `run_` arrays
+ * need room for one run per cell (two entries per run in `run_cols`), and
+ * `chars` for VTERM_MAX_CHARS_PER_CELL entries per cell.
+ */
+size_t vterm_py_screen_get_spans(const VTermScreen *screen, VTermRect rect, int *row_nruns, int *run_cols, uint64_t *run_styles, size_t *run_nchars, uint32_t *chars)
+{
+    VTermPos pos;
+    VTermScreenCell cell;
+    size_t nruns = 0;
+    size_t j = 0;
+    for (pos.row = rect.start_row; pos.row < rect.end_row; ++pos.row)
+    {
+        size_t first = nruns;
+        for (pos.col = rect.start_col; pos.col < rect.end_col; ++pos.col)
+        {
+            uint64_t style;
+            size_t run_start = j;
+            vterm_screen_get_cell(screen, pos, &cell);
+            style = vterm_py_cell_style(&cell);
+            if (!cell.chars[0])
+            {
+                chars[j++] = ' ';
+            }
+            else if (cell.chars[0] != (uint32_t)-1)
+            {
+                int n = cell_nchars(&cell);
+                memcpy(&chars[j], cell.chars, n * sizeof(uint32_t));
+                j += n;
+            }
+            if (nruns > first && run_styles[nruns - 1] == style)
+            {
+                run_cols[2 * nruns - 1] = pos.col + 1;
+                run_nchars[nruns - 1] += j - run_start;
+            }
+            else
+            {
+                run_cols[2 * nruns] = pos.col;
+                run_cols[2 * nruns + 1] = pos.col + 1;
+                run_styles[nruns] = style;
+                run_nchars[nruns] = j - run_start;
+                ++nruns;
+            }
+        }
+        row_nruns[pos.row - rect.start_row] = (int)(nruns - first);
+    }
+    return nruns;
+}
@@ -0,0 +1,23 @@
+#pragma once
+
+#include <stddef.h>
+#include <stdint.h>
+
+#include <vterm.h>
+
+/*
+ * A style key packs everything but the text of a cell into 64 bits:
+ * the packed attrs (see screen.h) in bits 0-15, fg in 16-39, bg in 40-63.
+ */
+uint64_t vterm_py_cell_style(const VTermScreenCell *cell);
+void vterm_py_cell_set_style(VTermScreenCell *cell, uint64_t style);
+
+int vterm_py_line_encode(const VTermScreenCell *cells, int ncells, uint32_t *run_lens, uint64_t *run_styles, int *nruns, uint32_t *chars, size_t *nchars, int *simple, uint64_t *fill_style);
+void vterm_py_line_decode(VTermScreenCell *cells, int ncells, int nkept, const uint32_t *run_lens, const uint64_t *run_styles, int nruns, const uint32_t *chars, int simple, uint64_t fill_style);
+size_t vterm_py_screen_get_spans(const VTermScreen *screen, VTermRect rect, int *row_nruns, int *run_cols, uint64_t *run_styles, size_t *run_nchars, uint32_t *chars);
+
+/*
+ * The number of codepoints before the terminator of `chars` (a uint32_t
+ * or int32_t array), or `max_len` if there is none before it.
+ */
+size_t vterm_py_chars_len(const void *chars, size_t max_len);
@@ -0,0 +1,254 @@
+#include "events.h"
+
+/*
+ * Callbacks that record libvterm events into a VTermPyEventBatch,
+ * so that they can be handed to python in bulk.
+ *
+ * The layout of `args` for each event type is documented above
+ * `_event_decoders` in core.py.
+ */
+
+static VTermPyEvent *push_event(VTermPyEventBatch *batch, int type)
+{
+    VTermPyEvent *ev;
+    if (batch->count == batch->capacity)
+    {
+        if (batch->full)
+            batch->full(batch->full_user);
+        if (batch->count == batch->capacity)
+        {
+            batch->lost += batch->count;
+            batch->count = 0;
+        }
+    }
+    ev = &batch->events[batch->count++];
+    ev->type = type;
+    return ev;
+}
+
+static void put_rect(int32_t *args, VTermRect rect)
+{
+    args[0] = rect.start_row;
+    args[1] = rect.end_row;
+    args[2] = rect.start_col;
+    args[3] = rect.end_col;
+}
+
+static void put_value(int32_t *args, VTermValueType type, const VTermValue *val)
+{
+    args[0] = type;
+    switch (type)
+    {
+    case VTERM_VALUETYPE_BOOL:
+        args[1] = val->boolean;
+        break;
+    case VTERM_VALUETYPE_INT:
+        args[1] = val->number;
+        break;
+    case VTERM_VALUETYPE_COLOR:
+        args[1] = val->color.red;
+        args[2] = val->color.green;
+        args[3] = val->color.blue;
+        break;
+    default:
+        break;
+    }
+}
+
+static int batch_putglyph(VTermGlyphInfo *info, VTermPos pos, void *user)
+{
+    VTermPyEvent *ev = push_event(user, VTERM_PY_EVENT_PUTGLYPH);
+    int i;
+    ev->args[0] = pos.row;
+    ev->args[1] = pos.col;
+    ev->args[2] = info->width;
+    ev->args[3] = info->protected_cell | info->dwl << 1 | info->dhl << 2;
+    /* There is always room for the terminator. */
+    for (i = 0; i < VTERM_MAX_CHARS_PER_CELL && info->chars[i]; ++i)
+    {
+        ev->args[4 + i] = info->chars[i];
+    }
+    ev->args[4 + i] = 0;
+    return 1;
+}
+
+static int batch_movecursor(VTermPos pos, VTermPos oldpos, int visible, void *user)
+{
+    VTermPyEvent *ev = push_event(user, VTERM_PY_EVENT_MOVECURSOR);
+    ev->args[0] = pos.row;
+    ev->args[1] = pos.col;
+    ev->args[2] = oldpos.row;
+    ev->args[3] = oldpos.col;
+    ev->args[4] = visible;
+    return 1;
+}
+
+static int batch_scrollrect(VTermRect rect, int downward, int rightward, void *user)
+{
+    VTermPyEvent *ev = push_event(user, VTERM_PY_EVENT_SCROLLRECT);
+    put_rect(ev->args, rect);
+    ev->args[4] = downward;
+    ev->args[5] = rightward;
+    /* Like the python default: let libvterm emit moverect/erase too. */
+    return 0;
+}
+
+static int batch_moverect(VTermRect dest, VTermRect src, void *user)
+{
+    VTermPyEvent *ev = push_event(user, VTERM_PY_EVENT_MOVERECT);
+    put_rect(ev->args, dest);
+    put_rect(ev->args + 4, src);
+    /* Like the python default: let libvterm emit damage too. */
+    return 0;
+}
+
+static int batch_erase(VTermRect rect, int selective, void *user)
+{
+    VTermPyEvent *ev = push_event(user, VTERM_PY_EVENT_ERASE);
+    put_rect(ev->args, rect);
+    ev->args[4] = selective;
+    return 1;
+}
+
+static int batch_initpen(void *user)
+{
+    push_event(user, VTERM_PY_EVENT_INITPEN);
+    return 1;
+}
+
+static int batch_setpenattr(VTermAttr attr, VTermValue *val, void *user)
+{
+    VTermPyEvent *ev = push_event(user, VTERM_PY_EVENT_SETPENATTR);
+    ev->args[0] = attr;
+    put_value(ev->args + 1, vterm_get_attr_type(attr), val);
+    return 1;
+}
+
+static int batch_state_settermprop(VTermProp prop, VTermValue *val, void *user)
+{
+    VTermPyEventBatch *batch = user;
+    VTermValueType type = vterm_get_prop_type(prop);
+    VTermPyEvent *ev;
+    if (type == VTERM_VALUETYPE_STRING)
+    {
+        if (batch->state_fallback && batch->state_fallback->settermprop)
+            return batch->state_fallback->settermprop(prop, val, batch->fallback_user);
+        return 1;
+    }
+    ev = push_event(batch, VTERM_PY_EVENT_SETTERMPROP);
+    ev->args[0] = prop;
+    put_value(ev->args + 1, type, val);
+    return 1;
+}
+
+static int batch_bell(void *user)
+{
+    push_event(user, VTERM_PY_EVENT_BELL);
+    return 1;
+}
+
+static int batch_state_resize(int rows, int cols, VTermPos *delta, void *user)
+{
+    VTermPyEvent *ev = push_event(user, VTERM_PY_EVENT_RESIZE);
+    ev->args[0] = rows;
+    ev->args[1] = cols;
+    ev->args[2] = delta->row;
+    ev->args[3] = delta->col;
+    return 1;
+}
+
+static int batch_setlineinfo(int row, const VTermLineInfo *newinfo, const VTermLineInfo *oldinfo, void *user)
+{
+    VTermPyEvent *ev = push_event(user, VTERM_PY_EVENT_SETLINEINFO);
+    ev->args[0] = row;
+    ev->args[1] = newinfo->doublewidth;
+    ev->args[2] = newinfo->doubleheight;
+    ev->args[3] = oldinfo->doublewidth;
+    ev->args[4] = oldinfo->doubleheight;
+    return 1;
+}
+
+static int batch_damage(VTermRect rect, void *user)
+{
+    VTermPyEvent *ev = push_event(user, VTERM_PY_EVENT_DAMAGE);
+    put_rect(ev->args, rect);
+    return 1;
+}
+
+static int batch_screen_settermprop(VTermProp prop, VTermValue *val, void *user)
+{
+    VTermPyEventBatch *batch = user;
+    VTermValueType type = vterm_get_prop_type(prop);
+    VTermPyEvent *ev;
+    if (type == VTERM_VALUETYPE_STRING)
+    {
+        if (batch->screen_fallback && batch->screen_fallback->settermprop)
+            return batch->screen_fallback->settermprop(prop, val, batch->fallback_user);
+        return 1;
+    }
+    ev = push_event(batch, VTERM_PY_EVENT_SETTERMPROP);
+    ev->args[0] = prop;
+    put_value(ev->args + 1, type, val);
+    return 1;
+}
+
+static int batch_screen_resize(int rows, int cols, void *user)
+{
+    VTermPyEvent *ev = push_event(user, VTERM_PY_EVENT_RESIZE);
+    ev->args[0] = rows;
+    ev->args[1] = cols;
+    return 1;
+}
+
+static int batch_sb_pushline(int cols, const VTermScreenCell *cells, void *user)
+{
+    VTermPyEventBatch *batch = user;
+    if (batch->screen_fallback && batch->screen_fallback->sb_pushline)
+        return batch->screen_fallback->sb_pushline(cols, cells, batch->fallback_user);
+    return 0;
+}
+
+static int batch_sb_popline(int cols, VTermScreenCell *cells, void *user)
+{
+    VTermPyEventBatch *batch = user;
+    if (batch->screen_fallback && batch->screen_fallback->sb_popline)
+        return batch->screen_fallback->sb_popline(cols, cells, batch->fallback_user);
+    return 0;
+}
+
+static const VTermStateCallbacks batch_state_callbacks =
+{
+    batch_putglyph,
+    batch_movecursor,
+    batch_scrollrect,
+    batch_moverect,
+    batch_erase,
+    batch_initpen,
+    batch_setpenattr,
+    batch_state_settermprop,
+    batch_bell,
+    batch_state_resize,
+    batch_setlineinfo,
+};
+
+static const VTermScreenCallbacks batch_screen_callbacks =
+{
+    batch_damage,
+    batch_moverect,
+    batch_movecursor,
+    batch_screen_settermprop,
+    batch_bell,
+    batch_screen_resize,
+    batch_sb_pushline,
+    batch_sb_popline,
+};
+
+const VTermStateCallbacks *vterm_py_batch_state_callbacks(void)
+{
+    return &batch_state_callbacks;
+}
+
+const VTermScreenCallbacks *vterm_py_batch_screen_callbacks(void)
+{
+    return &batch_screen_callbacks;
+}
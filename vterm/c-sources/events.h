@@ -0,0 +1,46 @@
+#pragma once
+
+#include <stddef.h>
+#include <stdint.h>
+
+#include <vterm.h>
+
+typedef enum {
+  VTERM_PY_EVENT_PUTGLYPH = 1,
+  VTERM_PY_EVENT_MOVECURSOR,
+  VTERM_PY_EVENT_SCROLLRECT,
+  VTERM_PY_EVENT_MOVERECT,
+  VTERM_PY_EVENT_ERASE,
+  VTERM_PY_EVENT_INITPEN,
+  VTERM_PY_EVENT_SETPENATTR,
+  VTERM_PY_EVENT_SETTERMPROP,
+  VTERM_PY_EVENT_BELL,
+  VTERM_PY_EVENT_RESIZE,
+  VTERM_PY_EVENT_SETLINEINFO,
+  VTERM_PY_EVENT_DAMAGE
+} VTermPyEventType;
+
+#define VTERM_PY_MAX_EVENT_ARGS 11
+
+typedef struct {
+  int type;
+  int32_t args[VTERM_PY_MAX_EVENT_ARGS];
+} VTermPyEvent;
+
+typedef struct {
+  VTermPyEvent *events;
+  size_t capacity;
+  size_t count;
+  /* Number of events discarded because `full` did not empty the buffer. */
+  size_t lost;
+  /* Called when the buffer is full; it should consume the events and reset `count`. */
+  void (*full)(void *user);
+  void *full_user;
+  /* Events that can't be recorded (string props, scrollback) are forwarded here. */
+  const VTermStateCallbacks *state_fallback;
+  const VTermScreenCallbacks *screen_fallback;
+  void *fallback_user;
+} VTermPyEventBatch;
+
+const VTermStateCallbacks *vterm_py_batch_state_callbacks(void);
+const VTermScreenCallbacks *vterm_py_batch_screen_callbacks(void);
@@ -0,0 +1,214 @@
+#include "pump.h"
+
+#include <errno.h>
+#include <string.h>
+#include <unistd.h>
+
+static void tap_mark_rows(VTermPyDamageTap *tap, int start_row, int end_row)
+{
+    int row;
+    if (!tap->dirty_rows)
+        return;
+    if (start_row < 0)
+        start_row = 0;
+    if (end_row > tap->dirty_rows_len)
+        end_row = tap->dirty_rows_len;
+    for (row = start_row; row < end_row; ++row)
+        tap->dirty_rows[row] = 1;
+}
+
+static int tap_damage(VTermRect rect, void *user)
+{
+    VTermPyDamageTap *tap = user;
+    tap->damaged = 1;
+    tap_mark_rows(tap, rect.start_row, rect.end_row);
+    if (tap->next && tap->next->damage)
+        return tap->next->damage(rect, tap->next_user);
+    return 1;
+}
+
+/*
+ * The rest are only installed when `next` has them, so that libvterm
+ * sees the same empty slots (and their default behaviour) as without
+ * the tap.
+ */
+static int tap_moverect(VTermRect dest, VTermRect src, void *user)
+{
+    VTermPyDamageTap *tap = user;
+    tap->damaged = 1;
+    tap_mark_rows(tap, dest.start_row, dest.end_row);
+    return tap->next->moverect(dest, src, tap->next_user);
+}
+
+static int tap_movecursor(VTermPos pos, VTermPos oldpos, int visible, void *user)
+{
+    VTermPyDamageTap *tap = user;
+    return tap->next->movecursor(pos, oldpos, visible, tap->next_user);
+}
+
+static int tap_settermprop(VTermProp prop, VTermValue *val, void *user)
+{
+    VTermPyDamageTap *tap = user;
+    return tap->next->settermprop(prop, val, tap->next_user);
+}
+
+static int tap_bell(void *user)
+{
+    VTermPyDamageTap *tap = user;
+    return tap->next->bell(tap->next_user);
+}
+
+static int tap_resize(int rows, int cols, void *user)
+{
+    VTermPyDamageTap *tap = user;
+    tap->damaged = 1;
+    tap_mark_rows(tap, 0, tap->dirty_rows_len);
+    return tap->next->resize(rows, cols, tap->next_user);
+}
+
+static int tap_sb_pushline(int cols, const VTermScreenCell *cells, void *user)
+{
+    VTermPyDamageTap *tap = user;
+    return tap->next->sb_pushline(cols, cells, tap->next_user);
+}
+
+static int tap_sb_popline(int cols, VTermScreenCell *cells, void *user)
+{
+    VTermPyDamageTap *tap = user;
+    return tap->next->sb_popline(cols, cells, tap->next_user);
+}
+
+/*
+ * Forward to `next` (which may be NULL) from now on. The tap's own
+ * callbacks get the same slots as `next`, except that damage is always
+ * there.
+ */
+void vterm_py_damage_tap_set_next(VTermPyDamageTap *tap, const VTermScreenCallbacks *next, void *next_user)
+{
+    VTermScreenCallbacks *cb = &tap->callbacks;
+    tap->next = next;
+    tap->next_user = next_user;
+    memset(cb, 0, sizeof(*cb));
+    cb->damage = tap_damage;
+    if (!next)
+        return;
+    if (next->moverect)
+        cb->moverect = tap_moverect;
+    if (next->movecursor)
+        cb->movecursor = tap_movecursor;
+    if (next->settermprop)
+        cb->settermprop = tap_settermprop;
+    if (next->bell)
+        cb->bell = tap_bell;
+    if (next->resize)
+        cb->resize = tap_resize;
+    if (next->sb_pushline)
+        cb->sb_pushline = tap_sb_pushline;
+    if (next->sb_popline)
+        cb->sb_popline = tap_sb_popline;
+}
+
+const VTermScreenCallbacks *vterm_py_damage_tap_callbacks(VTermPyDamageTap *tap)
+{
+    return &tap->callbacks;
+}
+
+/*
+ * Write out `out[0:*len]`, keeping whatever the fd won't take.
+ * Returns 0, or the errno of a failed write.
+ */
+static int write_pending(int fd, char *out, size_t *len, VTermPyPumpResult *result)
+{
+    size_t done = 0;
+    int rv = 0;
+    while (done < *len)
+    {
+        ssize_t n = write(fd, out + done, *len - done);
+        if (n < 0)
+        {
+            if (errno == EINTR)
+                continue;
+            if (errno != EAGAIN && errno != EWOULDBLOCK)
+                rv = errno;
+            break;
+        }
+        done += n;
+    }
+    memmove(out, out + done, *len - done);
+    *len -= done;
+    result->bytes_written += done;
+    return rv;
+}
+
+/*
+ * Read `fd` until it would block (or `max_bytes`, if nonzero, were
+ * read), feeding everything to `vt` and writing its replies back, then
+ * flush damage.
+ *
+ * `out` holds replies that couldn't be written yet; on entry
+ * `result->output_pending` says how many, and they are written first.
+ * Reading stops while any are left, so that the caller can wait for the
+ * fd to become writable.
+ *
+ * If `tap` is given, it must be installed as the screen callbacks; its
+ * `damaged` flag is reset, and reported in `result->damaged`.
+ *
+ * Reads fill `buf` from the start, and only wrap around once it is
+ * full, so with `max_bytes` no larger than `buflen` it ends up holding
+ * everything that was read.
+ *
+ * No Python is involved unless Python callbacks are installed, so cffi
+ * releases the GIL for the whole call.
+ */
+void vterm_py_pump(VTerm *vt, int fd, char *buf, size_t buflen, char *out, size_t outlen, size_t max_bytes, VTermPyDamageTap *tap, VTermPyPumpResult *result)
+{
+    size_t pending = result->output_pending;
+    size_t used = 0;
+
+    memset(result, 0, sizeof(*result));
+    if (tap)
+        tap->damaged = 0;
+
+    result->error = write_pending(fd, out, &pending, result);
+    while (!result->error && !pending && (!max_bytes || result->bytes_read < max_bytes))
+    {
+        size_t want;
+        ssize_t n;
+        if (used == buflen)
+            used = 0;
+        want = buflen - used;
+        if (max_bytes && max_bytes - result->bytes_read < want)
+            want = max_bytes - result->bytes_read;
+        n = read(fd, buf + used, want);
+        if (n < 0)
+        {
+            if (errno == EINTR)
+                continue;
+            if (errno == EIO)
+                result->eof = 1;
+            else if (errno != EAGAIN && errno != EWOULDBLOCK)
+                result->error = errno;
+            break;
+        }
+        if (n == 0)
+        {
+            result->eof = 1;
+            break;
+        }
+        vterm_input_write(vt, buf + used, n);
+        used += n;
+        result->bytes_read += n;
+
+        while (!pending && vterm_output_get_buffer_current(vt))
+        {
+            pending = vterm_output_read(vt, out, outlen);
+            result->error = write_pending(fd, out, &pending, result);
+        }
+    }
+
+    if (result->bytes_read)
+        vterm_screen_flush_damage(vterm_obtain_screen(vt));
+    result->output_pending = pending;
+    if (tap)
+        result->damaged = tap->damaged;
+}
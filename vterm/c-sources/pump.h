@@ -0,0 +1,38 @@
+#pragma once
+
+#include <stddef.h>
+
+#include <vterm.h>
+
+/*
+ * Screen callbacks that note that damage happened, then forward every
+ * callback to `next` (if set). Install `vterm_py_damage_tap_callbacks(tap)`
+ * with `tap` as the user data, after `vterm_py_damage_tap_set_next`.
+ *
+ * If `dirty_rows` is set, the flag of each row (up to `dirty_rows_len`)
+ * that was damaged or moved into is set too, and a resize sets them all.
+ */
+typedef struct {
+  const VTermScreenCallbacks *next;
+  void *next_user;
+  int damaged;
+  unsigned char *dirty_rows;
+  int dirty_rows_len;
+  VTermScreenCallbacks callbacks;
+} VTermPyDamageTap;
+
+void vterm_py_damage_tap_set_next(VTermPyDamageTap *tap, const VTermScreenCallbacks *next, void *next_user);
+const VTermScreenCallbacks *vterm_py_damage_tap_callbacks(VTermPyDamageTap *tap);
+
+typedef struct {
+  size_t bytes_read;
+  size_t bytes_written;
+  /* Replies left at the start of the output buffer, since the fd was full. */
+  size_t output_pending;
+  int eof;
+  /* errno of a failed read or write, or 0. */
+  int error;
+  int damaged;
+} VTermPyPumpResult;
+
+void vterm_py_pump(VTerm *vt, int fd, char *buf, size_t buflen, char *out, size_t outlen, size_t max_bytes, VTermPyDamageTap *tap, VTermPyPumpResult *result);
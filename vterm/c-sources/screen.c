@@ -0,0 +1,115 @@
+#include "screen.h"
+
+#include <string.h>
+
+uint16_t vterm_py_cell_attrs(const VTermScreenCell *cell)
+{
+    uint16_t rv = 0;
+    rv |= (uint16_t)cell->attrs.bold << VTERM_PY_ATTR_BOLD_SHIFT;
+    rv |= (uint16_t)cell->attrs.underline << VTERM_PY_ATTR_UNDERLINE_SHIFT;
+    rv |= (uint16_t)cell->attrs.italic << VTERM_PY_ATTR_ITALIC_SHIFT;
+    rv |= (uint16_t)cell->attrs.blink << VTERM_PY_ATTR_BLINK_SHIFT;
+    rv |= (uint16_t)cell->attrs.reverse << VTERM_PY_ATTR_REVERSE_SHIFT;
+    rv |= (uint16_t)cell->attrs.strike << VTERM_PY_ATTR_STRIKE_SHIFT;
+    rv |= (uint16_t)cell->attrs.font << VTERM_PY_ATTR_FONT_SHIFT;
+    rv |= (uint16_t)cell->attrs.dwl << VTERM_PY_ATTR_DWL_SHIFT;
+    rv |= (uint16_t)cell->attrs.dhl << VTERM_PY_ATTR_DHL_SHIFT;
+    return rv;
+}
+
+/*
+ * Copy every cell of `rect` into caller-provided arrays, in row-major order.
+ *
+ * `chars` holds VTERM_MAX_CHARS_PER_CELL entries per cell, zero-padded;
+ * `fg` and `bg` hold 3 entries (red, green, blue) per cell.
+ * Cells outside the screen are stored as all zeros.
+ */
+void vterm_py_screen_snapshot(const VTermScreen *screen, VTermRect rect, uint32_t *chars, int8_t *width, uint16_t *attrs, uint8_t *fg, uint8_t *bg)
+{
+    vterm_py_screen_copy_rect(screen, rect, rect.end_col - rect.start_col, chars, width, attrs, fg, bg);
+}
+
+/*
+ * Like vterm_py_screen_snapshot, but each row of `rect` starts `stride`
+ * cells after the previous one, so that the arrays can be the whole grid
+ * of a larger picture (pointing at the cell where `rect` starts).
+ */
+void vterm_py_screen_copy_rect(const VTermScreen *screen, VTermRect rect, size_t stride, uint32_t *chars, int8_t *width, uint16_t *attrs, uint8_t *fg, uint8_t *bg)
+{
+    VTermPos pos;
+    VTermScreenCell cell;
+    size_t row_start = 0;
+    for (pos.row = rect.start_row; pos.row < rect.end_row; ++pos.row, row_start += stride)
+    {
+        size_t i = row_start;
+        for (pos.col = rect.start_col; pos.col < rect.end_col; ++pos.col)
+        {
+            /* libvterm only writes chars up to the terminator. */
+            memset(&cell, 0, sizeof cell);
+            vterm_screen_get_cell(screen, pos, &cell);
+            memcpy(chars + i * VTERM_MAX_CHARS_PER_CELL, cell.chars, sizeof cell.chars);
+            width[i] = cell.width;
+            attrs[i] = vterm_py_cell_attrs(&cell);
+            fg[3 * i + 0] = cell.fg.red;
+            fg[3 * i + 1] = cell.fg.green;
+            fg[3 * i + 2] = cell.fg.blue;
+            bg[3 * i + 0] = cell.bg.red;
+            bg[3 * i + 1] = cell.bg.green;
+            bg[3 * i + 2] = cell.bg.blue;
+            ++i;
+        }
+    }
+}
+
+/*
+ * Write the text of each row from `start_row` to `end_row` whose flag in
+ * `dirty` is set (every row, if `dirty` is NULL) to `chars`, one row after
+ * the other, and clear its flag.
+ *
+ * The text has one codepoint per entry: the characters of each cell, or a
+ * space for a blank one, without the right halves of wide characters or
+ * the blank cells at the end of the row. `lengths[row]` is set to the
+ * number of entries of the row, and `continued[row]` to whether its last
+ * column isn't blank (see vterm_screen_is_eol), which is how a line that
+ * wrapped onto the next row looks. `chars` must have room for
+ * VTERM_MAX_CHARS_PER_CELL entries per cell read.
+ *
+ * Returns the number of entries written to `chars`.
+ */
+size_t vterm_py_screen_get_lines(const VTermScreen *screen, int start_row, int end_row, int cols, unsigned char *dirty, uint32_t *chars, size_t *lengths, unsigned char *continued)
+{
+    VTermPos pos;
+    VTermScreenCell cell;
+    size_t n = 0;
+    for (pos.row = start_row; pos.row < end_row; ++pos.row)
+    {
+        size_t row_start = n;
+        size_t row_end = n;
+        if (dirty)
+        {
+            if (!dirty[pos.row])
+                continue;
+            dirty[pos.row] = 0;
+        }
+        for (pos.col = 0; pos.col < cols; ++pos.col)
+        {
+            int i;
+            vterm_screen_get_cell(screen, pos, &cell);
+            if (cell.chars[0] == (uint32_t)-1)
+                continue;
+            if (cell.chars[0] == 0)
+            {
+                chars[n++] = ' ';
+                continue;
+            }
+            for (i = 0; i < VTERM_MAX_CHARS_PER_CELL && cell.chars[i]; ++i)
+                chars[n++] = cell.chars[i];
+            row_end = n;
+        }
+        n = row_end;
+        lengths[pos.row] = row_end - row_start;
+        pos.col = cols - 1;
+        continued[pos.row] = cols > 0 && !vterm_screen_is_eol(screen, pos);
+    }
+    return n;
+}
@@ -0,0 +1,27 @@
+#pragma once
+
+#include <stddef.h>
+#include <stdint.h>
+
+#include <vterm.h>
+
+/*
+ * Bit offsets of the fields in the packed attributes of a screen cell.
+ *
+ * The fields are in the same order and have the same widths as the
+ * `attrs` bitfield of VTermScreenCell.
+ */
+#define VTERM_PY_ATTR_BOLD_SHIFT 0
+#define VTERM_PY_ATTR_UNDERLINE_SHIFT 1
+#define VTERM_PY_ATTR_ITALIC_SHIFT 3
+#define VTERM_PY_ATTR_BLINK_SHIFT 4
+#define VTERM_PY_ATTR_REVERSE_SHIFT 5
+#define VTERM_PY_ATTR_STRIKE_SHIFT 6
+#define VTERM_PY_ATTR_FONT_SHIFT 7
+#define VTERM_PY_ATTR_DWL_SHIFT 11
+#define VTERM_PY_ATTR_DHL_SHIFT 12
+
+uint16_t vterm_py_cell_attrs(const VTermScreenCell *cell);
+void vterm_py_screen_snapshot(const VTermScreen *screen, VTermRect rect, uint32_t *chars, int8_t *width, uint16_t *attrs, uint8_t *fg, uint8_t *bg);
+void vterm_py_screen_copy_rect(const VTermScreen *screen, VTermRect rect, size_t stride, uint32_t *chars, int8_t *width, uint16_t *attrs, uint8_t *fg, uint8_t *bg);
+size_t vterm_py_screen_get_lines(const VTermScreen *screen, int start_row, int end_row, int cols, unsigned char *dirty, uint32_t *chars, size_t *lengths, unsigned char *continued);
@@ -0,0 +1,17 @@
+#include "search.h"
+
+/*
+ * Set one bit of `bits` (a Bloom filter of 2**nbits_log2 bits) for every
+ * 3-byte window of `text`. Since UTF-8 is self-synchronizing, a needle
+ * can only occur in text whose filter has all of the needle's bits set.
+ */
+void vterm_py_trigram_bloom(const unsigned char *text, size_t len, uint8_t *bits, unsigned nbits_log2)
+{
+    size_t i;
+    for (i = 0; i + 3 <= len; ++i)
+    {
+        uint32_t trigram = text[i] | (uint32_t)text[i + 1] << 8 | (uint32_t)text[i + 2] << 16;
+        uint32_t h = (uint32_t)(trigram * 2654435761u) >> (32 - nbits_log2);
+        bits[h >> 3] |= 1 << (h & 7);
+    }
+}
@@ -0,0 +1,6 @@
+#pragma once
+
+#include <stddef.h>
+#include <stdint.h>
+
+void vterm_py_trigram_bloom(const unsigned char *text, size_t len, uint8_t *bits, unsigned nbits_log2);
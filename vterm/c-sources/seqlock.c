@@ -0,0 +1,26 @@
+#include "seqlock.h"
+
+/*
+ * The full barriers keep the counter updates ordered with the data on
+ * every architecture, which plain loads and stores from Python don't.
+ */
+void vterm_py_seqlock_write_begin(uint64_t *seq)
+{
+    *(volatile uint64_t *)seq += 1;
+    __sync_synchronize();
+}
+
+void vterm_py_seqlock_write_end(uint64_t *seq)
+{
+    __sync_synchronize();
+    *(volatile uint64_t *)seq += 1;
+}
+
+uint64_t vterm_py_seqlock_read(const uint64_t *seq)
+{
+    uint64_t rv;
+    __sync_synchronize();
+    rv = *(const volatile uint64_t *)seq;
+    __sync_synchronize();
+    return rv;
+}
@@ -0,0 +1,12 @@
+#pragma once
+
+#include <stdint.h>
+
+/*
+ * A sequence lock over memory shared between processes: the writer makes
+ * the counter odd while it writes, and a reader's copy is consistent if
+ * the counter was even and unchanged around it.
+ */
+void vterm_py_seqlock_write_begin(uint64_t *seq);
+void vterm_py_seqlock_write_end(uint64_t *seq);
+uint64_t vterm_py_seqlock_read(const uint64_t *seq);
@@ -1,4 +1,8 @@
+import codecs
 import collections
+import functools
+import os
+import sys
 import weakref
 
 import attr
@@ -6,21 +10,29 @@ import attr
 from . import c, cb_except, util
 
 
+# Not bytes.decode(), which looks the codec up by name on every call, and
+# that costs more than decoding a cell.
+_decode_utf32 = codecs.utf_32_le_decode if sys.byteorder == 'little' else codecs.utf_32_be_decode
+
+
+# Strings of the single-codepoint cells that are by far the most common.
+_ASCII = tuple(chr(i) for i in range(0x80))
+
+
 def _read_str_exact(ctp, len_):
-    # No point in using c.ffi.unpack(ctp, len_), since there's no char32_t support.
-    if False and len_ and ctp[0] == 0xFFffFFff:
-        return ''
-    return ''.join([chr(ctp[i]) for i in range(len_)])
-def _read_str(ctp, *, max_len=float('inf')):
+    # No char32_t support in c.ffi.unpack(), but the codec is as fast.
+    # surrogatepass, since chr() takes surrogates too.
+    return _decode_utf32(c.ffi.buffer(ctp, len_ * 4), 'surrogatepass')[0]
+def _read_str(ctp, *, max_len=sys.maxsize):
     # Can't use c.ffi.string(), since there's no char32_t support.
-    if max_len and ctp[0] == 0xFFffFFff:
+    if not max_len:
+        return ''
+    first = ctp[0]
+    if first == 0xFFffFFff or not first:
         return ''
-    rv = []
-    i = 0
-    while i < max_len and ctp[i]:
-        rv.append(chr(ctp[i]))
-        i += 1
-    return ''.join(rv)
+    if max_len == 1 or not ctp[1]:
+        return _ASCII[first] if first < 0x80 else chr(first)
+    return _read_str_exact(ctp, c.vterm_py_chars_len(ctp, max_len))
 
 
 @attr.s(slots=True, frozen=True)
@@ -52,17 +64,50 @@ class _KeepAlive:
     state_callbacks = attr.ib(default=None, init=False)
     state_parser_fallbacks = attr.ib(default=None, init=False)
     screen_callbacks = attr.ib(default=None, init=False)
+    state_batch = attr.ib(default=None, init=False)
+    screen_batch = attr.ib(default=None, init=False)
+    screen_struct = attr.ib(default=None, init=False)
+    damage_tap = attr.ib(default=None, init=False)
+    line_cache = attr.ib(default=None, init=False)
+    # For screen_get_spans.
+    span_buffers = attr.ib(default=None, init=False)
+
+
+@attr.s(slots=True)
+class _LineCache:
+    ''' The text of each row, for `VTerm.screen_get_lines`. The damage tap
+        sets the flags in `dirty` of the rows that changed since.
+    '''
+    size = attr.ib()
+    lines = attr.ib()
+    dirty = attr.ib()
+    lengths = attr.ib()
+    continued = attr.ib()
+    chars = attr.ib()
+
+    @classmethod
+    def new(cls, size):
+        rows = size.rows
+        new = c.ffi.new
+        dirty = new('unsigned char[]', rows)
+        c.ffi.memmove(dirty, b'\x01' * rows, rows)
+        chars = new('uint32_t[]', rows * size.cols * c.VTERM_MAX_CHARS_PER_CELL)
+        return cls(size, [''] * rows, dirty, new('size_t[]', rows), new('unsigned char[]', rows), chars)
 
 
 class VTerm:
-    __slots__ = ('_keep_alive', '_vt', '_state', '_screen')
+    __slots__ = ('_keep_alive', '_vt', '_state', '_screen', '_input_buffer', '_output_buffer')
     def __init__(self, size=STANDARD_SIZE):
         self._keep_alive = _KeepAlive()
+        # (bytearray, cdata view of it) for input_from_fd, and char[] for output_read.
+        self._input_buffer = None
+        self._output_buffer = c.ffi.new('char[]', 4096)
         gc = c.ffi.gc
         dtor = c.vterm_free
         self._vt = gc(c.vterm_new(size.rows, size.cols), dtor)
         self._state = c.vterm_obtain_state(self._vt)
         self._screen = c.vterm_obtain_screen(self._vt)
+        _reserve_pos_cache(size)
 
         self.set_utf8(True)
         self.reset(True)
@@ -76,10 +121,12 @@ class VTerm:
         rowsp = c.ffi.new('int*')
         colsp = c.ffi.new('int*')
         c.vterm_get_size(self._vt, rowsp, colsp)
-        return Size(rows=rowsp[0], cols=colsp[0])
+        return _interned_size(rowsp[0], colsp[0])
 
     def set_size(self, size):
+        _reserve_pos_cache(size)
         c.vterm_set_size(self._vt, size.rows, size.cols)
+        self._dispatch_events()
 
     def get_utf8(self):
         return c.vterm_get_utf8(self._vt)
@@ -89,16 +136,57 @@ class VTerm:
 
     def input_write(self, bytes_):
         len_ = len(bytes_)
-        return c.vterm_input_write(self._vt, bytes_, len_)
+        if not isinstance(bytes_, bytes):
+            # e.g. a memoryview of a reusable bytearray; don't copy it.
+            bytes_ = c.ffi.from_buffer(bytes_)
+        rv = c.vterm_input_write(self._vt, bytes_, len_)
+        self._dispatch_events()
+        return rv
+
+    def input_from_fd(self, fd, buf=None):
+        ''' Read once from `fd`, like `readinto`, and feed the result to the terminal.
+
+            `buf` defaults to a buffer owned by this VTerm. Returns the
+            number of bytes read, 0 at EOF; errors propagate from `os.readv`.
+        '''
+        if buf is None:
+            buf, c_buf = self._get_input_buffer()
+        else:
+            c_buf = c.ffi.from_buffer(buf)
+        n = os.readv(fd, [buf])
+        if n:
+            c.vterm_input_write(self._vt, c_buf, n)
+            self._dispatch_events()
+        return n
+
+    def _get_input_buffer(self):
+        if self._input_buffer is None:
+            data = bytearray(65536)
+            self._input_buffer = (data, c.ffi.from_buffer(data))
+        return self._input_buffer
+
+    def _dispatch_events(self):
+        keep_alive = self._keep_alive
+        for batch in (keep_alive.state_batch, keep_alive.screen_batch):
+            if batch is not None and len(batch):
+                batch.dispatch()
 
     def output_read(self):
         len_ = c.vterm_output_get_buffer_current(self._vt)
         if len_ == 0:
             return b''
-        buf = c.ffi.new('char[]', len_)
+        buf = self._output_buffer
+        if len(buf) < len_:
+            buf = self._output_buffer = c.ffi.new('char[]', len_)
         rv = c.vterm_output_read(self._vt, buf, len_)
         return c.ffi.unpack(buf, rv)
 
+    def output_read_into(self, buf):
+        ''' Like `output_read`, but into a writable buffer; returns the
+            number of bytes read.
+        '''
+        return c.vterm_output_read(self._vt, c.ffi.from_buffer(buf, require_writable=True), len(buf))
+
     def keyboard_unichar(self, cp, mod):
         c.vterm_keyboard_unichar(self._vt, cp, to_native(mod, cls=Modifier))
 
@@ -125,7 +213,16 @@ class VTerm:
 
     def _state_set_callbacks(self, callbacks):
         user = self._keep_alive.state_callbacks = c.ffi.new_handle(callbacks)
-        c.vterm_state_set_callbacks(self._state, _g_state_callbacks, user)
+        self._keep_alive.state_batch = None
+        c.vterm_state_set_callbacks(self._state, _state_callbacks_struct(callbacks), user)
+
+    def _state_set_batched_callbacks(self, callbacks, *, capacity=4096):
+        batch = EventBatch(callbacks, capacity, screen=False)
+        batch.c_batch.state_fallback = _state_callbacks_struct(callbacks)
+        user = self._keep_alive.state_callbacks = c.ffi.new_handle(callbacks)
+        batch.c_batch.fallback_user = user
+        self._keep_alive.state_batch = batch
+        c.vterm_state_set_callbacks(self._state, c.vterm_py_batch_state_callbacks(), batch.c_batch)
 
     def state_set_unrecognised_fallbacks(self, fallbacks):
         user = self._keep_alive.state_parser_fallbacks = c.ffi.new_handle(fallbacks)
@@ -144,7 +241,7 @@ class VTerm:
         bg = c.ffi.new('VTermColor*')
         c.vterm_state_get_default_colors(self._state, fg, bg)
         rv_fg = from_native(fg, cls=Color)
-        rv_bg = from_native(fg, cls=Color)
+        rv_bg = from_native(bg, cls=Color)
         return (rv_fg, rv_bg)
 
     def state_get_palette_color(self, idx):
@@ -183,7 +280,46 @@ class VTerm:
 
     def screen_set_callbacks(self, callbacks):
         user = self._keep_alive.screen_callbacks = c.ffi.new_handle(callbacks)
-        c.vterm_screen_set_callbacks(self._screen, _g_screen_callbacks, user)
+        self._keep_alive.screen_batch = None
+        self._set_screen_callbacks(_screen_callbacks_struct(callbacks), user)
+
+    def screen_set_batched_callbacks(self, callbacks, *, capacity=4096):
+        ''' Like `screen_set_callbacks`, but events are recorded natively
+            and delivered to `callbacks.on_events` once per write.
+        '''
+        batch = EventBatch(callbacks, capacity, screen=True)
+        batch.c_batch.screen_fallback = _screen_callbacks_struct(callbacks)
+        user = self._keep_alive.screen_callbacks = c.ffi.new_handle(callbacks)
+        batch.c_batch.fallback_user = user
+        self._keep_alive.screen_batch = batch
+        self._set_screen_callbacks(c.vterm_py_batch_screen_callbacks(), batch.c_batch)
+
+    def _set_screen_callbacks(self, struct, user):
+        keep_alive = self._keep_alive
+        keep_alive.screen_struct = struct
+        tap = keep_alive.damage_tap
+        if tap is None:
+            c.vterm_screen_set_callbacks(self._screen, struct, user)
+        else:
+            c.vterm_py_damage_tap_set_next(tap, struct, user)
+
+    def _damage_tap(self):
+        ''' Put a VTermPyDamageTap (see c-sources/pump.h) in front of the
+            screen callbacks, once. The tap fills no slot the callbacks
+            leave empty (except damage, which has no default), so libvterm
+            behaves the same with it as without.
+        '''
+        keep_alive = self._keep_alive
+        tap = keep_alive.damage_tap
+        if tap is None:
+            tap = keep_alive.damage_tap = c.ffi.new('VTermPyDamageTap*')
+            struct = keep_alive.screen_struct
+            if struct is None:
+                c.vterm_py_damage_tap_set_next(tap, c.ffi.NULL, c.ffi.NULL)
+            else:
+                c.vterm_py_damage_tap_set_next(tap, struct, c.vterm_screen_get_cbdata(self._screen))
+            c.vterm_screen_set_callbacks(self._screen, c.vterm_py_damage_tap_callbacks(tap), tap)
+        return tap
 
     def screen_set_unrecognised_fallbacks(self, fallbacks):
         user = self._keep_alive.screen_parser_fallbacks = c.ffi.new_handle(fallbacks)
@@ -194,6 +330,7 @@ class VTerm:
 
     def screen_flush_damage(self):
         c.vterm_screen_flush_damage(self._screen)
+        self._dispatch_events()
 
     def screen_set_damage_merge(self, size):
         c.vterm_screen_set_damage_merge(self._screen, to_native(size, cls=DamageSize))
@@ -215,6 +352,116 @@ class VTerm:
         c.vterm_screen_get_text(self._screen, buf, l, rect[0])
         return c.ffi.unpack(buf, l)
 
+    def screen_get_lines(self, start_row=0, end_row=None, *, join_wrapped=False):
+        ''' The text of the rows from `start_row` to `end_row` (default: the
+            last row), one `str` per row, with blank cells as spaces and
+            without trailing blanks.
+
+            With `join_wrapped`, a row whose last column isn't blank is taken
+            to have wrapped onto the next one (libvterm doesn't record soft
+            wraps), and is joined with it, within the rows asked for.
+
+            The rows are read in one C call and kept; a row is only read
+            again once it is damaged. Pending damage is flushed first, so
+            that the damage tap sees it.
+        '''
+        self.screen_flush_damage()
+        size = self.get_size()
+        keep_alive = self._keep_alive
+        cache = keep_alive.line_cache
+        if cache is None or cache.size != size:
+            cache = keep_alive.line_cache = _LineCache.new(size)
+            tap = self._damage_tap()
+            tap.dirty_rows = cache.dirty
+            tap.dirty_rows_len = size.rows
+        start_row = max(start_row, 0)
+        end_row = size.rows if end_row is None else min(end_row, size.rows)
+        lines = cache.lines
+        dirty = c.ffi.buffer(cache.dirty)[start_row:end_row]
+        if any(dirty):
+            first = start_row + dirty.index(1)
+            last = end_row - dirty[::-1].index(1)
+            n = c.vterm_py_screen_get_lines(self._screen, first, last, size.cols, cache.dirty, cache.chars, cache.lengths, cache.continued)
+            # One codepoint per entry, so offsets into the decoded text are
+            # the same as into `chars`.
+            text = _decode_utf32(c.ffi.buffer(cache.chars, n * 4), 'replace')[0]
+            lengths = cache.lengths
+            i = 0
+            for row in range(first, last):
+                if dirty[row - start_row]:
+                    j = i + lengths[row]
+                    lines[row] = text[i:j]
+                    i = j
+        rv = lines[start_row:end_row]
+        if not join_wrapped:
+            return rv
+        continued = c.ffi.buffer(cache.continued)[start_row:end_row]
+        joined = []
+        parts = []
+        for line, wrapped in zip(rv, continued):
+            parts.append(line)
+            if not wrapped:
+                joined.append(''.join(parts))
+                parts = []
+        if parts:
+            joined.append(''.join(parts))
+        return joined
+
+    def screen_get_spans(self, rect=None):
+        ''' The runs of cells with the same style in each row of `rect`
+            (default: the whole screen), found in one C call.
+
+            Returns a list per row of (start_col, end_col, style_id, text)
+            tuples, where `text` has blank cells as spaces, and `style_id`
+            is for `screen_get_style`. Style ids are the packed style keys
+            of the cells (see c-sources/cells.h), so they mean the same in
+            every call and every terminal, and nothing is kept for them.
+
+            `rect` is clipped to the screen.
+        '''
+        size = self.get_size()
+        if rect is None:
+            rect = Rect(start_row=0, end_row=size.rows, start_col=0, end_col=size.cols)
+        else:
+            rect = Rect(
+                    start_row=max(rect.start_row, 0), end_row=min(rect.end_row, size.rows),
+                    start_col=max(rect.start_col, 0), end_col=min(rect.end_col, size.cols))
+        rows, cols = _rect_shape(rect)
+        if rows <= 0 or cols <= 0:
+            return [[] for _ in range(max(rows, 0))]
+        ncells = rows * cols
+        keep_alive = self._keep_alive
+        buffers = keep_alive.span_buffers
+        if buffers is None or len(buffers[0]) < ncells:
+            new = c.ffi.new
+            buffers = keep_alive.span_buffers = (
+                    new('int[]', ncells), new('int[]', 2 * ncells), new('uint64_t[]', ncells),
+                    new('size_t[]', ncells), new('uint32_t[]', ncells * c.VTERM_MAX_CHARS_PER_CELL))
+        row_nruns, run_cols, run_styles, run_nchars, chars = buffers
+        c_rect = to_native(rect, cls=Rect)
+        nruns = c.vterm_py_screen_get_spans(self._screen, c_rect[0], row_nruns, run_cols, run_styles, run_nchars, chars)
+
+        unpack = c.ffi.unpack
+        nchars = unpack(run_nchars, nruns)
+        text = _decode_utf32(c.ffi.buffer(chars, sum(nchars) * 4), 'replace')[0]
+        cols = unpack(run_cols, 2 * nruns)
+        spans = []
+        i = 0
+        for start_col, end_col, key, n in zip(cols[0::2], cols[1::2], unpack(run_styles, nruns), nchars):
+            spans.append((start_col, end_col, key, text[i:i + n]))
+            i += n
+        rv = []
+        i = 0
+        for n in unpack(row_nruns, rows):
+            rv.append(spans[i:i + n])
+            i += n
+        return rv
+
+    def screen_get_style(self, style_id):
+        ''' The `Style` of a style id from `screen_get_spans`.
+        '''
+        return _style_by_key(style_id)
+
     def screen_get_attrs_extent(self, pos, attrs, *, colspan=(0, -1)):
         rv = c.ffi.new('VTermRect*')
         rv.start_col, rv.end_col = colspan
@@ -229,6 +476,32 @@ class VTerm:
         c.vterm_screen_get_cell(self._screen, pos[0], rv)
         return from_native(rv, cls=ScreenCell)
 
+    def screen_snapshot(self, rect=None, *, out=None):
+        ''' Copy every cell in `rect` (default: the whole screen) at once.
+
+            Pass a previous snapshot of the same shape as `out` to reuse
+            its buffers instead of allocating new ones.
+        '''
+        if rect is None:
+            size = self.get_size()
+            rect = Rect(start_row=0, end_row=size.rows, start_col=0, end_col=size.cols)
+        if out is None:
+            out = ScreenSnapshot(rect)
+        elif (out.rows, out.cols) != _rect_shape(rect):
+            raise ValueError('snapshot shape mismatch: %r vs %r' % (out.rect, rect))
+        else:
+            out.rect = rect
+        c_rect = to_native(rect, cls=Rect)
+        c.vterm_py_screen_snapshot(self._screen, c_rect[0], out.chars, out.width, out.attrs, out.fg, out.bg)
+        return out
+
+    def _screen_copy_rect(self, rect, stride, chars, width, attrs, fg, bg):
+        ''' Like `screen_snapshot`, but into pointers at the start of `rect`
+            in arrays with `stride` cells per row (see `mirror.ScreenMirror`).
+        '''
+        c_rect = to_native(rect, cls=Rect)
+        c.vterm_py_screen_copy_rect(self._screen, c_rect[0], stride, chars, width, attrs, fg, bg)
+
     def screen_is_eol(self, pos):
         pos = to_native(pos, cls=Pos)
         return c.vterm_screen_is_eol(self._screen, pos[0])
@@ -335,7 +608,7 @@ class ScreenCell:
     chars = attr.ib(convert=lambda chs: _read_str(chs, max_len=6))
     width = attr.ib(convert=lambda b: b[0])
     attrs = attr.ib(convert=lambda ats: from_native(ats, cls=ScreenCell.Attrs))
-    fg = attr.ib(convert=lambda clr: from_native(clr, cls=Color))
+    fg = attr.ib(convert=lambda clr: _color_from_native(clr))
     bg = attr.ib(convert=fg.convert)
 
     @attr.s(slots=True, frozen=True, repr=False)
@@ -370,6 +643,107 @@ ScreenCell.Attrs.c_type = None
 ScreenCell.Attrs.fields = ['bold', 'underline', 'italic', 'blink', 'reverse', 'strike', 'font', 'dwl', 'dhl']
 
 
+# (shift, mask) for each of ScreenCell.Attrs.fields, as packed by C.
+_packed_attrs_layout = [
+    (c.VTERM_PY_ATTR_BOLD_SHIFT, 0x1),
+    (c.VTERM_PY_ATTR_UNDERLINE_SHIFT, 0x3),
+    (c.VTERM_PY_ATTR_ITALIC_SHIFT, 0x1),
+    (c.VTERM_PY_ATTR_BLINK_SHIFT, 0x1),
+    (c.VTERM_PY_ATTR_REVERSE_SHIFT, 0x1),
+    (c.VTERM_PY_ATTR_STRIKE_SHIFT, 0x1),
+    (c.VTERM_PY_ATTR_FONT_SHIFT, 0xf),
+    (c.VTERM_PY_ATTR_DWL_SHIFT, 0x1),
+    (c.VTERM_PY_ATTR_DHL_SHIFT, 0x3),
+]
+def unpack_attrs(bits):
+    return ScreenCell.Attrs(*[(bits >> shift) & mask for shift, mask in _packed_attrs_layout])
+
+
+@attr.s(slots=True, frozen=True)
+class Style:
+    ''' What the cells of a span share (see `VTerm.screen_get_spans`).
+    '''
+    attrs = attr.ib()
+    fg = attr.ib()
+    bg = attr.ib()
+
+
+def unpack_style(key):
+    ''' The `Style` of a 64-bit style key (see c-sources/cells.h).
+    '''
+    return Style(
+            unpack_attrs(key & 0xffff),
+            _interned_color((key >> 16) & 0xff, (key >> 24) & 0xff, (key >> 32) & 0xff),
+            _interned_color((key >> 40) & 0xff, (key >> 48) & 0xff, (key >> 56) & 0xff))
+
+
+def _rect_shape(rect):
+    return (rect.end_row - rect.start_row, rect.end_col - rect.start_col)
+
+
+class ScreenSnapshot:
+    ''' A copy of a rectangle of the screen, as a struct of C arrays.
+
+        Cells are stored in row-major order. `chars` has
+        VTERM_MAX_CHARS_PER_CELL entries per cell, `attrs` is packed
+        (see `unpack_attrs`), and `fg`/`bg` have 3 entries per cell.
+    '''
+    __slots__ = ('rect', 'rows', 'cols', 'chars', 'width', 'attrs', 'fg', 'bg')
+    def __init__(self, rect, *, chars=None, width=None, attrs=None, fg=None, bg=None):
+        self.rect = rect
+        self.rows, self.cols = _rect_shape(rect)
+        n = self.rows * self.cols
+        new = c.ffi.new
+        self.chars = new('uint32_t[]', n * c.VTERM_MAX_CHARS_PER_CELL) if chars is None else chars
+        self.width = new('int8_t[]', n) if width is None else width
+        self.attrs = new('uint16_t[]', n) if attrs is None else attrs
+        self.fg = new('uint8_t[]', n * 3) if fg is None else fg
+        self.bg = new('uint8_t[]', n * 3) if bg is None else bg
+
+    def __repr__(self):
+        return '<%s rect=%r>' % (type(self).__name__, self.rect)
+
+    def _index(self, pos):
+        if pos not in self.rect:
+            raise IndexError(pos)
+        return (pos.row - self.rect.start_row) * self.cols + (pos.col - self.rect.start_col)
+
+    def get_chars(self, pos):
+        i = self._index(pos)
+        return _read_str(self.chars + i * c.VTERM_MAX_CHARS_PER_CELL, max_len=c.VTERM_MAX_CHARS_PER_CELL)
+
+    def get_width(self, pos):
+        return self.width[self._index(pos)]
+
+    def get_attrs(self, pos):
+        return unpack_attrs(self.attrs[self._index(pos)])
+
+    def get_fg(self, pos):
+        i = self._index(pos) * 3
+        return _interned_color(*self.fg[i:i + 3])
+
+    def get_bg(self, pos):
+        i = self._index(pos) * 3
+        return _interned_color(*self.bg[i:i + 3])
+
+    def get_cell(self, pos):
+        i = self._index(pos)
+        # The ScreenCell converters also accept already-converted values.
+        return ScreenCell(
+                self.chars + i * c.VTERM_MAX_CHARS_PER_CELL,
+                [self.width[i]],
+                unpack_attrs(self.attrs[i]),
+                _interned_color(*self.fg[3 * i:3 * i + 3]),
+                _interned_color(*self.bg[3 * i:3 * i + 3]),
+        )
+
+    def to_numpy(self):
+        ''' View the buffers as NumPy arrays, without copying.
+        '''
+        from . import numpy as vterm_numpy
+        return vterm_numpy.snapshot_arrays(self)
+
+
 DamageSize = util.make_enum(__name__, 'DamageSize', c, 'VTERM_DAMAGE_')
 DamageSize.c_type = 'VTermDamageSize*'
 DamageSize.fields = None
@@ -380,6 +754,11 @@ AttrMask.c_type = 'VTermAttrMask*'
 AttrMask.fields = None
 
 
+EventType = util.make_enum(__name__, 'EventType', c, 'VTERM_PY_EVENT_')
+EventType.c_type = 'VTermPyEventType*'
+EventType.fields = None
+
+
 class AbstractCallbacks:
     def __init__(self, vt):
         self._vt = weakref.ref(vt)
@@ -445,7 +824,7 @@ def cb_parser_dcs(command, cmdlen, user):
 @c.ffi.def_extern(onerror=cb_except.onerror)
 def cb_parser_resize(rows, cols, user):
     callbacks = c.ffi.from_handle(user)
-    return callbacks.resize(Size(rows=rows, cols=cols))
+    return callbacks.resize(_interned_size(rows, cols))
 
 _g_parser_callbacks = c.ffi.new('VTermParserCallbacks*')
 _g_parser_callbacks.text = c.cb_parser_text.__wrapped__
@@ -456,6 +835,26 @@ _g_parser_callbacks.osc = c.cb_parser_osc.__wrapped__
 _g_parser_callbacks.dcs = c.cb_parser_dcs.__wrapped__
 _g_parser_callbacks.resize = c.cb_parser_resize.__wrapped__
 
+_callbacks_structs = {}
+def _callbacks_struct(callbacks, base, c_type, prefix):
+    ''' Get the callbacks struct for the class of `callbacks`.
+
+        Only methods that the class overrides from `base` are wired up;
+        the rest are left NULL so that libvterm skips them entirely.
+        Overrides are detected on the class, not the instance.
+    '''
+    cls = type(callbacks)
+    key = (cls, c_type)
+    rv = _callbacks_structs.get(key)
+    if rv is None:
+        rv = c.ffi.new(c_type)
+        for name, _ in c.ffi.typeof(c_type).item.fields:
+            if getattr(cls, name) is not getattr(base, name):
+                setattr(rv, name, getattr(c, prefix + name).__wrapped__)
+        _callbacks_structs[key] = rv
+    return rv
+
+
 class StateCallbacks(AbstractCallbacks):
     def putglyph(self, info, pos):
         return 0
@@ -484,30 +883,30 @@ class StateCallbacks(AbstractCallbacks):
 @c.ffi.def_extern(onerror=cb_except.onerror)
 def cb_state_putglyph(info, pos, user):
     callbacks = c.ffi.from_handle(user)
-    info = from_native(info, cls=GlyphInfo)
-    pos = from_native(pos, cls=Pos)
+    info = _glyphinfo_from_native(info)
+    pos = _pos_from_native(pos)
     return callbacks.putglyph(info, pos)
 @c.ffi.def_extern(onerror=cb_except.onerror)
 def cb_state_movecursor(pos, oldpos, visible, user):
     callbacks = c.ffi.from_handle(user)
-    pos = from_native(pos, cls=Pos)
-    oldpos = from_native(oldpos, cls=Pos)
+    pos = _pos_from_native(pos)
+    oldpos = _pos_from_native(oldpos)
     return callbacks.movecursor(pos, oldpos, visible)
 @c.ffi.def_extern(onerror=cb_except.onerror)
 def cb_state_scrollrect(rect, downward, rightward, user):
     callbacks = c.ffi.from_handle(user)
-    rect = from_native(rect, cls=Rect)
+    rect = _rect_from_native(rect)
     return callbacks.scrollrect(rect, downward, rightward)
 @c.ffi.def_extern(onerror=cb_except.onerror)
 def cb_state_moverect(dest, src, user):
     callbacks = c.ffi.from_handle(user)
-    dest = from_native(dest, cls=Rect)
-    src = from_native(src, cls=Rect)
+    dest = _rect_from_native(dest)
+    src = _rect_from_native(src)
     return callbacks.moverect(dest, src)
 @c.ffi.def_extern(onerror=cb_except.onerror)
 def cb_state_erase(rect, selective, user):
     callbacks = c.ffi.from_handle(user)
-    rect = from_native(rect, cls=Rect)
+    rect = _rect_from_native(rect)
     return callbacks.erase(rect, selective)
 @c.ffi.def_extern(onerror=cb_except.onerror)
 def cb_state_initpen(user):
@@ -516,14 +915,14 @@ def cb_state_initpen(user):
 @c.ffi.def_extern(onerror=cb_except.onerror)
 def cb_state_setpenattr(attr, val, user):
     callbacks = c.ffi.from_handle(user)
-    attr = from_native(attr, cls=Attr)
-    val = from_native(val, attr=attr)
+    attr, convert = _attr_from_native[attr]
+    val = convert(val)
     return callbacks.setpenattr(attr, val)
 @c.ffi.def_extern(onerror=cb_except.onerror)
 def cb_state_settermprop(prop, val, user):
     callbacks = c.ffi.from_handle(user)
-    prop = from_native(prop, cls=Prop)
-    val = from_native(val, prop=prop)
+    prop, convert = _prop_from_native[prop]
+    val = convert(val)
     return callbacks.settermprop(prop, val)
 @c.ffi.def_extern(onerror=cb_except.onerror)
 def cb_state_bell(user):
@@ -533,26 +932,16 @@ def cb_state_bell(user):
 def cb_state_resize(rows, cols, delta, user):
     callbacks = c.ffi.from_handle(user)
     # TODO - passing the native object
-    return callbacks.resize(Size(rows=rows, cols=cols), delta)
+    return callbacks.resize(_interned_size(rows, cols), delta)
 @c.ffi.def_extern(onerror=cb_except.onerror)
 def cb_state_setlineinfo(row, newinfo, oldinfo, user):
     callbacks = c.ffi.from_handle(user)
-    newinfo = from_native(newinfo, cls=LineInfo)
-    oldinfo = from_native(oldinfo, cls=LineInfo)
+    newinfo = _lineinfo_from_native(newinfo)
+    oldinfo = _lineinfo_from_native(oldinfo)
     return callbacks.setlineinfo(row, newinfo, oldinfo)
 
-_g_state_callbacks = c.ffi.new('VTermStateCallbacks*')
-_g_state_callbacks.putglyph = c.cb_state_putglyph.__wrapped__
-_g_state_callbacks.movecursor = c.cb_state_movecursor.__wrapped__
-_g_state_callbacks.scrollrect = c.cb_state_scrollrect.__wrapped__
-_g_state_callbacks.moverect = c.cb_state_moverect.__wrapped__
-_g_state_callbacks.erase = c.cb_state_erase.__wrapped__
-_g_state_callbacks.initpen = c.cb_state_initpen.__wrapped__
-_g_state_callbacks.setpenattr = c.cb_state_setpenattr.__wrapped__
-_g_state_callbacks.settermprop = c.cb_state_settermprop.__wrapped__
-_g_state_callbacks.bell = c.cb_state_bell.__wrapped__
-_g_state_callbacks.resize = c.cb_state_resize.__wrapped__
-_g_state_callbacks.setlineinfo = c.cb_state_setlineinfo.__wrapped__
+def _state_callbacks_struct(callbacks):
+    return _callbacks_struct(callbacks, StateCallbacks, 'VTermStateCallbacks*', 'cb_state_')
 
 
 class ScreenCallbacks(AbstractCallbacks):
@@ -576,25 +965,25 @@ class ScreenCallbacks(AbstractCallbacks):
 @c.ffi.def_extern(onerror=cb_except.onerror)
 def cb_screen_damage(rect, user):
     callbacks = c.ffi.from_handle(user)
-    rect = from_native(rect, cls=Rect)
+    rect = _rect_from_native(rect)
     return callbacks.damage(rect)
 @c.ffi.def_extern(onerror=cb_except.onerror)
 def cb_screen_moverect(dest, src, user):
     callbacks = c.ffi.from_handle(user)
-    dest = from_native(dest, cls=Rect)
-    src = from_native(src, cls=Rect)
+    dest = _rect_from_native(dest)
+    src = _rect_from_native(src)
     return callbacks.moverect(dest, src)
 @c.ffi.def_extern(onerror=cb_except.onerror)
 def cb_screen_movecursor(pos, oldpos, visible, user):
     callbacks = c.ffi.from_handle(user)
-    pos = from_native(pos, cls=Pos)
-    oldpos = from_native(oldpos, cls=Pos)
+    pos = _pos_from_native(pos)
+    oldpos = _pos_from_native(oldpos)
     return callbacks.movecursor(pos, oldpos, visible)
 @c.ffi.def_extern(onerror=cb_except.onerror)
 def cb_screen_settermprop(prop, val, user):
     callbacks = c.ffi.from_handle(user)
-    prop = from_native(prop, cls=Prop)
-    val = from_native(val, prop=prop)
+    prop, convert = _prop_from_native[prop]
+    val = convert(val)
     return callbacks.settermprop(prop, val)
 @c.ffi.def_extern(onerror=cb_except.onerror)
 def cb_screen_bell(user):
@@ -603,27 +992,145 @@ def cb_screen_bell(user):
 @c.ffi.def_extern(onerror=cb_except.onerror)
 def cb_screen_resize(rows, cols, user):
     callbacks = c.ffi.from_handle(user)
-    return callbacks.resize(Size(rows=rows, cols=cols))
+    return callbacks.resize(_interned_size(rows, cols))
 @c.ffi.def_extern(onerror=cb_except.onerror)
 def cb_screen_sb_pushline(cols, cells, user):
     callbacks = c.ffi.from_handle(user)
-    # TODO - passing the native elements
-    return callbacks.sb_pushline(tuple(cells[0:cols]))
+    # The cells are only valid until the callback returns.
+    return callbacks.sb_pushline(cells[0:cols])
 @c.ffi.def_extern(onerror=cb_except.onerror)
 def cb_screen_sb_popline(cols, cells, user):
     callbacks = c.ffi.from_handle(user)
     # TODO - passing the native object and elements
     return callbacks.sb_popline(cells[0:cols])
 
-_g_screen_callbacks = c.ffi.new('VTermScreenCallbacks*')
-_g_screen_callbacks.damage = c.cb_screen_damage.__wrapped__
-_g_screen_callbacks.moverect = c.cb_screen_moverect.__wrapped__
-_g_screen_callbacks.movecursor = c.cb_screen_movecursor.__wrapped__
-_g_screen_callbacks.settermprop = c.cb_screen_settermprop.__wrapped__
-_g_screen_callbacks.bell = c.cb_screen_bell.__wrapped__
-_g_screen_callbacks.resize = c.cb_screen_resize.__wrapped__
-_g_screen_callbacks.sb_pushline = c.cb_screen_sb_pushline.__wrapped__
-_g_screen_callbacks.sb_popline = c.cb_screen_sb_popline.__wrapped__
+def _screen_callbacks_struct(callbacks):
+    return _callbacks_struct(callbacks, ScreenCallbacks, 'VTermScreenCallbacks*', 'cb_screen_')
+
+
+class BatchedStateCallbacks(StateCallbacks):
+    ''' State callbacks that receive most events in bulk.
+
+        String-valued termprops are still delivered to `settermprop`.
+    '''
+    def on_events(self, batch):
+        batch.replay(self)
+        return 0
+
+class BatchedScreenCallbacks(ScreenCallbacks):
+    ''' Screen callbacks that receive most events in bulk.
+
+        String-valued termprops and scrollback are still delivered to
+        `settermprop`, `sb_pushline` and `sb_popline`.
+    '''
+    def on_events(self, batch):
+        batch.replay(self)
+        return 0
+
+
+def _event_rect(a, i):
+    return Rect(a[i], a[i + 1], a[i + 2], a[i + 3])
+
+def _event_value(a, i):
+    # The value type is recorded at a[i], so no FFI call is needed here.
+    value_type = a[i]
+    if value_type == c.VTERM_VALUETYPE_BOOL:
+        return bool(a[i + 1])
+    if value_type == c.VTERM_VALUETYPE_INT:
+        return a[i + 1]
+    if value_type == c.VTERM_VALUETYPE_COLOR:
+        return _interned_color(a[i + 1], a[i + 2], a[i + 3])
+    raise ValueError(value_type)
+
+# Decode the `args` of a VTermPyEvent (see c-sources/events.c) into the
+# arguments of the matching callback. The int32 `args` of each event are:
+#   PUTGLYPH     row, col, width, protected_cell | dwl << 1 | dhl << 2, then
+#                the chars, ending with a 0
+#   MOVECURSOR   row, col, old row, old col, visible
+#   SCROLLRECT   rect, downward, rightward
+#   MOVERECT     dest rect, src rect
+#   ERASE        rect, selective
+#   SETPENATTR   attr, value
+#   SETTERMPROP  prop, value (never a string; those aren't batched)
+#   RESIZE       rows, cols, and for the state, delta row, delta col
+#   SETLINEINFO  row, new doublewidth, new doubleheight, old doublewidth,
+#                old doubleheight
+#   DAMAGE       rect
+# where a rect is start row, end row, start col, end col, and a value is
+# its VTermValueType, then the bool or int, or the red, green and blue of
+# a color. INITPEN and BELL have none.
+_event_decoders = {
+    EventType.PUTGLYPH: lambda a: (GlyphInfo(a + 4, a[2], a[3] & 1, (a[3] >> 1) & 1, a[3] >> 2), _interned_pos(a[0], a[1])),
+    EventType.MOVECURSOR: lambda a: (_interned_pos(a[0], a[1]), _interned_pos(a[2], a[3]), a[4]),
+    EventType.SCROLLRECT: lambda a: (_event_rect(a, 0), a[4], a[5]),
+    EventType.MOVERECT: lambda a: (_event_rect(a, 0), _event_rect(a, 4)),
+    EventType.ERASE: lambda a: (_event_rect(a, 0), a[4]),
+    EventType.INITPEN: lambda a: (),
+    EventType.SETPENATTR: lambda a: (_attr_from_native[a[0]][0], _event_value(a, 1)),
+    EventType.SETTERMPROP: lambda a: (_prop_from_native[a[0]][0], _event_value(a, 1)),
+    EventType.BELL: lambda a: (),
+    EventType.RESIZE: lambda a: (_interned_size(a[0], a[1]), _interned_pos(a[2], a[3])),
+    EventType.SETLINEINFO: lambda a: (a[0], LineInfo(a[1], a[2]), LineInfo(a[3], a[4])),
+    EventType.DAMAGE: lambda a: (_event_rect(a, 0),),
+}
+
+
+class EventBatch:
+    ''' Events recorded natively since the last dispatch.
+
+        Iterating yields `(EventType, args)` pairs, where `args` are what
+        the corresponding callback method would have been passed. For bulk
+        processing, `raw()` returns the underlying VTermPyEvent array.
+    '''
+    __slots__ = ('c_batch', '_c_events', '_callbacks', '_screen', '_user')
+    def __init__(self, callbacks, capacity, *, screen):
+        self._callbacks = callbacks
+        self._screen = screen
+        self._c_events = c.ffi.new('VTermPyEvent[]', capacity)
+        self.c_batch = c.ffi.new('VTermPyEventBatch*')
+        self.c_batch.events = self._c_events
+        self.c_batch.capacity = capacity
+        self.c_batch.full = c.cb_batch_full.__wrapped__
+        self._user = c.ffi.new_handle(self)
+        self.c_batch.full_user = self._user
+
+    def __repr__(self):
+        return '<%s events=%d lost=%d>' % (type(self).__name__, len(self), self.lost)
+
+    def __len__(self):
+        return self.c_batch.count
+
+    @property
+    def lost(self):
+        return self.c_batch.lost
+
+    def raw(self):
+        return self._c_events[0:len(self)]
+
+    def __iter__(self):
+        for ev in self.raw():
+            ty = _event_types[ev.type]
+            args = _event_decoders[ty](ev.args)
+            if ty is EventType.RESIZE and self._screen:
+                args = args[:1]
+            yield ty, args
+
+    def replay(self, callbacks):
+        ''' Call the ordinary method of `callbacks` for each event.
+        '''
+        for ty, args in self:
+            getattr(callbacks, ty.name.lower())(*args)
+
+    def dispatch(self):
+        try:
+            self._callbacks.on_events(self)
+        finally:
+            self.c_batch.count = 0
+
+@c.ffi.def_extern(onerror=cb_except.onerror)
+def cb_batch_full(user):
+    batch = c.ffi.from_handle(user)
+    batch.dispatch()
 
 
 @c.ffi.def_extern(onerror=cb_except.onerror)
@@ -670,6 +1177,9 @@ def from_native(c_obj, **restriction):
             rv = c.ffi.string(rv)
         return rv
     if cls.fields is None:
+        table = _enum_tables.get(cls)
+        if table is not None and c_obj in table:
+            return table[c_obj]
         return cls(c_obj)
     return cls(*[getattr(c_obj, x) for x in cls.fields])
 
@@ -679,13 +1189,85 @@ def _get_cls(cls=None, prop=None, attr=None):
     if cls is not None:
         return cls, None
     if prop is not None:
-        value_type = c.vterm_get_prop_type(prop.value)
+        value_type = _prop_value_types[prop]
     if attr is not None:
-        value_type = c.vterm_get_attr_type(attr.value)
-    return _value_type_to_cls[ValueType(value_type)]
+        value_type = _attr_value_types[attr]
+    return _value_type_to_cls[value_type]
 _value_type_to_cls = {
     ValueType.BOOL: (bool, 'boolean'),
     ValueType.INT: (int, 'number'),
     ValueType.STRING: (bytes, 'string'),
     ValueType.COLOR: (Color, 'color'),
 }
+# Flyweights for the small immutable values that the callbacks create.
+#
+# Positions are interned in a table that grows to the largest terminal
+# created so far (up to a limit); colors and sizes in LRU caches.
+_POS_CACHE_LIMIT = 1024
+_pos_cache = []
+_pos_cache_cols = 0
+def _reserve_pos_cache(size):
+    global _pos_cache_cols
+    rows = min(size.rows, _POS_CACHE_LIMIT)
+    cols = min(size.cols, _POS_CACHE_LIMIT)
+    if cols > _pos_cache_cols:
+        for cached_row in _pos_cache:
+            cached_row.extend([None] * (cols - _pos_cache_cols))
+        _pos_cache_cols = cols
+    while len(_pos_cache) < rows:
+        _pos_cache.append([None] * _pos_cache_cols)
+def _interned_pos(row, col):
+    if 0 <= row < len(_pos_cache) and 0 <= col < _pos_cache_cols:
+        cached_row = _pos_cache[row]
+        rv = cached_row[col]
+        if rv is None:
+            rv = cached_row[col] = Pos(row, col)
+        return rv
+    return Pos(row, col)
+def _pos_from_native(c_obj):
+    return _interned_pos(c_obj.row, c_obj.col)
+
+_interned_color = functools.lru_cache(maxsize=4096)(Color)
+def _color_from_native(c_obj):
+    return _interned_color(c_obj.red, c_obj.green, c_obj.blue)
+
+_interned_size = functools.lru_cache(maxsize=64)(Size)
+
+_style_by_key = functools.lru_cache(maxsize=4096)(unpack_style)
+
+
+def _enum_table(cls):
+    if issubclass(cls, util.Flag):
+        # Precompute every combination, not just the named members.
+        all_bits = functools.reduce(lambda a, b: a | b, cls).value
+        return {v: cls(v) for v in range(all_bits + 1)}
+    return {m.value: m for m in cls}
+_enum_tables = {cls: _enum_table(cls) for cls in (Attr, Prop, Key, Modifier, EventType)}
+_event_types = _enum_tables[EventType]
+
+
+# The value type of each prop/attr never changes, so ask libvterm only once.
+_prop_value_types = {p: ValueType(c.vterm_get_prop_type(p.value)) for p in Prop}
+_attr_value_types = {a: ValueType(c.vterm_get_attr_type(a.value)) for a in Attr}
+
+
+# Specialised versions of from_native, for the hot callbacks.
+def _compile_from_native(cls):
+    name = '_%s_from_native' % cls.__name__.lower()
+    args = ', '.join(['c_obj.%s' % x for x in cls.fields])
+    namespace = {'cls': cls}
+    exec('def %s(c_obj):\n    return cls(%s)\n' % (name, args), namespace)
+    return namespace[name]
+_rect_from_native = _compile_from_native(Rect)
+_glyphinfo_from_native = _compile_from_native(GlyphInfo)
+_lineinfo_from_native = _compile_from_native(LineInfo)
+
+_value_from_native = {
+    ValueType.BOOL: lambda val: bool(val.boolean),
+    ValueType.INT: lambda val: val.number,
+    ValueType.STRING: lambda val: c.ffi.string(val.string),
+    ValueType.COLOR: lambda val: _color_from_native(val.color),
+}
+# C enum value -> (member, converter for its VTermValue*)
+_prop_from_native = {p.value: (p, _value_from_native[t]) for p, t in _prop_value_types.items()}
+_attr_from_native = {a.value: (a, _value_from_native[t]) for a, t in _attr_value_types.items()}
@@ -0,0 +1,121 @@
+''' Frame-rate-capped damage flushing.
+
+    Flushing a VTerm's damage after every read means a flood of output
+    costs one round of damage callbacks (and rendering) per read.
+    `DamageScheduler` instead accumulates damage across reads and flushes
+    at most `max_fps` times per second, so that cost scales with the frame
+    rate rather than with the amount of output.
+'''
+import time
+
+from . import core
+
+
+class DamageScheduler:
+    ''' Decides when to call `vt.flush_damage()`.
+
+        Call `input_processed` after feeding output of the program to the
+        terminal, and `user_input` when the user types. `call_later(delay,
+        fn)` must return an object with a `cancel()` method, like both
+        `asyncio.AbstractEventLoop.call_later` and twisted's
+        `reactor.callLater`. `on_flush` is called after each flush, e.g.
+        to render.
+
+        Damage is only held back if the VTerm merges it, so the damage
+        merge mode is set to `merge`. If `adaptive` and `merge` is finer
+        than SCROLL, the mode switches to SCROLL while more than a
+        screenful of output arrives per frame (when every cell is likely to
+        change anyway), and back to `merge` once it calms down. Floods are
+        not merged as SCREEN: in any mode but SCROLL, libvterm flushes the
+        damage on every scroll (and reports it as a moverect, if there is
+        that callback), one line at a time.
+    '''
+    __slots__ = ('vt', 'call_later', 'interval', 'on_flush', 'merge', 'adaptive', 'echo_window', 'clock', 'frames',
+            '_timer', '_pending', '_last_flush', '_echo_deadline', '_bytes', '_mode')
+    def __init__(self, vt, call_later, *, max_fps=60, on_flush=None, merge=core.DamageSize.SCROLL, adaptive=True, echo_window=0.05, clock=time.monotonic):
+        self.vt = vt
+        self.call_later = call_later
+        self.interval = 1 / max_fps
+        self.on_flush = on_flush
+        self.merge = merge
+        self.adaptive = adaptive
+        self.echo_window = echo_window
+        self.clock = clock
+        self.frames = 0
+        self._timer = None
+        self._pending = False
+        self._last_flush = float('-inf')
+        self._echo_deadline = float('-inf')
+        self._bytes = 0
+        self._mode = None
+        self._set_mode(merge)
+
+    def __repr__(self):
+        return '<%s fps=%g mode=%s frames=%d>' % (type(self).__name__, 1 / self.interval, self._mode.name, self.frames)
+
+    @property
+    def mode(self):
+        ''' The damage merge mode currently in use.
+        '''
+        return self._mode
+
+    def _set_mode(self, mode):
+        if mode is not self._mode:
+            self._mode = mode
+            self.vt.set_damage_merge(mode)
+
+    def input_processed(self, nbytes):
+        ''' Note that `nbytes` of output were fed to the terminal.
+
+            Flushes now if the last frame is old enough, or if the user
+            typed recently (so that echoes show up at once); otherwise
+            makes sure a flush is scheduled.
+        '''
+        self._bytes += nbytes
+        self._pending = True
+        now = self.clock()
+        if now < self._echo_deadline or now - self._last_flush >= self.interval:
+            self.flush()
+        elif self._timer is None:
+            self._timer = self.call_later(self._last_flush + self.interval - now, self._on_timer)
+
+    def user_input(self):
+        ''' Note that the user typed something: show what's pending, and
+            flush the output that arrives within `echo_window` seconds
+            without waiting for the next frame.
+        '''
+        self._echo_deadline = self.clock() + self.echo_window
+        if self._pending:
+            self.flush()
+
+    def _on_timer(self):
+        self._timer = None
+        if self._pending:
+            self.flush()
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.vt.flush_damage()
+        self._pending = False
+        self._last_flush = self.clock()
+        self.frames += 1
+        if self.adaptive:
+            size = self.vt.get_size()
+            screenful = size.rows * size.cols
+            if self._bytes > screenful:
+                if self.merge in (core.DamageSize.CELL, core.DamageSize.ROW):
+                    self._set_mode(core.DamageSize.SCROLL)
+            elif self._bytes < screenful // 2:
+                self._set_mode(self.merge)
+        self._bytes = 0
+        if self.on_flush is not None:
+            self.on_flush()
+
+    def close(self):
+        ''' Cancel any scheduled flush.
+        '''
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
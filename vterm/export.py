@@ -0,0 +1,302 @@
+''' Write a terminal's scrollback and screen out as HTML, SVG, or text with
+    SGR escape sequences.
+
+    Lines are produced one at a time as spans of identically-styled text
+    (see `iter_lines`), and the writers are generators of chunks of about
+    `chunk_size` characters, so exporting a long history never holds more
+    than a chunk of the output in memory. `export` writes the chunks to a
+    file.
+
+    HTML and SVG give each distinct style a CSS class the first time it is
+    used, and write its rule in a <style> element just before the chunk
+    that uses it first.
+'''
+import html
+
+from . import core, render
+
+
+CHUNK_SIZE = 1 << 16
+_CSI = '\x1b['
+
+
+def _hex(color):
+    return '#%02x%02x%02x' % (color.red, color.green, color.blue)
+
+
+def _colors(style):
+    if style.attrs.reverse:
+        return style.bg, style.fg
+    return style.fg, style.bg
+
+
+def _trim(spans, default_bg):
+    ''' Drop the blank cells at the end of a line that show nothing.
+    '''
+    while spans:
+        start_col, end_col, style, text = spans[-1]
+        if _colors(style)[1] != default_bg or style.attrs.underline or style.attrs.strike:
+            break
+        stripped = text.rstrip(' ')
+        if stripped:
+            if len(stripped) < len(text):
+                spans[-1] = (start_col, end_col - (len(text) - len(stripped)), style, stripped)
+            break
+        spans.pop()
+    return spans
+
+
+def default_scrollback(vt):
+    ''' The scrollback of `vt`'s `pty.PtyCallbacks`, or None.
+    '''
+    return getattr(getattr(vt, 'callbacks', None), 'scrollback', None)
+
+
+def iter_lines(vt, scrollback=None, *, screen=True):
+    ''' Yield the lines of `scrollback` (default: `default_scrollback(vt)`),
+        oldest first, then (if `screen`) the rows of the screen of `vt`.
+
+        Each line is a list of (start_col, end_col, style, text) spans,
+        with a `core.Style`, and without the blanks at the end that show
+        nothing. Lines must not be pushed to or popped from the scrollback
+        until the iteration ends.
+    '''
+    if scrollback is None:
+        scrollback = default_scrollback(vt)
+    default_bg = vt.get_default_colors()[1]
+    if scrollback is not None:
+        keys = scrollback.codec.styles.keys
+        styles = {}
+        for spans in scrollback.iter_spans():
+            line = []
+            for start_col, end_col, style_id, text in spans:
+                style = styles.get(style_id)
+                if style is None:
+                    style = styles[style_id] = core.unpack_style(keys[style_id])
+                line.append((start_col, end_col, style, text))
+            yield _trim(line, default_bg)
+    if screen:
+        get_style = vt.get_style
+        for spans in vt.get_spans():
+            yield _trim([(start_col, end_col, get_style(style_id), text) for start_col, end_col, style_id, text in spans], default_bg)
+
+
+class _Classes:
+    ''' CSS classes for styles, each made the first time it is needed, and
+        shared by the styles with the same declarations.
+    '''
+    __slots__ = ('_declarations', '_by_style', '_by_css', '_new_rules')
+    def __init__(self, declarations):
+        self._declarations = declarations
+        self._by_style = {}
+        self._by_css = {}
+        self._new_rules = []
+
+    def get(self, style):
+        ''' The class name of `style`, or '' if it needs none.
+        '''
+        rv = self._by_style.get(style)
+        if rv is None:
+            css = self._declarations(style)
+            rv = self._by_css.get(css, '') if css else ''
+            if css and not rv:
+                rv = self._by_css[css] = 's%d' % len(self._by_css)
+                self._new_rules.append('.%s{%s}' % (rv, css))
+            self._by_style[style] = rv
+        return rv
+
+    def style_element(self):
+        ''' A <style> element with the rules of the classes made since the
+            last call, or ''.
+        '''
+        if not self._new_rules:
+            return ''
+        rules = self._new_rules
+        self._new_rules = []
+        return '<style>\n%s\n</style>\n' % '\n'.join(rules)
+
+
+def _font_css(attrs):
+    rv = []
+    if attrs.bold:
+        rv.append('font-weight:bold')
+    if attrs.italic:
+        rv.append('font-style:italic')
+    decorations = []
+    if attrs.underline:
+        decorations.append('underline')
+    if attrs.strike:
+        decorations.append('line-through')
+    if decorations:
+        rv.append('text-decoration:%s' % ' '.join(decorations))
+    if attrs.underline == 2:
+        rv.append('text-decoration-style:double')
+    return rv
+
+
+def iter_html(lines, *, default_fg, default_bg, title='', chunk_size=CHUNK_SIZE):
+    ''' Yield an HTML document showing `lines` (see `iter_lines`), in chunks.
+    '''
+    def declarations(style):
+        fg, bg = _colors(style)
+        rv = []
+        if fg != default_fg:
+            rv.append('color:%s' % _hex(fg))
+        if bg != default_bg:
+            rv.append('background-color:%s' % _hex(bg))
+        return ';'.join(rv + _font_css(style.attrs))
+    classes = _Classes(declarations)
+    escape = html.escape
+
+    yield ('<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n<title>%s</title>\n'
+           '<style>\nbody{color:%s;background-color:%s}\npre{margin:0;font-family:monospace}\n</style>\n'
+           '</head>\n<body>\n') % (escape(title), _hex(default_fg), _hex(default_bg))
+    # Each chunk is its own <pre>, which starts with a newline since HTML
+    # drops one right after <pre>, and would drop an empty first line.
+    parts = []
+    size = 0
+    for spans in lines:
+        line = []
+        for _, _, style, text in spans:
+            name = classes.get(style)
+            text = escape(text, quote=False)
+            line.append('<span class="%s">%s</span>' % (name, text) if name else text)
+        line.append('\n')
+        line = ''.join(line)
+        parts.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield '%s<pre>\n%s</pre>\n' % (classes.style_element(), ''.join(parts))
+            parts = []
+            size = 0
+    if parts:
+        yield '%s<pre>\n%s</pre>\n' % (classes.style_element(), ''.join(parts))
+    yield '</body>\n</html>\n'
+
+
+def iter_svg(lines, nlines, cols, *, default_fg, default_bg, font_size=14, cell_width=8.4, line_height=17, chunk_size=CHUNK_SIZE):
+    ''' Yield an SVG image showing `nlines` `lines` (see `iter_lines`) of
+        `cols` columns, in chunks. Every span is placed at its column, so
+        that text lines up whatever the font.
+    '''
+    def declarations(style):
+        fg = _colors(style)[0]
+        rv = []
+        if fg != default_fg:
+            rv.append('fill:%s' % _hex(fg))
+        return ';'.join(rv + _font_css(style.attrs))
+    classes = _Classes(declarations)
+    escape = html.escape
+    width = cols * cell_width
+    height = nlines * line_height
+    # Roughly where the baseline of a monospace font is.
+    baseline = round(line_height * 0.78, 2)
+
+    yield ('<svg xmlns="http://www.w3.org/2000/svg" width="%g" height="%g" viewBox="0 0 %g %g" '
+           'font-family="monospace" font-size="%g" xml:space="preserve">\n'
+           '<style>\ntext{fill:%s}\n</style>\n<rect width="100%%" height="100%%" fill="%s"/>\n') % (
+                   width, height, width, height, font_size, _hex(default_fg), _hex(default_bg))
+    parts = []
+    size = 0
+    for row, spans in enumerate(lines):
+        y = row * line_height
+        line = []
+        for start_col, end_col, style, _ in spans:
+            bg = _colors(style)[1]
+            if bg != default_bg:
+                line.append('<rect x="%g" y="%g" width="%g" height="%g" fill="%s"/>' % (
+                        start_col * cell_width, y, (end_col - start_col) * cell_width, line_height, _hex(bg)))
+        text = []
+        for start_col, _, style, span_text in spans:
+            if not span_text.strip(' ') and not style.attrs.underline and not style.attrs.strike:
+                continue
+            name = classes.get(style)
+            text.append('<tspan x="%g"%s>%s</tspan>' % (
+                    start_col * cell_width, ' class="%s"' % name if name else '', escape(span_text, quote=False)))
+        if text:
+            line.append('<text y="%g">%s</text>' % (y + baseline, ''.join(text)))
+        if not line:
+            continue
+        line.append('\n')
+        line = ''.join(line)
+        parts.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield classes.style_element() + ''.join(parts)
+            parts = []
+            size = 0
+    yield classes.style_element() + ''.join(parts) + '</svg>\n'
+
+
+def iter_ansi(lines, *, default_fg, default_bg, chunk_size=CHUNK_SIZE):
+    ''' Yield `lines` (see `iter_lines`) as text with SGR escape sequences,
+        in chunks; each line ends with the pen reset.
+    '''
+    sgr = {}
+    def pen(style):
+        rv = sgr.get(style)
+        if rv is None:
+            params = []
+            for name, codes in render.SGR_ATTRS:
+                value = getattr(style.attrs, name)
+                if value:
+                    params.append(codes[value])
+            if style.fg != default_fg:
+                params.append('38;2;%d;%d;%d' % (style.fg.red, style.fg.green, style.fg.blue))
+            if style.bg != default_bg:
+                params.append('48;2;%d;%d;%d' % (style.bg.red, style.bg.green, style.bg.blue))
+            rv = sgr[style] = '%s0;%sm' % (_CSI, ';'.join(params)) if params else ''
+        return rv
+
+    parts = []
+    size = 0
+    for spans in lines:
+        line = []
+        current = ''
+        for _, _, style, text in spans:
+            new = pen(style)
+            if new != current:
+                line.append(new or _CSI + 'm')
+                current = new
+            line.append(text)
+        if current:
+            line.append(_CSI + 'm')
+        line.append('\n')
+        line = ''.join(line)
+        parts.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield ''.join(parts)
+            parts = []
+            size = 0
+    if parts:
+        yield ''.join(parts)
+
+
+def export(vt, file, format='html', *, scrollback=None, screen=True, chunk_size=CHUNK_SIZE, **kwargs):
+    ''' Write the scrollback (see `iter_lines`) and screen of `vt` to
+        `file`, a text file object, as 'html', 'svg' or 'ansi'. `kwargs` go
+        to the writer: `iter_html`, `iter_svg` or `iter_ansi`.
+
+        Returns the number of characters written.
+    '''
+    if scrollback is None:
+        scrollback = default_scrollback(vt)
+    default_fg, default_bg = vt.get_default_colors()
+    lines = iter_lines(vt, scrollback, screen=screen)
+    colors = {'default_fg': default_fg, 'default_bg': default_bg, 'chunk_size': chunk_size}
+    if format == 'html':
+        chunks = iter_html(lines, **colors, **kwargs)
+    elif format == 'svg':
+        size = vt.get_size()
+        nlines = (len(scrollback) if scrollback is not None else 0) + (size.rows if screen else 0)
+        chunks = iter_svg(lines, nlines, size.cols, **colors, **kwargs)
+    elif format == 'ansi':
+        chunks = iter_ansi(lines, **colors, **kwargs)
+    else:
+        raise ValueError('unknown export format %r' % format)
+    nchars = 0
+    for chunk in chunks:
+        file.write(chunk)
+        nchars += len(chunk)
+    return nchars
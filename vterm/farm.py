@@ -0,0 +1,474 @@
+''' Terminals hosted by a pool of worker processes.
+
+    A single process parses output on one core at most. A `Farm` spreads
+    its terminals over worker processes instead; each worker publishes the
+    screens of its terminals into `multiprocessing.shared_memory`
+    segments, which the front process reads directly, while commands (to
+    spawn, write, feed, resize and close) go to the workers over pipes.
+
+    Every segment starts with a sequence lock (see c-sources/seqlock.h):
+    the worker bumps it to an odd value while it writes a new screen, and
+    back to even when done, so `Terminal.read` can tell a consistent copy
+    from a torn one and retry.
+'''
+import fcntl
+import itertools
+import multiprocessing
+import multiprocessing.connection
+from multiprocessing import shared_memory
+import os
+import struct
+import termios
+
+import attr
+
+from . import c, core, manager, pty, util
+
+
+# After the 8-byte generation: rows, cols, cursor row, cursor col,
+# cursor visible, alive.
+_HEADER = struct.Struct('<HHHH??')
+_HEADER_SIZE = 64
+
+
+def _layout(capacity):
+    ''' (C type, offset) of the chars, width, attrs, fg and bg arrays of a
+        segment with room for `capacity` cells, and the segment size.
+    '''
+    counts = [
+        ('uint32_t', capacity * c.VTERM_MAX_CHARS_PER_CELL),
+        ('int8_t', capacity),
+        ('uint16_t', capacity),
+        ('uint8_t', capacity * 3),
+        ('uint8_t', capacity * 3),
+    ]
+    rv = []
+    offset = _HEADER_SIZE
+    for type_, count in counts:
+        rv.append((type_, offset))
+        offset += -(-c.ffi.sizeof(type_) * count // 8) * 8
+    return rv, offset
+
+
+def _capacity(size, max_size):
+    if max_size is None:
+        max_size = size
+    capacity = max_size.rows * max_size.cols
+    if size.rows * size.cols > capacity:
+        raise ValueError('size %r is larger than max_size %r' % (size, max_size))
+    return capacity
+
+
+def _arrays(base, layout, rows, cols):
+    ''' A `core.ScreenSnapshot` of `rows` x `cols` cells in a segment.
+    '''
+    pointers = [c.ffi.cast(type_ + '*', base + offset) for type_, offset in layout]
+    rect = core.Rect(start_row=0, end_row=rows, start_col=0, end_col=cols)
+    return core.ScreenSnapshot(rect, chars=pointers[0], width=pointers[1], attrs=pointers[2], fg=pointers[3], bg=pointers[4])
+
+
+@attr.s(slots=True, frozen=True)
+class Screen:
+    ''' A consistent copy of a published screen.
+    '''
+    generation = attr.ib()
+    size = attr.ib()
+    cursor = attr.ib()
+    cursor_visible = attr.ib()
+    # False once the program exited, or the terminal was closed.
+    alive = attr.ib()
+    snapshot = attr.ib()
+
+
+class Terminal:
+    ''' The front process's handle on a terminal in a worker.
+    '''
+    __slots__ = ('farm', 'id', 'worker', 'capacity', '_shm', '_base', '_seq', '_layout')
+    def __init__(self, farm, id, worker, capacity, shm):
+        self.farm = farm
+        self.id = id
+        self.worker = worker
+        self.capacity = capacity
+        self._shm = shm
+        self._base = c.ffi.from_buffer(shm.buf)
+        self._seq = c.ffi.cast('uint64_t*', self._base)
+        self._layout, _ = _layout(capacity)
+
+    def __repr__(self):
+        return '<%s id=%d worker=%d generation=%d>' % (type(self).__name__, self.id, self.worker, self.generation)
+
+    @property
+    def closed(self):
+        return self._shm is None
+
+    @property
+    def generation(self):
+        ''' Changes whenever a new screen was published; odd while one is
+            being written.
+        '''
+        return c.vterm_py_seqlock_read(self._seq)
+
+    def read(self, *, out=None):
+        ''' Copy the current screen, reusing the buffers of `out` (a
+            `Screen`) if its size still matches.
+        '''
+        seq = self._seq
+        base = self._base
+        while True:
+            generation = c.vterm_py_seqlock_read(seq)
+            if generation & 1:
+                os.sched_yield()
+                continue
+            rows, cols, cursor_row, cursor_col, cursor_visible, alive = _HEADER.unpack_from(self._shm.buf, 8)
+            n = rows * cols
+            if n > self.capacity:
+                # Torn read.
+                continue
+            if out is not None and (out.snapshot.rows, out.snapshot.cols) == (rows, cols):
+                snapshot = out.snapshot
+            else:
+                snapshot = core.ScreenSnapshot(core.Rect(start_row=0, end_row=rows, start_col=0, end_col=cols))
+            for (type_, offset), (dest, count) in zip(self._layout, [
+                    (snapshot.chars, n * c.VTERM_MAX_CHARS_PER_CELL),
+                    (snapshot.width, n),
+                    (snapshot.attrs, n),
+                    (snapshot.fg, n * 3),
+                    (snapshot.bg, n * 3)]):
+                c.ffi.memmove(dest, base + offset, count * c.ffi.sizeof(type_))
+            if c.vterm_py_seqlock_read(seq) == generation:
+                return Screen(generation, core.Size(rows=rows, cols=cols), core.Pos(row=cursor_row, col=cursor_col), cursor_visible, alive, snapshot)
+
+    def write(self, data):
+        ''' Send `data` (e.g. keystrokes) to the program.
+        '''
+        self.farm._send(self.worker, ('write', self.id, bytes(data)))
+
+    def feed(self, data):
+        ''' Have the terminal parse `data`, as if the program printed it.
+        '''
+        self.farm._send(self.worker, ('feed', self.id, bytes(data)))
+
+    def resize(self, size):
+        if size.rows * size.cols > self.capacity:
+            raise ValueError('size %r needs more than %d cells' % (size, self.capacity))
+        self.farm._send(self.worker, ('resize', self.id, size))
+
+    def close(self):
+        shm = self._shm
+        if shm is None:
+            return
+        self._shm = None
+        self.farm._forget(self)
+        c.ffi.release(self._base)
+        self._base = self._seq = None
+        shm.close()
+        shm.unlink()
+
+
+class Farm(util.Closing):
+    ''' Starts `workers` processes (default: one per CPU), and places each
+        new terminal on the one hosting the fewest.
+    '''
+    def __init__(self, workers=None, *, mp_context=None):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if mp_context is None:
+            mp_context = multiprocessing.get_context()
+        self._ids = itertools.count()
+        self._terminals = {}
+        self._conns = []
+        self._processes = []
+        self._loads = [0] * workers
+        for _ in range(workers):
+            conn, child_conn = mp_context.Pipe()
+            process = mp_context.Process(target=_worker, args=(child_conn,), daemon=True)
+            process.start()
+            child_conn.close()
+            self._conns.append(conn)
+            self._processes.append(process)
+
+    def __repr__(self):
+        return '<%s workers=%d terminals=%d>' % (type(self).__name__, len(self._processes), len(self._terminals))
+
+    @property
+    def closed(self):
+        return not self._processes
+
+    def __iter__(self):
+        return iter(list(self._terminals.values()))
+
+    def spawn(self, args, *, size=core.STANDARD_SIZE, max_size=None, **kwargs):
+        ''' Run `args` in a `pty.VTermPty` in a worker; `kwargs` are passed
+            on to it. The terminal can grow up to `max_size` cells
+            (default: `size`).
+        '''
+        return self._open(('spawn', args, size, kwargs), size, max_size)
+
+    def open(self, *, size=core.STANDARD_SIZE, max_size=None):
+        ''' Create a plain `core.VTerm` in a worker, to be given output
+            with `Terminal.feed`.
+        '''
+        return self._open(('open', size), size, max_size)
+
+    def _open(self, command, size, max_size):
+        capacity = _capacity(size, max_size)
+        _, nbytes = _layout(capacity)
+        shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        try:
+            worker = self._loads.index(min(self._loads))
+            terminal = Terminal(self, next(self._ids), worker, capacity, shm)
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+        self._terminals[terminal.id] = terminal
+        self._loads[worker] += 1
+        self._send(worker, (command[0], terminal.id, shm.name, capacity) + command[1:])
+        return terminal
+
+    def _send(self, worker, command):
+        self._conns[worker].send(command)
+
+    def _forget(self, terminal):
+        if self._terminals.pop(terminal.id, None) is not None:
+            self._loads[terminal.worker] -= 1
+            if self._processes:
+                self._send(terminal.worker, ('close', terminal.id))
+
+    def poll(self, timeout=0):
+        ''' Wait up to `timeout` seconds for news from the workers, and
+            return a list of (event, terminal, detail): ('exit', terminal,
+            None) when a program exited, or ('error', terminal, message)
+            when a command failed.
+        '''
+        rv = []
+        for conn in multiprocessing.connection.wait(self._conns, timeout):
+            while conn.poll():
+                event, id, detail = conn.recv()
+                terminal = self._terminals.get(id)
+                if terminal is not None:
+                    rv.append((event, terminal, detail))
+        return rv
+
+    def close(self):
+        ''' Close every terminal, and stop the workers.
+        '''
+        for terminal in list(self._terminals.values()):
+            terminal.close()
+        for conn in self._conns:
+            try:
+                conn.send(('stop',))
+            except OSError:
+                pass
+        for process in self._processes:
+            process.join()
+        for conn in self._conns:
+            conn.close()
+        self._conns = []
+        self._processes = []
+
+
+class _FarmCallbacks(core.ScreenCallbacks):
+    ''' Tracks the cursor's visibility, and notes that the cursor moved.
+    '''
+    def __init__(self, vt, *, on_change, **kwargs):
+        super().__init__(vt, **kwargs)
+        self.on_change = on_change
+        self.cursor_visible = True
+
+    def movecursor(self, pos, oldpos, visible):
+        self.cursor_visible = bool(visible)
+        self.on_change()
+        return 0
+
+    def settermprop(self, prop, val):
+        if prop == core.Prop.CURSORVISIBLE:
+            self.cursor_visible = bool(val)
+            self.on_change()
+        return 1
+
+
+class _FarmPtyCallbacks(_FarmCallbacks, pty.PtyCallbacks):
+    pass
+
+
+class _Published:
+    ''' A worker's terminal, and the segment it is published into.
+    '''
+    __slots__ = ('vt', 'callbacks', 'shm', 'session', 'alive', '_base', '_seq', '_layout', '_capacity', '_snapshot', '_pending')
+    def __init__(self, vt, callbacks, shm, capacity):
+        self.vt = vt
+        self.callbacks = callbacks
+        self.shm = shm
+        # The `manager.Session`, for programs in a pty.
+        self.session = None
+        self.alive = True
+        self._base = c.ffi.from_buffer(shm.buf)
+        self._seq = c.ffi.cast('uint64_t*', self._base)
+        self._layout, _ = _layout(capacity)
+        self._capacity = capacity
+        self._snapshot = None
+        # Input for the program that the pty didn't take yet.
+        self._pending = b''
+
+    def publish(self):
+        vt = self.vt
+        size = vt.get_size()
+        snapshot = self._snapshot
+        if snapshot is None or (snapshot.rows, snapshot.cols) != (size.rows, size.cols):
+            snapshot = self._snapshot = _arrays(self._base, self._layout, size.rows, size.cols)
+        pos = vt.get_cursorpos()
+        c.vterm_py_seqlock_write_begin(self._seq)
+        try:
+            vt.screen_snapshot(out=snapshot)
+            _HEADER.pack_into(self.shm.buf, 8, size.rows, size.cols, pos.row, pos.col, self.callbacks.cursor_visible, self.alive)
+        finally:
+            c.vterm_py_seqlock_write_end(self._seq)
+
+    def close(self):
+        if isinstance(self.vt, pty.VTermPty):
+            self.vt.close()
+        self._snapshot = None
+        c.ffi.release(self._base)
+        self._base = self._seq = None
+        self.shm.close()
+
+
+def _worker(conn):
+    published = {}
+    dirty = set()
+    # Terminals with input for their program waiting for the pty.
+    blocked = set()
+    running = True
+
+    def send(event, id, detail=None):
+        try:
+            conn.send((event, id, detail))
+        except OSError:
+            pass
+
+    def on_damage(session):
+        dirty.add(session.data)
+
+    def on_exit(session):
+        id = session.data
+        terminal = published[id]
+        terminal.alive = False
+        terminal.publish()
+        dirty.discard(id)
+        blocked.discard(id)
+        send('exit', id)
+
+    def flush_input(id):
+        terminal = published[id]
+        data = terminal._pending
+        try:
+            n = os.write(terminal.vt._master_fd, data)
+        except BlockingIOError:
+            n = 0
+        terminal._pending = data[n:]
+        if terminal._pending:
+            blocked.add(id)
+        else:
+            blocked.discard(id)
+
+    def open_(id, name, capacity, make_vt):
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            callbacks = []
+            vt = make_vt(lambda: dirty.add(id), callbacks)
+        except BaseException:
+            shm.close()
+            raise
+        terminal = published[id] = _Published(vt, callbacks[0], shm, capacity)
+        terminal.publish()
+        return terminal
+
+    def spawn(id, name, capacity, args, size, kwargs):
+        def make_vt(on_change, callbacks):
+            def callbacks_cls(vt, **kwargs):
+                rv = _FarmPtyCallbacks(vt, on_change=on_change, **kwargs)
+                callbacks.append(rv)
+                return rv
+            return pty.VTermPty(args, size=size, callbacks_cls=callbacks_cls, **kwargs)
+        terminal = open_(id, name, capacity, make_vt)
+        _set_winsize(terminal.vt._master_fd, size)
+        terminal.session = mgr.add(terminal.vt, data=id)
+
+    def open_vterm(id, name, capacity, size):
+        def make_vt(on_change, callbacks):
+            vt = core.VTerm(size)
+            callbacks.append(_FarmCallbacks(vt, on_change=on_change))
+            vt.set_callbacks(callbacks[0])
+            return vt
+        open_(id, name, capacity, make_vt)
+
+    def write(id, data):
+        terminal = published[id]
+        if terminal.session is None:
+            raise TypeError('terminal %d has no program to write to' % id)
+        if terminal.alive:
+            terminal._pending += data
+            flush_input(id)
+
+    def feed(id, data):
+        published[id].vt.input_write(data)
+        published[id].vt.flush_damage()
+        dirty.add(id)
+
+    def resize(id, size):
+        terminal = published[id]
+        terminal.vt.set_size(size)
+        if terminal.session is not None and terminal.alive:
+            _set_winsize(terminal.vt._master_fd, size)
+        dirty.add(id)
+
+    def close(id):
+        terminal = published.pop(id)
+        dirty.discard(id)
+        blocked.discard(id)
+        # The manager already dropped the session of a program that exited,
+        # and its fd may belong to another session by now.
+        if terminal.session is not None and terminal.alive:
+            mgr.remove(terminal.session)
+        terminal.close()
+
+    commands = {'spawn': spawn, 'open': open_vterm, 'write': write, 'feed': feed, 'resize': resize, 'close': close}
+
+    def on_command():
+        nonlocal running
+        while running and conn.poll():
+            try:
+                command = conn.recv()
+            except EOFError:
+                running = False
+                break
+            if command[0] == 'stop':
+                running = False
+                break
+            id = command[1]
+            try:
+                commands[command[0]](*command[1:])
+            except Exception as e:
+                send('error', id, '%s: %s' % (type(e).__name__, e))
+
+    mgr = manager.SessionManager(on_damage=on_damage, on_exit=on_exit)
+    mgr.add_reader(conn.fileno(), on_command)
+    try:
+        while running:
+            mgr.poll(0.01 if blocked else None)
+            for id in list(blocked):
+                flush_input(id)
+            for id in dirty:
+                published[id].publish()
+            dirty.clear()
+    finally:
+        mgr.remove_reader(conn.fileno())
+        for id in list(published):
+            close(id)
+        mgr.close()
+        conn.close()
+
+
+def _set_winsize(fd, size):
+    fcntl.ioctl(fd, termios.TIOCSWINSZ, struct.pack('HHHH', size.rows, size.cols, 0, 0))
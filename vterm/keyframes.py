@@ -0,0 +1,274 @@
+''' Seek in a recording without replaying it from the start.
+
+    A `KeyframeIndex` holds periodic keyframes of a recording: the screen
+    at that point, serialized as the escape sequences that repaint it
+    (see `serialize_screen`), and where in the recording to resume. To
+    seek, the nearest earlier keyframe is painted onto a fresh VTerm, and
+    only the events after it are replayed.
+
+    A keyframe is taken once `bytes_interval` bytes of output were fed
+    since the last one, which bounds the replay work of a seek, or once
+    `time_interval` seconds of recording passed with at least `min_bytes`
+    of output, so that quiet stretches are covered without repeating
+    identical keyframes.
+
+    Keyframes keep what is on the screen, and the cursor's position and
+    visibility; terminal modes (such as the scroll region or the alternate
+    screen) and the pen are not restored, so output right after a seek
+    may differ slightly from a full replay until the program repaints.
+
+    The index is saved next to the recording, as `index_path(recording)`:
+    `_MAGIC`, the length of a JSON header, the header (which also records
+    the size and mtime of the recording, to notice when it changed), then
+    the keyframe data.
+'''
+import bisect
+import json
+import mmap
+import os
+import struct
+
+import attr
+
+from . import core, render, replay, util
+
+
+_MAGIC = b'\x89VTIDX\r\n'
+_VERSION = 1
+_LENGTH = struct.Struct('<I')
+
+
+@attr.s(slots=True, frozen=True)
+class Keyframe:
+    # Recording time of the last event before the keyframe, or None if the
+    # recording has no timestamps.
+    time = attr.ib()
+    # Bytes of output before the keyframe.
+    nbytes = attr.ib()
+    # Where to continue reading the recording (see `replay.open_events`).
+    resume = attr.ib()
+    size = attr.ib()
+    # Where the serialized screen is in the index's data.
+    offset = attr.ib()
+    length = attr.ib()
+
+
+def index_path(path):
+    return os.fspath(path) + '.vtidx'
+
+
+class _CursorCallbacks(core.ScreenCallbacks):
+    ''' Follows whether the cursor is visible, which libvterm doesn't let
+        us ask, for `serialize_screen`.
+    '''
+    def __init__(self, vt):
+        super().__init__(vt)
+        self.cursor_visible = True
+
+    def settermprop(self, prop, val):
+        if prop == core.Prop.CURSORVISIBLE:
+            self.cursor_visible = bool(val)
+        return 1
+
+
+def serialize_screen(vt, *, cursor_visible=True):
+    ''' Escape sequences that paint the screen of `vt` onto a blank
+        terminal of the same size, leave the cursor where it is in `vt`
+        (shown or hidden as `cursor_visible` says), and reset the pen.
+    '''
+    out = []
+    renderer = render.AnsiRenderer(vt, out.append)
+    # A fresh renderer has seen no callbacks, so tell it where the cursor is.
+    pos = vt.state_get_cursorpos()
+    renderer.movecursor(pos, pos, cursor_visible)
+    renderer.settermprop(core.Prop.CURSORVISIBLE, cursor_visible)
+    renderer.render()
+    out.append(b'\x1b[m')
+    return b''.join(out)
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+class KeyframeIndex(util.Closing):
+    ''' Keyframes of the recording at `path`; see `build`, `load` and
+        `open_index`.
+    '''
+    def __init__(self, path, format, timing, size, keyframes, data):
+        self.path = path
+        self.format = format
+        self.timing = timing
+        # The size replay starts with, if not the one in the recording.
+        self.size = size
+        self.keyframes = keyframes
+        self._data = data
+        self._times = [k.time for k in keyframes]
+        self._nbytes = [k.nbytes for k in keyframes]
+        # The recording, mapped on the first seek.
+        self._recording = None
+        self._closed = False
+
+    def __repr__(self):
+        return '<%s path=%r keyframes=%d>' % (type(self).__name__, self.path, len(self.keyframes))
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        ''' Unmap the recording, if a seek mapped it.
+        '''
+        self._closed = True
+        recording = self._recording
+        self._recording = None
+        if isinstance(recording, mmap.mmap):
+            recording.close()
+
+    @classmethod
+    def build(cls, path, *, format=None, timing=None, size=None, bytes_interval=4 << 20, time_interval=60.0, min_bytes=64 << 10, chunk_size=replay.CHUNK_SIZE):
+        ''' Replay the recording at `path` once, taking keyframes as it goes.
+        '''
+        recording = replay._open_map(path)
+        events = output = None
+        keyframes = []
+        blobs = []
+        offset = 0
+        try:
+            if format is None:
+                format = replay.detect_format(recording)
+            header_size, events = replay.open_events(recording, format, timing=timing, chunk_size=chunk_size)
+            vt = replay.new_vterm(size or header_size)
+            callbacks = _CursorCallbacks(vt)
+            vt.screen_set_callbacks(callbacks)
+            nbytes = last_nbytes = 0
+            last_time = 0.0
+            for resume, t, type_, output in events:
+                nbytes += replay.feed_event(vt, type_, output)
+                since = nbytes - last_nbytes
+                if since >= bytes_interval or (since >= min_bytes and t is not None and t - last_time >= time_interval):
+                    blob = serialize_screen(vt, cursor_visible=callbacks.cursor_visible)
+                    keyframes.append(Keyframe(t, nbytes, resume, vt.get_size(), offset, len(blob)))
+                    blobs.append(blob)
+                    offset += len(blob)
+                    last_nbytes = nbytes
+                    if t is not None:
+                        last_time = t
+        finally:
+            events = output = None
+            if isinstance(recording, mmap.mmap):
+                recording.close()
+        return cls(path, format, timing, size, keyframes, b''.join(blobs))
+
+    def save(self, path=None):
+        ''' Write the index to `path` (default: `index_path` of the
+            recording), atomically.
+        '''
+        if path is None:
+            path = index_path(self.path)
+        header = {
+            'version': _VERSION,
+            'format': self.format,
+            'timing': self.timing,
+            'size': None if self.size is None else [self.size.rows, self.size.cols],
+            'recording': _stat_key(self.path),
+            'keyframes': [[k.time, k.nbytes, list(k.resume), k.size.rows, k.size.cols, k.offset, k.length] for k in self.keyframes],
+        }
+        header = json.dumps(header).encode()
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(_MAGIC + _LENGTH.pack(len(header)) + header)
+                f.write(self._data)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path, index=None):
+        ''' Read the index of the recording at `path` (from `index`, by
+            default `index_path(path)`). Returns None if there is none, or
+            the recording changed since it was built.
+        '''
+        if index is None:
+            index = index_path(path)
+        try:
+            with open(index, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return None
+        start = len(_MAGIC) + _LENGTH.size
+        if raw[:len(_MAGIC)] != _MAGIC:
+            return None
+        length, = _LENGTH.unpack_from(raw, len(_MAGIC))
+        header = json.loads(raw[start:start + length])
+        if header['version'] != _VERSION or header['recording'] != _stat_key(path):
+            return None
+        keyframes = [Keyframe(t, nbytes, tuple(resume), core.Size(rows=rows, cols=cols), offset, length_)
+                for t, nbytes, resume, rows, cols, offset, length_ in header['keyframes']]
+        size = header['size']
+        if size is not None:
+            size = core.Size(rows=size[0], cols=size[1])
+        return cls(path, header['format'], header['timing'], size, keyframes, raw[start + length:])
+
+    def _keyframe_vterm(self, keyframe):
+        vt = replay.new_vterm(keyframe.size)
+        vt.input_write(self._data[keyframe.offset:keyframe.offset + keyframe.length])
+        return vt
+
+    def seek(self, time=None, *, nbytes=None):
+        ''' A new VTerm showing the recording after the events up to `time`
+            seconds, or after exactly `nbytes` bytes of output.
+        '''
+        if self._closed:
+            raise ValueError('seek on a closed index')
+        if (time is None) == (nbytes is None):
+            raise TypeError('pass exactly one of time and nbytes')
+        if time is not None:
+            if self.format == 'raw' and self.timing is None:
+                raise ValueError('%r has no timestamps' % self.path)
+            i = bisect.bisect_right(self._times, time)
+        else:
+            i = bisect.bisect_right(self._nbytes, nbytes)
+        if self._recording is None:
+            self._recording = replay._open_map(self.path)
+        events = output = None
+        try:
+            if i:
+                keyframe = self.keyframes[i - 1]
+                vt = self._keyframe_vterm(keyframe)
+                done = keyframe.nbytes
+                _, events = replay.open_events(self._recording, self.format, timing=self.timing, resume=keyframe.resume)
+            else:
+                header_size, events = replay.open_events(self._recording, self.format, timing=self.timing)
+                vt = replay.new_vterm(self.size or header_size)
+                done = 0
+            for _, t, type_, output in events:
+                if time is not None:
+                    if t > time:
+                        break
+                elif type_ == 'o':
+                    if isinstance(output, str):
+                        output = output.encode('utf-8', 'surrogateescape')
+                    if done + len(output) >= nbytes:
+                        vt.input_write(output[:nbytes - done])
+                        break
+                done += replay.feed_event(vt, type_, output)
+        finally:
+            events = output = None
+        return vt
+
+
+def open_index(path, *, rebuild=False, save=True, **kwargs):
+    ''' Load the index of the recording at `path`, or build it (with
+        `kwargs`, see `KeyframeIndex.build`) and, if `save`, store it.
+    '''
+    index = None if rebuild else KeyframeIndex.load(path)
+    if index is None:
+        index = KeyframeIndex.build(path, **kwargs)
+        if save:
+            index.save()
+    return index
@@ -0,0 +1,185 @@
+''' Drive many `pty.VTermPty`s from one `selectors` loop.
+
+    Each ready session gets one `VTermPty.pump` per round, limited to
+    `read_budget` bytes; sessions that used their whole budget go to the
+    back of the queue, so one flooding program can't starve the rest.
+'''
+import collections
+import os
+import selectors
+
+import attr
+
+from . import pty
+
+
+@attr.s(slots=True)
+class Stats:
+    bytes_read = attr.ib(default=0)
+    bytes_written = attr.ib(default=0)
+    pumps = attr.ib(default=0)
+    # Pumps that stopped because the read budget ran out.
+    throttled = attr.ib(default=0)
+    damaged = attr.ib(default=0)
+
+
+class Session:
+    ''' One managed terminal; `stats` are its own.
+    '''
+    __slots__ = ('vt', 'fd', 'stats', 'data', '_events')
+    def __init__(self, vt, data=None):
+        self.vt = vt
+        # Kept, so that a session can be removed after its VTerm was closed.
+        self.fd = vt._master_fd
+        self.stats = Stats()
+        self.data = data
+        self._events = 0
+
+    def __repr__(self):
+        return '<%s fd=%d vt=%r>' % (type(self).__name__, self.fd, self.vt)
+
+    def fileno(self):
+        return self.fd
+
+
+class SessionManager:
+    ''' Owns a selector over the master fds of its sessions.
+
+        `on_damage(session)` is called after a pump that caused damage
+        (damage is flushed once per pump), and `on_exit(session)` when a
+        program closes its pty; the session is then closed and removed.
+    '''
+    def __init__(self, *, read_budget=65536, on_damage=None, on_exit=None, selector=None):
+        self.read_budget = read_budget
+        self.on_damage = on_damage
+        self.on_exit = on_exit
+        self.stats = Stats()
+        self.exited = 0
+        self._selector = selectors.DefaultSelector() if selector is None else selector
+        self._sessions = {}
+        # Sessions that may have more to read, in round-robin order.
+        self._ready = collections.OrderedDict()
+
+    def __repr__(self):
+        return '<%s sessions=%d ready=%d>' % (type(self).__name__, len(self._sessions), len(self._ready))
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __iter__(self):
+        return iter(list(self._sessions.values()))
+
+    def spawn(self, args, *, data=None, **kwargs):
+        ''' Start `args` in a new `VTermPty` (see there for `kwargs`) and
+            manage it.
+        '''
+        vt = pty.VTermPty(args, **kwargs)
+        try:
+            return self.add(vt, data=data)
+        except BaseException:
+            vt.close()
+            raise
+
+    def add(self, vt, *, data=None):
+        session = Session(vt, data)
+        fd = session.fileno()
+        os.set_blocking(fd, False)
+        session._events = selectors.EVENT_READ
+        self._selector.register(fd, selectors.EVENT_READ, session)
+        self._sessions[fd] = session
+        return session
+
+    def remove(self, session):
+        ''' Stop managing `session`, without closing it.
+        '''
+        fd = session.fileno()
+        # Once a session is gone, its fd may be reused by a newer one.
+        if self._sessions.get(fd) is not session:
+            return
+        del self._sessions[fd]
+        self._ready.pop(fd, None)
+        self._selector.unregister(fd)
+
+    def add_reader(self, fd, callback):
+        ''' Call `callback()` whenever `fd` is readable, from `poll`.
+        '''
+        self._selector.register(fd, selectors.EVENT_READ, callback)
+
+    def remove_reader(self, fd):
+        self._selector.unregister(fd)
+
+    def close(self):
+        ''' Close every session, and the selector.
+        '''
+        for session in list(self._sessions.values()):
+            self.remove(session)
+            session.vt.close()
+        self._selector.close()
+
+    def poll(self, timeout=None):
+        ''' Wait up to `timeout` seconds for output, then give every ready
+            session one pump. Returns the number of sessions pumped.
+        '''
+        ready = self._ready
+        for key, mask in self._selector.select(0 if ready else timeout):
+            if isinstance(key.data, Session):
+                ready[key.fd] = key.data
+            else:
+                key.data()
+        pumped = 0
+        for fd, session in list(ready.items()):
+            # Anything left over is moved to the back for the next round.
+            del ready[fd]
+            if self._pump(session):
+                ready[fd] = session
+            pumped += 1
+        return pumped
+
+    def run(self, until=lambda: False, *, timeout=1.0):
+        ''' Poll until there are no sessions left, or `until()` is true.
+        '''
+        while self._sessions and not until():
+            self.poll(timeout)
+
+    def _pump(self, session):
+        ''' Returns whether the session may have more to read right away.
+        '''
+        budget = self.read_budget
+        try:
+            result = session.vt.pump(budget)
+        except OSError:
+            self._exit(session)
+            return False
+        for stats in (session.stats, self.stats):
+            stats.pumps += 1
+            stats.bytes_read += result.bytes_read
+            stats.bytes_written += result.bytes_written
+            if result.damaged:
+                stats.damaged += 1
+        if result.damaged and self.on_damage is not None:
+            self.on_damage(session)
+        if result.eof:
+            self._exit(session)
+            return False
+        # A pump with replies pending doesn't read, so only wait for the fd
+        # to become writable; waiting for it to be readable too would spin.
+        events = selectors.EVENT_WRITE if result.output_pending else selectors.EVENT_READ
+        if events != session._events:
+            session._events = events
+            self._selector.modify(session.fileno(), events, session)
+        if result.output_pending:
+            return False
+        if budget and result.bytes_read >= budget:
+            session.stats.throttled += 1
+            self.stats.throttled += 1
+            return True
+        return False
+
+    def _exit(self, session):
+        self.remove(session)
+        self.exited += 1
+        try:
+            if self.on_exit is not None:
+                self.on_exit(session)
+        finally:
+            session.vt.close()
@@ -0,0 +1,157 @@
+''' A Python-side copy of the screen, kept up to date from callbacks.
+
+    Reading a `ScreenMirror` costs no FFI calls: damage is fetched into
+    it in bulk as it happens, and moved rectangles are moved within it
+    instead of being fetched again.
+'''
+import array
+
+from . import c, core
+
+
+_N = c.VTERM_MAX_CHARS_PER_CELL
+# The chars of the right half of a wide character.
+_WIDE_FILLER = 0xFFffFFff
+_U32 = 'I' if array.array('I').itemsize == 4 else 'L'
+# (array typecode, C type, entries per cell) of chars, width, attrs, fg, bg.
+_FIELDS = [(_U32, 'uint32_t', _N), ('b', 'int8_t', 1), ('H', 'uint16_t', 1), ('B', 'uint8_t', 3), ('B', 'uint8_t', 3)]
+
+
+class ScreenMirror(core.ScreenCallbacks):
+    ''' Screen callbacks that keep a copy of the grid in flat arrays, in
+        row-major order with the layout of `core.ScreenSnapshot`: `chars`
+        has VTERM_MAX_CHARS_PER_CELL entries per cell, `attrs` are packed
+        (see `core.unpack_attrs`), and `fg`/`bg` have 3 entries per cell.
+
+        `generation` grows with every change, and `generations[row]` is
+        its value when `row` last changed, so a reader that remembers the
+        generation it last saw can skip the rows that didn't change.
+
+        To use it together with other callbacks, e.g. `pty.PtyCallbacks`,
+        derive from both; the methods here also call those of the next
+        class.
+    '''
+    def __init__(self, vt, **kwargs):
+        super().__init__(vt, **kwargs)
+        self.generation = 0
+        self.generations = []
+        self.rows = self.cols = 0
+        self.chars, self.width, self.attrs, self.fg, self.bg = [array.array(typecode) for typecode, _, _ in _FIELDS]
+        self._pointers = None
+        self._reshape(vt.get_size())
+
+    def __repr__(self):
+        return '<%s rows=%d cols=%d generation=%d>' % (type(self).__name__, self.rows, self.cols, self.generation)
+
+    def _arrays(self):
+        return (self.chars, self.width, self.attrs, self.fg, self.bg)
+
+    def _reshape(self, size):
+        # Arrays can't change size while C pointers into them exist.
+        if self._pointers is not None:
+            for pointer in self._pointers:
+                c.ffi.release(pointer)
+            self._pointers = None
+        ncells = size.rows * size.cols
+        for arr, (_, _, per_cell) in zip(self._arrays(), _FIELDS):
+            n = ncells * per_cell
+            if len(arr) > n:
+                del arr[n:]
+            else:
+                arr.frombytes(bytes((n - len(arr)) * arr.itemsize))
+        self._pointers = [c.ffi.from_buffer(ctype + '[]', arr) for arr, (_, ctype, _) in zip(self._arrays(), _FIELDS)]
+        self.rows, self.cols = size.rows, size.cols
+        del self.generations[size.rows:]
+        self.generations.extend([0] * (size.rows - len(self.generations)))
+        self._fetch(core.Rect(start_row=0, end_row=size.rows, start_col=0, end_col=size.cols))
+
+    def _fetch(self, rect):
+        rect = core.Rect(
+                start_row=max(rect.start_row, 0), end_row=min(rect.end_row, self.rows),
+                start_col=max(rect.start_col, 0), end_col=min(rect.end_col, self.cols))
+        if rect.start_row >= rect.end_row or rect.start_col >= rect.end_col:
+            return
+        i = rect.start_row * self.cols + rect.start_col
+        self.vt._screen_copy_rect(rect, self.cols, *[pointer + i * per_cell for pointer, (_, _, per_cell) in zip(self._pointers, _FIELDS)])
+        self._touch(rect.start_row, rect.end_row)
+
+    def _touch(self, start_row, end_row):
+        self.generation += 1
+        generation = self.generation
+        generations = self.generations
+        for row in range(start_row, end_row):
+            generations[row] = generation
+
+    def damage(self, rect):
+        self._fetch(rect)
+        super().damage(rect)
+        return 1
+
+    def moverect(self, dest, src):
+        cols = self.cols
+        nrows = dest.end_row - dest.start_row
+        width = dest.end_col - dest.start_col
+        if dest.start_col == src.start_col == 0 and width == cols:
+            # Whole rows are contiguous, so each field is one memmove.
+            moves = [(dest.start_row * cols, src.start_row * cols, nrows * cols)]
+        else:
+            rows = range(nrows) if dest.start_row <= src.start_row else range(nrows - 1, -1, -1)
+            moves = [((dest.start_row + i) * cols + dest.start_col, (src.start_row + i) * cols + src.start_col, width) for i in rows]
+        memmove = c.ffi.memmove
+        for pointer, arr, (_, _, per_cell) in zip(self._pointers, self._arrays(), _FIELDS):
+            size = arr.itemsize * per_cell
+            for to, from_, n in moves:
+                memmove(pointer + to * per_cell, pointer + from_ * per_cell, n * size)
+        self._touch(dest.start_row, dest.end_row)
+        super().moverect(dest, src)
+        # libvterm needn't send damage for what moved.
+        return 1
+
+    def resize(self, size):
+        self._reshape(size)
+        super().resize(size)
+        return 1
+
+    def changed_rows(self, since):
+        ''' The rows that changed after generation `since`.
+        '''
+        return [row for row, generation in enumerate(self.generations) if generation > since]
+
+    def cell(self, pos):
+        ''' (text, width, attrs, fg, bg) of the cell at `pos`, with `fg` and
+            `bg` as 3 bytes; the right half of a wide character has the
+            text None.
+        '''
+        i = pos.row * self.cols + pos.col
+        return (self._cell_text(i * _N), self.width[i], self.attrs[i], self.fg[3 * i:3 * i + 3].tobytes(), self.bg[3 * i:3 * i + 3].tobytes())
+
+    def _cell_text(self, start):
+        chars = self.chars
+        first = chars[start]
+        if first == _WIDE_FILLER:
+            return None
+        if not first:
+            return ' '
+        if not chars[start + 1]:
+            return chr(first)
+        rv = []
+        for ch in chars[start:start + _N]:
+            if not ch:
+                break
+            rv.append(chr(ch))
+        return ''.join(rv)
+
+    def row_text(self, row):
+        ''' The text of `row`, with blank cells as spaces.
+        '''
+        chars = self.chars
+        parts = []
+        for start in range(row * self.cols * _N, (row + 1) * self.cols * _N, _N):
+            first = chars[start]
+            if first == _WIDE_FILLER:
+                continue
+            if first and not chars[start + 1]:
+                parts.append(chr(first))
+            else:
+                parts.append(self._cell_text(start))
+        return ''.join(parts)
@@ -0,0 +1,77 @@
+''' Zero-copy NumPy views of screen snapshots.
+
+    NumPy is only needed if this module is imported.
+'''
+import attr
+import numpy
+
+from . import c, core
+
+
+@attr.s(slots=True, frozen=True)
+class ScreenArrays:
+    ''' Arrays of shape (rows, cols, ...) viewing a `core.ScreenSnapshot`.
+
+        The arrays share memory with the snapshot, so taking a new snapshot
+        into the same buffers (see `screen_arrays`) updates them in place.
+    '''
+    snapshot = attr.ib()
+    chars = attr.ib()
+    width = attr.ib()
+    attrs = attr.ib()
+    fg = attr.ib()
+    bg = attr.ib()
+
+    def get_attr(self, name):
+        ''' Extract one field (e.g. 'bold') from the packed `attrs`.
+        '''
+        shift, mask = _attrs_layout[name]
+        return (self.attrs >> shift) & mask
+
+
+_attrs_layout = dict(zip(core.ScreenCell.Attrs.fields, core._packed_attrs_layout))
+
+
+def _view(cdata, dtype, shape):
+    return numpy.frombuffer(c.ffi.buffer(cdata), dtype=dtype).reshape(shape)
+
+
+def snapshot_arrays(snapshot):
+    shape = (snapshot.rows, snapshot.cols)
+    return ScreenArrays(
+            snapshot,
+            chars=_view(snapshot.chars, numpy.uint32, shape + (c.VTERM_MAX_CHARS_PER_CELL,)),
+            width=_view(snapshot.width, numpy.int8, shape),
+            attrs=_view(snapshot.attrs, numpy.uint16, shape),
+            fg=_view(snapshot.fg, numpy.uint8, shape + (3,)),
+            bg=_view(snapshot.bg, numpy.uint8, shape + (3,)),
+    )
+
+
+def screen_arrays(vt, rect=None, *, out=None):
+    ''' Snapshot `vt` and view the result.
+
+        If `out` is given, the snapshot is taken into its buffers and
+        `out` itself is returned.
+    '''
+    if out is not None:
+        vt.screen_snapshot(rect, out=out.snapshot)
+        return out
+    return snapshot_arrays(vt.screen_snapshot(rect))
+
+
+def color_keys(rgb):
+    ''' Pack an (..., 3) array of colors into 0xRRGGBB integers.
+    '''
+    rgb = rgb.astype(numpy.uint32)
+    return (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+
+def changed_cells(a, b):
+    ''' Boolean (rows, cols) mask of the cells that differ between two frames.
+    '''
+    return ((a.chars != b.chars).any(axis=-1)
+            | (a.width != b.width)
+            | (a.attrs != b.attrs)
+            | (a.fg != b.fg).any(axis=-1)
+            | (a.bg != b.bg).any(axis=-1))
@@ -1,6 +1,8 @@
 import os
 
-from . import c, core, util
+import attr
+
+from . import c, core, scrollback, util
 
 
 def _no_eq(b):
@@ -35,27 +37,46 @@ def _spawn(cmd, args, env=None, *, fds, tty=-1):
 
 
 class PtyCallbacks(core.ScreenCallbacks):
-    def __init__(self, vt):
+    def __init__(self, vt, *, scrollback_lines=10000, scrollback_bytes=None, scrollback_spill_dir=None):
+        ''' If `scrollback_spill_dir` is given, lines beyond the in-memory
+            limits are kept in files there instead of being dropped.
+        '''
         super().__init__(vt)
-        self.saved_cells = []
+        spill = None
+        if scrollback_spill_dir is not None:
+            spill = scrollback.SpillStore(scrollback_spill_dir)
+        self.scrollback = scrollback.Scrollback(max_lines=scrollback_lines, max_bytes=scrollback_bytes, spill=spill)
+
+    def close(self):
+        self.scrollback.close()
 
     def sb_pushline(self, cells):
-        self.saved_cells.append(cells)
+        self.scrollback.push(cells)
         return 1
 
     def sb_popline(self, cells_mut):
-        if not self.saved_cells:
-            return 0
-        old_cells = self.saved_cells.pop()
-        cells_len = min(len(old_cells), len(cells_mut))
-        cells_mut[:len(cells_len)] = old_cells[:cells_len]
-        return 1
+        return int(self.scrollback.pop(cells_mut))
+
+
+@attr.s(slots=True, frozen=True)
+class PumpResult:
+    bytes_read = attr.ib()
+    bytes_written = attr.ib()
+    # Replies still waiting for the pty to become writable.
+    output_pending = attr.ib()
+    eof = attr.ib()
+    damaged = attr.ib()
 
 
 class VTermPty(core.VTerm, util.Closing):
-    __slots__ = ('_master_fd', '_slave_name', 'callbacks')
-    def __init__(self, args, *, size=core.STANDARD_SIZE, cmd=None, env=None, callbacks_cls=PtyCallbacks, __os_close=os.close, **kwargs):
+    __slots__ = ('_master_fd', '_slave_name', 'callbacks', 'recorder', '_pump_state')
+    def __init__(self, args, *, size=core.STANDARD_SIZE, cmd=None, env=None, callbacks_cls=PtyCallbacks, recorder=None, __os_close=os.close, **kwargs):
+        ''' If `recorder` (a `record.Recorder`) is given, everything read
+            from the pty is recorded, and it is closed along with the pty.
+        '''
         self._master_fd = -1
+        self._pump_state = None
+        self.recorder = recorder
         super().__init__(size)
         master_fd, slave_fd = os.openpty()
         try:
@@ -87,4 +108,68 @@ class VTermPty(core.VTerm, util.Closing):
     def close(self, *, __os_close=os.close):
         master_fd = self._master_fd
         if master_fd != -1:
+            self._master_fd = -1
             __os_close(master_fd)
+            callbacks = getattr(self, 'callbacks', None)
+            if isinstance(callbacks, PtyCallbacks):
+                callbacks.close()
+            if self.recorder is not None:
+                self.recorder.close()
+
+    def set_size(self, size):
+        super().set_size(size)
+        if self.recorder is not None:
+            self.recorder.resize(size)
+
+    def input_from_fd(self, fd, buf=None):
+        recorder = self.recorder
+        if recorder is None:
+            return super().input_from_fd(fd, buf)
+        if buf is None:
+            buf, _ = self._get_input_buffer()
+        n = super().input_from_fd(fd, buf)
+        if n:
+            recorder.output(memoryview(buf)[:n])
+        return n
+
+    def pump(self, max_bytes=0):
+        ''' Read the pty until it would block (or `max_bytes`, if nonzero,
+            were read), feeding the terminal and writing its replies back,
+            then flush damage; all in one C call, without the GIL unless
+            Python callbacks run.
+
+            The master fd must be non-blocking. If the result has
+            `output_pending`, wait for the fd to become writable before
+            pumping again. Read and write errors raise OSError.
+
+            While recording, each C call reads at most one bufferful, so
+            that all of it can be handed to the recorder.
+        '''
+        tap = self._damage_tap()
+        buf, c_buf = self._get_input_buffer()
+        if self._pump_state is None:
+            self._pump_state = (c.ffi.new('char[]', 4096), c.ffi.new('VTermPyPumpResult*'))
+        out, result = self._pump_state
+        recorder = self.recorder
+        if recorder is None:
+            c.vterm_py_pump(self._vt, self._master_fd, c_buf, len(buf), out, len(out), max_bytes, tap, result)
+            self._dispatch_events()
+            if result.error:
+                raise OSError(result.error, os.strerror(result.error))
+            return PumpResult(result.bytes_read, result.bytes_written, result.output_pending, bool(result.eof), bool(result.damaged))
+
+        bytes_read = bytes_written = 0
+        damaged = False
+        while True:
+            limit = len(buf) if not max_bytes else min(len(buf), max_bytes - bytes_read)
+            c.vterm_py_pump(self._vt, self._master_fd, c_buf, len(buf), out, len(out), limit, tap, result)
+            if result.bytes_read:
+                recorder.output(memoryview(buf)[:result.bytes_read])
+            self._dispatch_events()
+            bytes_read += result.bytes_read
+            bytes_written += result.bytes_written
+            damaged = damaged or bool(result.damaged)
+            if result.error:
+                raise OSError(result.error, os.strerror(result.error))
+            if result.eof or result.output_pending or result.bytes_read < limit or bytes_read == max_bytes:
+                return PumpResult(bytes_read, bytes_written, result.output_pending, bool(result.eof), damaged)
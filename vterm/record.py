@@ -0,0 +1,198 @@
+''' Record what a terminal's program printed, with timestamps.
+
+    A `Recorder` only copies each chunk into a queue; a background thread
+    encodes and writes them, so a slow disk never stalls the read loop.
+    If the queue holds more than `max_buffer` bytes, further chunks are
+    dropped (and counted in `dropped`) until it drains, and a marker
+    event notes the gap in the recording.
+
+    Recordings are asciicast v2, or a compact binary framing: `MAGIC`,
+    then `_BINARY_HEADER` (rows, cols, and the start as a unix time), then
+    for each event `_BINARY_FRAME` (microseconds since the start, type
+    byte, payload length) and the payload. Types are those of asciicast:
+    'o' output, 'i' input, 'r' resize (payload "COLSxROWS") and 'm' marker.
+
+    Either can be compressed with gzip, or with zstd if `compression.zstd`
+    (Python 3.14) or the `zstandard` package is available.
+'''
+import codecs
+import collections
+import gzip
+import json
+import struct
+import threading
+import time
+
+from . import core, util
+
+
+MAGIC = b'\x89VTREC\r\n'
+_BINARY_HEADER = struct.Struct('<HHd')
+_BINARY_FRAME = struct.Struct('<QcI')
+
+
+def _open_zstd(raw):
+    try:
+        from compression import zstd
+    except ImportError:
+        import zstandard
+        return zstandard.ZstdCompressor().stream_writer(raw, closefd=False)
+    return zstd.ZstdFile(raw, 'wb')
+
+
+class Recorder(util.Closing):
+    ''' Writes a recording to `file` (a path, or a binary file, which is
+        not closed when the recorder is).
+
+        Feed it with `output`, `input` (only recorded if `record_input`)
+        and `resize`. `format` is 'asciicast' or 'binary', `compression`
+        None, 'gzip' or 'zstd'.
+    '''
+    def __init__(self, file, *, size=core.STANDARD_SIZE, format='asciicast', compression=None, record_input=False, max_buffer=8 << 20, clock=time.monotonic):
+        if format not in ('asciicast', 'binary'):
+            raise ValueError('unknown recording format %r' % format)
+        if compression not in (None, 'gzip', 'zstd'):
+            raise ValueError('unknown compression %r' % compression)
+        self.format = format
+        self.record_input = record_input
+        self.max_buffer = max_buffer
+        self.clock = clock
+        self.dropped = 0
+        self._start = clock()
+        self._lost = 0
+        self._queue = collections.deque()
+        self._queued = 0
+        self._closing = False
+        self._cond = threading.Condition(threading.Lock())
+        self._error = None
+        self._thread = None
+
+        self._raw = None
+        if isinstance(file, (str, bytes)) or hasattr(file, '__fspath__'):
+            file = self._raw = open(file, 'wb')
+        try:
+            self._file = self._out = file
+            if compression == 'gzip':
+                self._out = gzip.GzipFile(fileobj=file, mode='wb', compresslevel=6)
+            elif compression == 'zstd':
+                self._out = _open_zstd(file)
+            self._compressed = compression is not None
+            # Output and input may each end in the middle of a character.
+            self._decoders = {t: codecs.getincrementaldecoder('utf-8')('replace') for t in 'oi'}
+            self._write_header(size)
+        except BaseException:
+            if self._raw is not None:
+                self._raw.close()
+            raise
+        self._thread = threading.Thread(target=self._run, name='vterm-recorder', daemon=True)
+        self._thread.start()
+
+    def __repr__(self):
+        return '<%s format=%s queued=%d dropped=%d>' % (type(self).__name__, self.format, self._queued, self.dropped)
+
+    @property
+    def closed(self):
+        return self._thread is None
+
+    def output(self, data):
+        ''' Record `data` printed by the program; it is copied, so it may
+            be a view of a buffer that is about to be reused.
+        '''
+        self._put(b'o', bytes(data))
+
+    def input(self, data):
+        if self.record_input:
+            self._put(b'i', bytes(data))
+
+    def resize(self, size):
+        self._put(b'r', b'%dx%d' % (size.cols, size.rows))
+
+    def _put(self, type_, data):
+        t = self.clock() - self._start
+        n = len(data)
+        with self._cond:
+            if self._closing:
+                return
+            if self._queued + n > self.max_buffer:
+                self.dropped += n
+                self._lost += n
+                return
+            if self._lost:
+                self._queue.append((t, b'm', b'dropped %d bytes' % self._lost))
+                self._lost = 0
+            self._queue.append((t, type_, data))
+            self._queued += n
+            self._cond.notify()
+
+    def _write_header(self, size):
+        if self.format == 'asciicast':
+            header = {'version': 2, 'width': size.cols, 'height': size.rows, 'timestamp': int(time.time())}
+            self._out.write(json.dumps(header).encode() + b'\n')
+        else:
+            self._out.write(MAGIC + _BINARY_HEADER.pack(size.rows, size.cols, time.time()))
+
+    def _encode(self, events):
+        out = []
+        if self.format == 'asciicast':
+            for t, type_, data in events:
+                type_ = type_.decode()
+                decoder = self._decoders.get(type_)
+                text = decoder.decode(data) if decoder is not None else data.decode('utf-8', 'replace')
+                out.append(json.dumps([round(t, 6), type_, text], ensure_ascii=False).encode())
+                out.append(b'\n')
+        else:
+            pack = _BINARY_FRAME.pack
+            for t, type_, data in events:
+                out.append(pack(int(t * 1e6), type_, len(data)))
+                out.append(data)
+        return b''.join(out)
+
+    def _run(self):
+        cond = self._cond
+        queue = self._queue
+        while True:
+            with cond:
+                while not queue and not self._closing:
+                    cond.wait()
+                events = list(queue)
+                queue.clear()
+                self._queued = 0
+                done = self._closing
+            try:
+                if events:
+                    self._out.write(self._encode(events))
+                    if not self._compressed:
+                        self._out.flush()
+            except Exception as e:
+                # Keep draining, so that the producer never blocks; the
+                # error is raised by close().
+                if self._error is None:
+                    self._error = e
+            if done:
+                break
+
+    def close(self):
+        ''' Write out everything queued, and finish the file.
+
+            Raises the first error the writer ran into, if any.
+        '''
+        thread = self._thread
+        if thread is None:
+            return
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        thread.join()
+        self._thread = None
+        try:
+            if self._compressed:
+                # Ends the compressed stream, but leaves the file open.
+                self._out.close()
+            if self._raw is not None:
+                self._raw.close()
+            else:
+                self._file.flush()
+        finally:
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
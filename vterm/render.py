@@ -0,0 +1,278 @@
+''' Mirror a VTerm's screen onto a real terminal.
+
+    `AnsiRenderer` remembers what the host terminal is showing, and on each
+    `render` sends only the cells that changed, with the shortest cursor
+    movements and SGR changes it can find.
+'''
+import weakref
+
+from . import c, core
+
+
+_CSI = '\x1b['
+# Merge runs of changed cells separated by fewer unchanged cells than this,
+# since repainting them is cheaper than moving the cursor over them.
+_GAP = 4
+# (field, {value: SGR parameter}) for the `core.ScreenCell.Attrs` fields
+# that SGR can set.
+SGR_ATTRS = [
+    ('bold', {0: '22', 1: '1'}),
+    ('underline', {0: '24', 1: '4', 2: '21', 3: '4'}),
+    ('italic', {0: '23', 1: '3'}),
+    ('blink', {0: '25', 1: '5'}),
+    ('reverse', {0: '27', 1: '7'}),
+    ('strike', {0: '29', 1: '9'}),
+    ('font', {i: str(10 + i) for i in range(10)}),
+]
+_sgr_layout = [(dict(zip(core.ScreenCell.Attrs.fields, core._packed_attrs_layout))[name], codes) for name, codes in SGR_ATTRS]
+
+
+def _cell_keys(snapshot, row):
+    ''' One hashable key per cell of `row`: (text, width, attrs, fg, bg).
+
+        The right half of a wide character has the text None.
+    '''
+    cols = snapshot.cols
+    n = c.VTERM_MAX_CHARS_PER_CELL
+    start = row * cols
+    chars = c.ffi.unpack(snapshot.chars + start * n, cols * n)
+    width = c.ffi.unpack(snapshot.width + start, cols)
+    attrs = c.ffi.unpack(snapshot.attrs + start, cols)
+    fg = c.ffi.buffer(snapshot.fg + start * 3, cols * 3)[:]
+    bg = c.ffi.buffer(snapshot.bg + start * 3, cols * 3)[:]
+    rv = []
+    for i in range(cols):
+        cell = chars[i * n:i * n + n]
+        if cell[0] == 0xFFffFFff:
+            text = None
+        elif not cell[0]:
+            text = ' '
+        else:
+            text = ''.join([chr(ch) for ch in cell if ch])
+        rv.append((text, width[i], attrs[i], fg[i * 3:i * 3 + 3], bg[i * 3:i * 3 + 3]))
+    return rv
+
+
+class AnsiRenderer:
+    ''' Sends a VTerm's screen to a host terminal through `write`, which
+        takes `bytes`.
+
+        Forward the screen callbacks `damage`, `moverect`, `movecursor`,
+        `settermprop`, `bell` and `resize` to the methods of the same names, and
+        call `render` after flushing damage. Full-width moves of lines
+        are sent as scrolls of a scroll region instead of being repainted.
+    '''
+    def __init__(self, vt, write, *, encoding='utf-8'):
+        self._vt = weakref.ref(vt)
+        self.write = write
+        self.encoding = encoding
+        self._size = None
+        self._snapshot = None
+        # What the host shows, as lists of cell keys; None means unknown.
+        self._frame = None
+        # (start_col, end_col) of each row that may have changed, or None.
+        self._dirty = None
+        self._out = []
+        # Host terminal state; None means unknown.
+        self._cursor = None
+        self._pen = None
+        self._cursor_visible = None
+        # Where the VTerm wants them.
+        self._want_cursor = (0, 0)
+        self._want_visible = True
+        self._default_fg = None
+        self._default_bg = None
+
+    @property
+    def vt(self):
+        rv = (self._vt)()
+        assert rv is not None
+        return rv
+
+    def invalidate(self):
+        ''' Repaint everything on the next `render`, e.g. after the host
+            terminal was disturbed.
+        '''
+        self._frame = None
+        self._cursor = None
+        self._pen = None
+        self._cursor_visible = None
+
+    def damage(self, rect):
+        dirty = self._dirty
+        if dirty is None:
+            return 1
+        for row in range(rect.start_row, rect.end_row):
+            old = dirty[row]
+            if old is None:
+                dirty[row] = (rect.start_col, rect.end_col)
+            else:
+                dirty[row] = (min(old[0], rect.start_col), max(old[1], rect.end_col))
+        return 1
+
+    def moverect(self, dest, src):
+        frame = self._frame
+        cols = self._size.cols if self._size is not None else 0
+        if frame is None or src.start_col != 0 or src.end_col != cols or dest.start_col != 0 or dest.end_col != cols:
+            return 0
+        top = min(src.start_row, dest.start_row)
+        bottom = max(src.end_row, dest.end_row)
+        count = src.start_row - dest.start_row
+        # Lines scrolled in are blanked with the current background.
+        self._set_pen(0, self._default_fg, self._default_bg)
+        self._out.append('%s%d;%dr' % (_CSI, top + 1, bottom))
+        self._out.append('%s%d%s' % (_CSI, abs(count), 'S' if count > 0 else 'T'))
+        self._out.append(_CSI + 'r')
+        # DECSTBM homes the cursor.
+        self._cursor = (0, 0)
+
+        blank = [(' ', 1, 0, self._default_fg, self._default_bg)] * cols
+        dirty = self._dirty
+        moved_frame = frame[src.start_row:src.end_row]
+        moved_dirty = dirty[src.start_row:src.end_row]
+        for row in range(top, bottom):
+            frame[row] = list(blank)
+            dirty[row] = (0, cols)
+        frame[dest.start_row:dest.end_row] = moved_frame
+        dirty[dest.start_row:dest.end_row] = moved_dirty
+        return 1
+
+    def movecursor(self, pos, oldpos, visible):
+        self._want_cursor = (pos.row, pos.col)
+        return 1
+
+    def settermprop(self, prop, val):
+        if prop == core.Prop.CURSORVISIBLE:
+            self._want_visible = bool(val)
+            return 1
+        return 0
+
+    def bell(self):
+        self._out.append('\a')
+        return 1
+
+    def resize(self, size):
+        self.invalidate()
+        return 1
+
+    def render(self):
+        ''' Write out everything that changed since the last call.
+        '''
+        vt = self.vt
+        size = vt.get_size()
+        out = self._out
+        if size != self._size or self._frame is None:
+            self._size = size
+            self._snapshot = None
+            self._default_fg, self._default_bg = [bytes([color.red, color.green, color.blue]) for color in vt.get_default_colors()]
+            self._dirty = [(0, size.cols)] * size.rows
+            self._cursor = None
+            self._pen = None
+            self._set_pen(0, self._default_fg, self._default_bg)
+            out.append(_CSI + 'H' + _CSI + '2J')
+            self._cursor = (0, 0)
+            blank = (' ', 1, 0, self._default_fg, self._default_bg)
+            self._frame = [[blank] * size.cols for _ in range(size.rows)]
+
+        if any(d is not None for d in self._dirty):
+            self._snapshot = snapshot = vt.screen_snapshot(out=self._snapshot)
+            for row, dirty in enumerate(self._dirty):
+                if dirty is not None:
+                    self._paint_row(row, _cell_keys(snapshot, row), *dirty)
+            self._dirty = [None] * size.rows
+
+        if self._want_visible != self._cursor_visible:
+            self._cursor_visible = self._want_visible
+            out.append(_CSI + ('?25h' if self._want_visible else '?25l'))
+        self._move(*self._want_cursor)
+
+        if out:
+            self.write(''.join(out).encode(self.encoding, 'replace'))
+            out.clear()
+
+    def _paint_row(self, row, new, start_col, end_col):
+        old = self._frame[row]
+        changed = [col for col in range(start_col, end_col) if old[col] != new[col]]
+        if not changed:
+            return
+        runs = []
+        run_start = run_end = changed[0]
+        for col in changed[1:]:
+            if col - run_end > _GAP:
+                runs.append((run_start, run_end + 1))
+                run_start = col
+            run_end = col
+        runs.append((run_start, run_end + 1))
+
+        cols = len(new)
+        for run_start, run_end in runs:
+            # Never start on, or stop in the middle of, a wide character.
+            if new[run_start][0] is None and run_start:
+                run_start -= 1
+            if run_end < cols and new[run_end][0] is None:
+                run_end += 1
+            self._move(row, run_start)
+            col = run_start
+            while col < run_end:
+                text, width, attrs, fg, bg = new[col]
+                if text is None:
+                    col += 1
+                    continue
+                self._set_pen(attrs, fg, bg)
+                self._out.append(text)
+                col += max(width, 1)
+            # Past the last column, the cursor position depends on the host.
+            self._cursor = (row, col) if col < cols else None
+        self._frame[row] = new
+
+    def _move(self, row, col):
+        cursor = self._cursor
+        if cursor == (row, col):
+            return
+        moves = ['%s%d;%dH' % (_CSI, row + 1, col + 1)]
+        if cursor is not None:
+            cur_row, cur_col = cursor
+            vertical = ''
+            if row < cur_row:
+                vertical = _CSI + ('%dA' % (cur_row - row) if cur_row - row > 1 else 'A')
+            elif row > cur_row:
+                vertical = _CSI + ('%dB' % (row - cur_row) if row - cur_row > 1 else 'B')
+            if col == cur_col:
+                moves.append(vertical)
+            elif col == 0:
+                moves.append(vertical + '\r')
+            elif col > cur_col:
+                moves.append(vertical + _CSI + ('%dC' % (col - cur_col) if col - cur_col > 1 else 'C'))
+            else:
+                back = cur_col - col
+                moves.append(vertical + ('\b' * back if back <= 3 else '%s%dD' % (_CSI, back)))
+        elif col == 0:
+            moves.append('%s%dH' % (_CSI, row + 1))
+        self._out.append(min(moves, key=len))
+        self._cursor = (row, col)
+
+    def _set_pen(self, attrs, fg, bg):
+        pen = (attrs, fg, bg)
+        if pen == self._pen:
+            return
+        params = self._sgr_params(attrs, fg, bg, (0, self._default_fg, self._default_bg))
+        params.insert(0, '0')
+        if self._pen is not None:
+            diff = self._sgr_params(attrs, fg, bg, self._pen)
+            if len(';'.join(diff)) <= len(';'.join(params)):
+                params = diff
+        self._out.append('%s%sm' % (_CSI, ';'.join(params)))
+        self._pen = pen
+
+    def _sgr_params(self, attrs, fg, bg, old):
+        old_attrs, old_fg, old_bg = old
+        rv = []
+        for (shift, mask), codes in _sgr_layout:
+            value = (attrs >> shift) & mask
+            if value != (old_attrs >> shift) & mask:
+                rv.append(codes[value])
+        if fg != old_fg:
+            rv.append('39' if fg == self._default_fg else '38;2;%d;%d;%d' % tuple(fg))
+        if bg != old_bg:
+            rv.append('49' if bg == self._default_bg else '48;2;%d;%d;%d' % tuple(bg))
+        return rv
@@ -0,0 +1,346 @@
+''' Feed recorded sessions into a VTerm as fast as possible.
+
+    A recording is either a raw typescript (everything the program
+    printed, as written by script(1); its timing file, if given, supplies
+    timestamps), an asciicast v2 file, or the binary format of
+    `record.Recorder`, possibly compressed. Uncompressed files are
+    mmapped, and raw and binary output is fed straight from the map,
+    without copying it into `bytes`.
+
+    Run as `python3 -m vterm.replay [-j JOBS] [--frame SECONDS]... FILE...`
+    to print the final screen of each file, and the throughput.
+'''
+import argparse
+import concurrent.futures
+import gzip
+import itertools
+import json
+import mmap
+import os
+import sys
+import time
+
+import attr
+
+from . import core, record
+
+
+_SCRIPT_HEADER = b'Script started on '
+_GZIP_MAGIC = b'\x1f\x8b'
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+CHUNK_SIZE = 1 << 20
+
+
+@attr.s(slots=True, frozen=True)
+class Frame:
+    ''' The screen as it was at `time` seconds into the recording.
+    '''
+    time = attr.ib()
+    text = attr.ib()
+
+
+@attr.s(slots=True, frozen=True)
+class ReplayResult:
+    path = attr.ib()
+    # Bytes of output fed to the terminal.
+    nbytes = attr.ib()
+    # Wall-clock seconds the replay took.
+    elapsed = attr.ib()
+    # Length of the recording in seconds, or None if it has no timestamps.
+    duration = attr.ib()
+    text = attr.ib()
+    frames = attr.ib()
+
+    @property
+    def mb_per_s(self):
+        return self.nbytes / self.elapsed / 1e6 if self.elapsed else float('inf')
+
+
+def screen_text(vt):
+    ''' The text of every row of the screen, without trailing blanks.
+    '''
+    size = vt.get_size()
+    rows = []
+    for row in range(size.rows):
+        rect = core.Rect(start_row=row, end_row=row + 1, start_col=0, end_col=size.cols)
+        rows.append(vt.get_text(rect).decode('utf-8', 'replace').rstrip())
+    return '\n'.join(rows)
+
+
+def _zstd_decompress(data):
+    try:
+        from compression import zstd
+    except ImportError:
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(data).read()
+    return zstd.decompress(data)
+
+
+def _open_map(path):
+    ''' Map the file at `path`, or return its contents if it is compressed.
+    '''
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if data[:len(_GZIP_MAGIC)] == _GZIP_MAGIC:
+        with data:
+            return gzip.decompress(data)
+    if data[:len(_ZSTD_MAGIC)] == _ZSTD_MAGIC:
+        with data:
+            return _zstd_decompress(data)
+    return data
+
+
+def detect_format(data):
+    ''' 'binary', 'asciicast' or 'raw', from the start of a recording.
+    '''
+    if data[:len(record.MAGIC)] == record.MAGIC:
+        return 'binary'
+    end = data.find(b'\n', 0, 4096)
+    first = bytes(data[:end if end != -1 else 4096])
+    if first.startswith(b'{'):
+        try:
+            header = json.loads(first)
+        except ValueError:
+            pass
+        else:
+            if isinstance(header, dict) and header.get('version') == 2:
+                return 'asciicast'
+    return 'raw'
+
+
+def _asciicast_header(data):
+    end = data.find(b'\n')
+    if end == -1:
+        end = len(data)
+    return json.loads(bytes(data[:end])), end + 1
+
+
+def _asciicast_events(data, pos):
+    size = len(data)
+    while pos < size:
+        end = data.find(b'\n', pos)
+        if end == -1:
+            end = size
+        line = data[pos:end]
+        pos = end + 1
+        if line.strip():
+            yield ((pos,),) + tuple(json.loads(line))
+
+
+def read_asciicast(data):
+    ''' Parse the header of an asciicast v2 recording, and return it with
+        an iterator of (time, type, data) events.
+    '''
+    header, pos = _asciicast_header(data)
+    return header, (event[1:] for event in _asciicast_events(data, pos))
+
+
+def _binary_header(view):
+    rows, cols, _ = record._BINARY_HEADER.unpack_from(view, len(record.MAGIC))
+    return core.Size(rows=rows, cols=cols), len(record.MAGIC) + record._BINARY_HEADER.size
+
+
+def _binary_events(view, pos):
+    unpack_from = record._BINARY_FRAME.unpack_from
+    frame_size = record._BINARY_FRAME.size
+    end = len(view)
+    while pos + frame_size <= end:
+        usec, type_, nbytes = unpack_from(view, pos)
+        pos += frame_size
+        payload = view[pos:pos + nbytes]
+        pos += nbytes
+        type_ = type_.decode()
+        yield (pos,), usec / 1e6, type_, payload if type_ == 'o' else bytes(payload).decode('utf-8', 'replace')
+
+
+def read_binary(data):
+    ''' Parse the header of a binary recording, and return its size with
+        an iterator of (time, type, data) events. Output is a memoryview
+        of `data`; other data is decoded to `str`.
+    '''
+    view = memoryview(data)
+    size, pos = _binary_header(view)
+    return size, (event[1:] for event in _binary_events(view, pos))
+
+
+def _raw_start(data):
+    if data[:len(_SCRIPT_HEADER)] == _SCRIPT_HEADER:
+        return data.find(b'\n') + 1
+    return 0
+
+
+def _raw_events(view, timing, chunk_size, pos, line_no=0, now=0.0):
+    if timing is None:
+        for start in range(pos, len(view), chunk_size):
+            end = min(start + chunk_size, len(view))
+            yield (end,), None, view[start:end]
+        return
+    with open(timing) as f:
+        for line in itertools.islice(f, line_no, None):
+            delay, nbytes = line.split()[:2]
+            now += float(delay)
+            line_no += 1
+            end = pos + int(nbytes)
+            yield (end, line_no, now), now, view[pos:end]
+            pos = end
+    if pos < len(view):
+        yield (len(view), line_no, now), now, view[pos:]
+
+
+def read_raw(data, timing=None, *, chunk_size=CHUNK_SIZE):
+    ''' Iterate over (time, output) for a raw typescript, whose output is
+        a memoryview of `data`.
+
+        Without a `timing` file (as written by `script --timing`), time is
+        None and output comes in `chunk_size` pieces.
+    '''
+    for _, t, output in _raw_events(memoryview(data), timing, chunk_size, _raw_start(data)):
+        yield t, output
+
+
+def open_events(data, format, *, timing=None, chunk_size=CHUNK_SIZE, resume=None):
+    ''' Return the size in the header of a recording (or None) and an
+        iterator of (resume, time, type, data) events.
+
+        Passing one of the `resume` values back continues with the event
+        after the one it came with.
+    '''
+    if format == 'asciicast':
+        header, pos = _asciicast_header(data)
+        size = core.Size(rows=header['height'], cols=header['width'])
+        return size, _asciicast_events(data, pos if resume is None else resume[0])
+    if format == 'binary':
+        view = memoryview(data)
+        size, pos = _binary_header(view)
+        return size, _binary_events(view, pos if resume is None else resume[0])
+    if format == 'raw':
+        if resume is None:
+            resume = (_raw_start(data),)
+        events = _raw_events(memoryview(data), timing, chunk_size, *resume)
+        return None, ((resume, t, 'o', output) for resume, t, output in events)
+    raise ValueError('unknown recording format %r' % format)
+
+
+def feed_event(vt, type_, data):
+    ''' Apply one event of a recording to `vt`, and return the number of
+        bytes of output fed to it.
+    '''
+    if type_ == 'o':
+        if isinstance(data, str):
+            data = data.encode('utf-8', 'surrogateescape')
+        vt.input_write(data)
+        return len(data)
+    if type_ == 'r':
+        cols, rows = data.split('x')
+        vt.set_size(core.Size(rows=int(rows), cols=int(cols)))
+    return 0
+
+
+def new_vterm(size):
+    ''' A VTerm to replay into.
+    '''
+    vt = core.VTerm(size or core.STANDARD_SIZE)
+    # Nobody looks at damage, so keep libvterm from tracking it finely.
+    vt.set_damage_merge(core.DamageSize.SCREEN)
+    return vt
+
+
+def replay(path, *, format=None, size=None, timing=None, frames=(), chunk_size=CHUNK_SIZE):
+    ''' Feed the recording at `path` into a new VTerm, and return a
+        `ReplayResult` with its final screen and a `Frame` for each time
+        in `frames`.
+
+        `size` defaults to the size in the recording's header, else
+        `core.STANDARD_SIZE`.
+    '''
+    frame_times = sorted(frames)
+    taken = []
+    events = output = None
+    data = _open_map(path)
+    try:
+        if format is None:
+            format = detect_format(data)
+        header_size, events = open_events(data, format, timing=timing, chunk_size=chunk_size)
+        if frame_times and format == 'raw' and timing is None:
+            raise ValueError('frames need timestamps, but %r has none' % path)
+        vt = new_vterm(size or header_size)
+
+        nbytes = 0
+        duration = None
+        start = time.perf_counter()
+        for _, t, type_, output in events:
+            while frame_times and t > frame_times[0]:
+                taken.append(Frame(frame_times.pop(0), screen_text(vt)))
+            if t is not None:
+                duration = t
+            nbytes += feed_event(vt, type_, output)
+        text = screen_text(vt)
+        elapsed = time.perf_counter() - start
+        for t in frame_times:
+            taken.append(Frame(t, text))
+    finally:
+        # Slices of the map must be gone before it can be closed.
+        events = output = None
+        if isinstance(data, mmap.mmap):
+            data.close()
+    return ReplayResult(path, nbytes, elapsed, duration, text, taken)
+
+
+def _replay_one(args):
+    path, kwargs = args
+    return replay(path, **kwargs)
+
+
+def replay_many(paths, *, jobs=None, **kwargs):
+    ''' Like `replay` for each of `paths`, in `jobs` processes (default: one
+        per CPU). Results are yielded in order.
+    '''
+    paths = list(paths)
+    if jobs == 1 or len(paths) <= 1:
+        for path in paths:
+            yield replay(path, **kwargs)
+        return
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        chunksize = max(1, len(paths) // ((jobs or os.cpu_count() or 1) * 4))
+        yield from executor.map(_replay_one, [(path, kwargs) for path in paths], chunksize=chunksize)
+
+
+def _parse_size(s):
+    rows, cols = s.lower().split('x')
+    return core.Size(rows=int(rows), cols=int(cols))
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser(prog='python3 -m vterm.replay', description='Replay terminal recordings headlessly.')
+    parser.add_argument('files', nargs='+', metavar='FILE')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='worker processes (default: one per CPU)')
+    parser.add_argument('--format', choices=['raw', 'asciicast', 'binary'], default=None, help='default: guess from the contents')
+    parser.add_argument('--size', type=_parse_size, default=None, metavar='ROWSxCOLS')
+    parser.add_argument('--timing', default=None, help='script(1) timing file, for a single raw FILE')
+    parser.add_argument('--frame', type=float, action='append', default=[], metavar='SECONDS', help='also print the screen at this time')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only print throughput')
+    args = parser.parse_args(argv)
+    if args.timing is not None and len(args.files) != 1:
+        parser.error('--timing needs exactly one FILE')
+
+    total_bytes = 0
+    start = time.perf_counter()
+    results = replay_many(args.files, jobs=args.jobs, format=args.format, size=args.size, timing=args.timing, frames=args.frame)
+    for result in results:
+        total_bytes += result.nbytes
+        if not args.quiet:
+            for frame in result.frames:
+                print('==> %s at %gs <==' % (result.path, frame.time))
+                print(frame.text)
+            print('==> %s <==' % result.path)
+            print(result.text)
+        print('%s: %d bytes in %.3fs, %.1f MB/s' % (result.path, result.nbytes, result.elapsed, result.mb_per_s), file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    if len(args.files) > 1:
+        print('total: %d files, %d bytes in %.3fs, %.1f MB/s' % (len(args.files), total_bytes, elapsed, total_bytes / elapsed / 1e6), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,599 @@
+''' Bounded storage for lines that scrolled off the top of the screen.
+
+    Lines are compressed by `LineCodec` when pushed, and only decoded again
+    when they are popped or read. Optionally, lines that fall out of the
+    in-memory tail are spilled to disk (see `SpillStore`) instead of being
+    dropped.
+'''
+import array
+import collections
+import itertools
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+from . import c, search
+
+
+# cols, kept cells, runs, flags, fill style id
+_HEADER = struct.Struct('<HHHBI')
+_FLAG_SIMPLE = 1 << 0
+_FLAG_UTF8 = 1 << 1
+# What a stored line costs beyond its payload: the bytes header plus a deque slot.
+_LINE_OVERHEAD = sys.getsizeof(b'') + 8
+# What a style costs: its key, the slots in `keys` and `_refs`, and a dict entry.
+_STYLE_OVERHEAD = sys.getsizeof(1 << 63) + 8 + 8 + 48
+
+
+class StyleTable:
+    ''' Interns the 64-bit style keys of cells (see c-sources/cells.h) as small ids.
+
+        Every `intern` of a key takes a reference to its id, which `release`
+        gives back; the id of a key nobody references any more is reused,
+        so the table only holds the styles of the lines still stored.
+    '''
+    __slots__ = ('keys', '_ids', '_refs', '_free')
+    def __init__(self):
+        # Indexed by id; None for free ids.
+        self.keys = []
+        self._ids = {}
+        self._refs = []
+        self._free = []
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def nbytes(self):
+        ''' Approximate memory used by the styles still referenced.
+        '''
+        return len(self._ids) * _STYLE_OVERHEAD
+
+    def intern(self, key):
+        rv = self._ids.get(key)
+        if rv is None:
+            if self._free:
+                rv = self._free.pop()
+                self.keys[rv] = key
+                self._refs[rv] = 1
+            else:
+                rv = len(self.keys)
+                self.keys.append(key)
+                self._refs.append(1)
+            self._ids[key] = rv
+        else:
+            self._refs[rv] += 1
+        return rv
+
+    def release(self, style_id):
+        refs = self._refs
+        refs[style_id] -= 1
+        if not refs[style_id]:
+            del self._ids[self.keys[style_id]]
+            self.keys[style_id] = None
+            self._free.append(style_id)
+
+
+class LineCodec:
+    ''' Run-length encodes lines of cells into compact `bytes`, and back.
+
+        An encoded line is a header, the lengths and style ids of the runs
+        of identically-styled cells, and then the text: UTF-8 for plain
+        lines, or per-cell widths and codepoints otherwise. Trailing blank
+        cells are not stored at all.
+    '''
+    __slots__ = ('styles', '_cols', '_run_lens', '_run_styles', '_chars', '_nruns', '_nchars', '_simple', '_fill')
+    def __init__(self, styles=None):
+        self.styles = StyleTable() if styles is None else styles
+        self._nruns = c.ffi.new('int*')
+        self._nchars = c.ffi.new('size_t*')
+        self._simple = c.ffi.new('int*')
+        self._fill = c.ffi.new('uint64_t*')
+        self._reserve(256)
+
+    def _reserve(self, cols):
+        self._cols = cols
+        self._run_lens = c.ffi.new('uint32_t[]', cols)
+        self._run_styles = c.ffi.new('uint64_t[]', cols)
+        self._chars = c.ffi.new('uint32_t[]', cols * (1 + c.VTERM_MAX_CHARS_PER_CELL))
+
+    def encode(self, cells):
+        ncells = len(cells)
+        if ncells > self._cols:
+            self._reserve(ncells)
+        nkept = c.vterm_py_line_encode(cells, ncells, self._run_lens, self._run_styles, self._nruns, self._chars, self._nchars, self._simple, self._fill)
+        nruns = self._nruns[0]
+        intern = self.styles.intern
+        run_ids = array.array('I', [intern(self._run_styles[i]) for i in range(nruns)])
+        flags = 0
+        chars = c.ffi.buffer(self._chars, self._nchars[0] * 4)
+        if self._simple[0]:
+            flags |= _FLAG_SIMPLE
+            try:
+                chars = str(chars, 'utf-32-le').encode('utf-8')
+                flags |= _FLAG_UTF8
+            except UnicodeError:
+                chars = chars[:]
+        else:
+            chars = chars[:]
+        return b''.join([
+                _HEADER.pack(ncells, nkept, nruns, flags, intern(self._fill[0])),
+                c.ffi.buffer(self._run_lens, nruns * 4),
+                run_ids.tobytes(),
+                chars,
+        ])
+
+    def release(self, blob):
+        ''' Give back the references to styles that encoding `blob` took,
+            once it is no longer stored.
+        '''
+        cols, nkept, nruns, flags, fill, lens_start, ids_start, chars_start = self._split(blob)
+        run_ids = array.array('I')
+        run_ids.frombytes(blob[ids_start:chars_start])
+        release = self.styles.release
+        for style_id in run_ids:
+            release(style_id)
+        release(fill)
+
+    def _split(self, blob):
+        cols, nkept, nruns, flags, fill = _HEADER.unpack_from(blob)
+        lens_start = _HEADER.size
+        ids_start = lens_start + nruns * 4
+        chars_start = ids_start + nruns * 4
+        return cols, nkept, nruns, flags, fill, lens_start, ids_start, chars_start
+
+    def decode(self, blob, cells_mut):
+        ''' Decode into `cells_mut`, cutting or padding to its length.
+        '''
+        cols, nkept, nruns, flags, fill, lens_start, ids_start, chars_start = self._split(blob)
+        run_lens = c.ffi.new('uint32_t[]', nruns)
+        c.ffi.memmove(run_lens, blob[lens_start:ids_start], nruns * 4)
+        run_ids = array.array('I')
+        run_ids.frombytes(blob[ids_start:chars_start])
+        keys = self.styles.keys
+        run_styles = c.ffi.new('uint64_t[]', [keys[i] for i in run_ids])
+        chars = blob[chars_start:]
+        if flags & _FLAG_UTF8:
+            chars = chars.decode('utf-8').encode('utf-32-le')
+        chars = c.ffi.from_buffer('uint32_t[]', chars)
+        c.vterm_py_line_decode(cells_mut, len(cells_mut), nkept, run_lens, run_styles, nruns, chars, flags & _FLAG_SIMPLE, keys[fill])
+
+    def text(self, blob):
+        ''' The text of an encoded line, without decoding its cells.
+
+            Like `VTerm.screen_get_text`, empty cells read as spaces and
+            the right halves of wide characters are skipped.
+        '''
+        cols, nkept, nruns, flags, fill, lens_start, ids_start, chars_start = self._split(blob)
+        chars = blob[chars_start:]
+        if flags & _FLAG_UTF8:
+            return chars.decode('utf-8').replace('\0', ' ')
+        words = array.array('I')
+        words.frombytes(chars)
+        if flags & _FLAG_SIMPLE:
+            return ''.join([chr(w) if w else ' ' for w in words])
+        return ''.join([text for text, col, width in _complex_cells(words)])
+
+    def spans(self, blob):
+        ''' The runs of identically-styled cells of an encoded line, as
+            (start_col, end_col, style_id, text) like `VTerm.screen_get_spans`,
+            with ids from `styles`; the trailing blank cells that were not
+            stored are left out.
+        '''
+        cols, nkept, nruns, flags, fill, lens_start, ids_start, chars_start = self._split(blob)
+        run_lens = array.array('I')
+        run_lens.frombytes(blob[lens_start:ids_start])
+        run_ids = array.array('I')
+        run_ids.frombytes(blob[ids_start:chars_start])
+        rv = []
+        col = 0
+        if flags & _FLAG_SIMPLE:
+            # One character per cell.
+            text = self.text(blob)
+            for n, style_id in zip(run_lens, run_ids):
+                rv.append((col, col + n, style_id, text[col:col + n]))
+                col += n
+            return rv
+        words = array.array('I')
+        words.frombytes(blob[chars_start:])
+        cells = _complex_cells(words)
+        cell = next(cells, None)
+        for n, style_id in zip(run_lens, run_ids):
+            end = col + n
+            parts = []
+            while cell is not None and cell[1] < end:
+                parts.append(cell[0])
+                cell = next(cells, None)
+            rv.append((col, end, style_id, ''.join(parts)))
+            col = end
+        return rv
+
+    def columns(self, blob):
+        ''' Map the characters of `text(blob)` to cells.
+
+            Returns None if each character is exactly one cell, and
+            otherwise the lists of the start and end column of the cell
+            holding each character.
+        '''
+        cols, nkept, nruns, flags, fill, lens_start, ids_start, chars_start = self._split(blob)
+        if flags & _FLAG_SIMPLE:
+            return None
+        words = array.array('I')
+        words.frombytes(blob[chars_start:])
+        starts = []
+        ends = []
+        for text, col, width in _complex_cells(words):
+            starts.extend([col] * len(text))
+            ends.extend([col + width] * len(text))
+        return starts, ends
+
+
+def _complex_cells(words):
+    ''' Yield the text, column and width of each cell of a complex line,
+        skipping the right halves of wide characters.
+    '''
+    i = 0
+    col = 0
+    while i < len(words):
+        width = words[i] & 0xff
+        n = (words[i] >> 8) & 0xff
+        cell = words[i + 1:i + 1 + n]
+        i += 1 + n
+        if not n:
+            yield ' ', col, width
+        elif cell[0] != 0xFFffFFff:
+            yield ''.join([chr(w) for w in cell]), col, width
+        col += 1
+
+
+class _Segment:
+    ''' One append-only segment file, and where each of its lines ends.
+    '''
+    __slots__ = ('path', 'fd', 'ends', 'map')
+    def __init__(self, directory):
+        self.fd, self.path = tempfile.mkstemp(prefix='vterm-scrollback-', suffix='.seg', dir=directory)
+        self.ends = array.array('Q')
+        self.map = None
+
+    def __len__(self):
+        return len(self.ends)
+
+    @property
+    def nbytes(self):
+        return self.ends[-1] if self.ends else 0
+
+    def append(self, blob):
+        offset = self.nbytes
+        view = memoryview(blob)
+        while view:
+            n = os.pwrite(self.fd, view, offset)
+            view = view[n:]
+            offset += n
+        self.ends.append(offset)
+
+    def get(self, i):
+        start = self.ends[i - 1] if i else 0
+        end = self.ends[i]
+        if self.map is None:
+            return os.pread(self.fd, end - start, start)
+        return self.map[start:end]
+
+    def seal(self):
+        ''' Map the file, now that it won't grow any more.
+        '''
+        if self.map is None and self.ends:
+            self.map = mmap.mmap(self.fd, self.nbytes, access=mmap.ACCESS_READ)
+
+    def pop(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.ends.pop()
+        os.ftruncate(self.fd, self.nbytes)
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.fd != -1:
+            os.close(self.fd)
+            self.fd = -1
+            os.unlink(self.path)
+
+
+class SpillStore:
+    ''' Encoded lines in append-only segment files on disk.
+
+        Every segment but the last holds exactly `segment_lines` lines, so
+        finding line N takes a division and a lookup in that segment's
+        in-memory offset index. Full segments are memory-mapped read-only,
+        so reading history only touches the pages that are needed.
+
+        The files are temporary: `compact` deletes those of the oldest
+        segments, and `close` deletes them all.
+    '''
+    __slots__ = ('directory', 'segment_lines', '_segments', '_skip')
+    def __init__(self, directory=None, *, segment_lines=65536):
+        self.directory = directory
+        self.segment_lines = segment_lines
+        self._segments = []
+        # Lines at the start of the first segment that were compacted away.
+        self._skip = 0
+
+    def __repr__(self):
+        return '<%s lines=%d segments=%d>' % (type(self).__name__, len(self), len(self._segments))
+
+    def __len__(self):
+        segments = self._segments
+        if not segments:
+            return 0
+        return (len(segments) - 1) * self.segment_lines + len(segments[-1]) - self._skip
+
+    @property
+    def nbytes(self):
+        ''' Bytes used on disk.
+        '''
+        return sum(segment.nbytes for segment in self._segments)
+
+    def append(self, blob):
+        segments = self._segments
+        if not segments or len(segments[-1]) == self.segment_lines:
+            if segments:
+                segments[-1].seal()
+            segments.append(_Segment(self.directory))
+        segments[-1].append(blob)
+
+    def __getitem__(self, index):
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError(index)
+        segment, i = divmod(index + self._skip, self.segment_lines)
+        return self._segments[segment].get(i)
+
+    def pop(self):
+        ''' Remove and return the newest line.
+        '''
+        if not len(self):
+            raise IndexError('pop from empty %s' % type(self).__name__)
+        segments = self._segments
+        segment = segments[-1]
+        blob = segment.get(len(segment) - 1)
+        segment.pop()
+        if len(segment) == (self._skip if len(segments) == 1 else 0):
+            segments.pop().close()
+            if not segments:
+                self._skip = 0
+        return blob
+
+    def compact(self, max_lines=0):
+        ''' Discard all but the newest `max_lines` lines, deleting the
+            segment files that no longer hold any.
+
+            Returns the number of lines discarded.
+        '''
+        excess = len(self) - max_lines
+        if excess <= 0:
+            return 0
+        self._skip += excess
+        segments = self._segments
+        while segments and self._skip >= len(segments[0]):
+            self._skip -= len(segments[0])
+            segments.pop(0).close()
+        return excess
+
+    def close(self):
+        for segment in self._segments:
+            segment.close()
+        self._segments.clear()
+        self._skip = 0
+
+
+class Scrollback:
+    ''' A ring of saved lines, bounded by line count and/or memory.
+
+        Once a limit is exceeded, the oldest lines are moved to `spill` if
+        there is one, and dropped otherwise. `max_bytes` limits the memory
+        of the lines held in memory; `nbytes` also counts their styles.
+        Indexing is from the oldest line still stored, spilled or not.
+
+        Lines also have absolute numbers, which count dropped lines too and
+        so don't change as older lines go away; see `search`.
+    '''
+    __slots__ = ('max_lines', 'max_bytes', 'dropped', 'codec', 'spill', 'index', '_lines', '_nbytes')
+    def __init__(self, *, max_lines=10000, max_bytes=None, spill=None):
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self.codec = LineCodec()
+        self.spill = spill
+        self.index = search.TrigramIndex()
+        self._lines = collections.deque()
+        self._nbytes = 0
+
+    def __repr__(self):
+        return '<%s lines=%d bytes=%d>' % (type(self).__name__, len(self), self.nbytes)
+
+    def __len__(self):
+        if self.spill is None:
+            return len(self._lines)
+        return len(self.spill) + len(self._lines)
+
+    @property
+    def nbytes(self):
+        ''' Approximate memory used by the lines stored in memory, and by
+            the styles of all stored lines (spilled ones included).
+        '''
+        return self._nbytes + self.codec.styles.nbytes
+
+    @property
+    def first_line(self):
+        ''' The absolute number of the oldest line still stored.
+        '''
+        return self.dropped
+
+    def clear(self):
+        release = self.codec.release
+        for blob in self._lines:
+            release(blob)
+        self.dropped += len(self._lines)
+        self._lines.clear()
+        self._nbytes = 0
+        self.compact(0)
+
+    def compact(self, max_lines=0):
+        ''' Discard all but the newest `max_lines` spilled lines.
+        '''
+        if self.spill is not None:
+            release = self.codec.release
+            for index in range(len(self.spill) - max_lines):
+                release(self.spill[index])
+            self.dropped += self.spill.compact(max_lines)
+
+    def close(self):
+        ''' Delete the spill files, if any.
+        '''
+        if self.spill is not None:
+            self.spill.close()
+
+    def push(self, cells):
+        ''' Save `cells`, a cdata VTermScreenCell array.
+        '''
+        blob = self.codec.encode(cells)
+        self._lines.append(blob)
+        self._nbytes += len(blob) + _LINE_OVERHEAD
+        self._trim()
+        self._update_index()
+
+    def pop(self, cells_mut):
+        ''' Restore the newest line into `cells_mut`, and forget it.
+
+            If the line is narrower than `cells_mut`, the rest is filled with
+            blank cells. Returns False if there is nothing to restore.
+        '''
+        if self._lines:
+            blob = self._lines.pop()
+            self._nbytes -= len(blob) + _LINE_OVERHEAD
+        elif self.spill:
+            blob = self.spill.pop()
+        else:
+            return False
+        self.index.truncate(self.dropped + len(self))
+        self.codec.decode(blob, cells_mut)
+        self.codec.release(blob)
+        return True
+
+    def _get_blob(self, index):
+        if self.spill is None:
+            return self._lines[index]
+        nspilled = len(self.spill)
+        if index < 0:
+            index += nspilled + len(self._lines)
+        if 0 <= index < nspilled:
+            return self.spill[index]
+        return self._lines[index - nspilled]
+
+    def get_text(self, index):
+        return self.codec.text(self._get_blob(index))
+
+    def get_spans(self, index):
+        ''' See `LineCodec.spans`; style ids are from `codec.styles`.
+        '''
+        return self.codec.spans(self._get_blob(index))
+
+    def iter_spans(self, start=0):
+        ''' Yield `get_spans` of each line from `start` on, without the cost
+            of indexing into the middle of the ring for each. Lines must not
+            be pushed or popped until the iteration ends.
+        '''
+        spans = self.codec.spans
+        nspilled = 0 if self.spill is None else len(self.spill)
+        for index in range(start, nspilled):
+            yield spans(self.spill[index])
+        for blob in itertools.islice(self._lines, max(start - nspilled, 0), None):
+            yield spans(blob)
+
+    def get_cells(self, index, cols=None):
+        ''' Decode a stored line into a new VTermScreenCell array.
+        '''
+        blob = self._get_blob(index)
+        if cols is None:
+            cols = _HEADER.unpack_from(blob)[0]
+        cells = c.ffi.new('VTermScreenCell[]', cols)
+        self.codec.decode(blob, cells)
+        return cells
+
+    def _trim(self):
+        lines = self._lines
+        while lines and (
+                (self.max_lines is not None and len(lines) > self.max_lines)
+                # Only the lines themselves: dropping lines needn't free
+                # any styles, which other lines may share.
+                or (self.max_bytes is not None and self._nbytes > self.max_bytes)):
+            blob = lines.popleft()
+            self._nbytes -= len(blob) + _LINE_OVERHEAD
+            if self.spill is None:
+                self.codec.release(blob)
+                self.dropped += 1
+            else:
+                self.spill.append(blob)
+
+    def _update_index(self):
+        index = self.index
+        first = self.dropped
+        start = max(index.end, first)
+        if first + len(self) - start >= index.chunk_lines:
+            stop = start + index.chunk_lines
+            index.add_chunk(start, [self.get_text(i - first) for i in range(start, stop)])
+
+    def search(self, pattern, *, regex=False, limit=None, backwards=False):
+        ''' Find `pattern`, a string or (if `regex`) a regular expression,
+            in the stored lines.
+
+            Returns up to `limit` `search.Match`es, oldest first, or newest
+            first if `backwards`. Matches never span lines, and ^ and $
+            match at the start and end of each line.
+        '''
+        compiled, needle = search.compile_pattern(pattern, regex)
+        first = self.dropped
+        self.index.discard_before(first)
+        ranges = self.index.candidates(first, first + len(self), needle)
+        if backwards:
+            ranges = reversed(list(ranges))
+        rv = []
+        for start, end in ranges:
+            matches = self._search_lines(compiled, needle, start, end)
+            if backwards:
+                matches.reverse()
+            rv.extend(matches)
+            if limit is not None and len(rv) >= limit:
+                del rv[limit:]
+                break
+        return rv
+
+    def _search_lines(self, compiled, needle, start, end):
+        first = self.dropped
+        codec = self.codec
+        rv = []
+        # Each line on its own, so that ^ and $ anchor to it, and a failed
+        # match across lines can't hide one later on the same line.
+        for i in range(start, end):
+            blob = self._get_blob(i - first)
+            text = codec.text(blob)
+            if needle is not None and needle not in text:
+                continue
+            columns = None
+            for m in compiled.finditer(text):
+                lo, hi = m.span()
+                if lo == hi:
+                    continue
+                if columns is None:
+                    columns = codec.columns(blob) or ()
+                if columns:
+                    starts, ends = columns
+                    lo, hi = starts[lo], ends[hi - 1]
+                rv.append(search.Match(i, lo, hi))
+        return rv
@@ -0,0 +1,105 @@
+''' Text search over scrollback.
+
+    Lines are indexed in chunks: each full chunk gets a Bloom filter of the
+    trigrams of its text, so that a literal search only has to decode and
+    scan the chunks that might contain it.
+'''
+import bisect
+import re
+
+import attr
+
+from . import c
+
+
+@attr.s(slots=True, frozen=True)
+class Match:
+    ''' A match on one line: `line` is an absolute line number (see
+        `Scrollback.first_line`), and `start_col`/`end_col` a span of cells.
+    '''
+    line = attr.ib()
+    start_col = attr.ib()
+    end_col = attr.ib()
+
+
+def _bloom(text, nbits_log2):
+    bits = c.ffi.new('uint8_t[]', 1 << nbits_log2 >> 3)
+    c.vterm_py_trigram_bloom(text, len(text), bits, nbits_log2)
+    return int.from_bytes(c.ffi.buffer(bits), 'little')
+
+
+class TrigramIndex:
+    ''' Bloom filters of the trigrams in consecutive chunks of lines.
+
+        Only whole chunks are indexed; lines after `end` are always
+        candidates.
+    '''
+    __slots__ = ('chunk_lines', 'nbits_log2', '_starts', '_ends', '_blooms')
+    def __init__(self, *, chunk_lines=1024, nbits_log2=16):
+        self.chunk_lines = chunk_lines
+        self.nbits_log2 = nbits_log2
+        self._starts = []
+        self._ends = []
+        self._blooms = []
+
+    def __len__(self):
+        return len(self._blooms)
+
+    @property
+    def end(self):
+        ''' The line after the last indexed one.
+        '''
+        return self._ends[-1] if self._ends else 0
+
+    def add_chunk(self, start, texts):
+        ''' Index the lines from `start` on, given as `str`s.
+        '''
+        self._starts.append(start)
+        self._ends.append(start + len(texts))
+        self._blooms.append(_bloom('\n'.join(texts).encode('utf-8'), self.nbits_log2))
+
+    def truncate(self, end):
+        ''' Forget the chunks that reach line `end` or beyond.
+        '''
+        i = bisect.bisect_right(self._ends, end)
+        del self._starts[i:], self._ends[i:], self._blooms[i:]
+
+    def discard_before(self, start):
+        ''' Forget the chunks that end before line `start`.
+        '''
+        i = bisect.bisect_right(self._ends, start)
+        del self._starts[:i], self._ends[:i], self._blooms[:i]
+
+    def candidates(self, start, end, needle=None):
+        ''' Yield (start, end) ranges covering lines `start` to `end` that
+            may contain `needle`. Without a needle nothing is skipped.
+        '''
+        query = None
+        if needle is not None:
+            needle = needle.encode('utf-8')
+            if len(needle) >= 3:
+                query = _bloom(needle, self.nbits_log2)
+        pos = start
+        for chunk_start, chunk_end, bloom in zip(self._starts, self._ends, self._blooms):
+            if chunk_end <= pos:
+                continue
+            if chunk_start > pos:
+                yield pos, min(chunk_start, end)
+            if chunk_start >= end:
+                return
+            if query is None or bloom & query == query:
+                yield max(pos, chunk_start), min(chunk_end, end)
+            pos = chunk_end
+        if pos < end:
+            for lo in range(pos, end, self.chunk_lines):
+                yield lo, min(lo + self.chunk_lines, end)
+
+
+def compile_pattern(pattern, regex=False):
+    ''' Returns the compiled pattern, and the literal needle if there is one.
+    '''
+    if not regex:
+        return re.compile(re.escape(pattern)), pattern
+    if isinstance(pattern, str):
+        pattern = re.compile(pattern)
+    return pattern, None
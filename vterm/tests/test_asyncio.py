@@ -0,0 +1,77 @@
+import asyncio
+import unittest
+
+from vterm import core
+from vterm import asyncio as vt_asyncio
+
+
+_SIZE = core.Size(rows=4, cols=20)
+
+
+class _Protocol(vt_asyncio.PtyProtocol):
+    def __init__(self):
+        self.transport = None
+        self.nbytes = 0
+        self.eof = False
+        self.lost = asyncio.get_running_loop().create_future()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def input_received(self, nbytes):
+        self.nbytes += nbytes
+
+    def eof_received(self):
+        self.eof = True
+
+    def connection_lost(self, exc):
+        self.lost.set_result(exc)
+
+
+class PtyTransportTest(unittest.TestCase):
+    def run_async(self, coro):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(asyncio.wait_for(coro, 10))
+        finally:
+            loop.close()
+
+    def row(self, vt, row):
+        return vt.get_text(core.Rect(start_row=row, end_row=row + 1, start_col=0, end_col=_SIZE.cols)).rstrip(b' ')
+
+    def test_echo_pause_and_eof(self):
+        async def run():
+            transport, protocol = await vt_asyncio.open_pty(['sh', '-c', 'read x; printf "got $x"'], _Protocol, size=_SIZE)
+            await asyncio.sleep(0)
+            self.assertIs(protocol.transport, transport)
+            transport.pause_reading()
+            self.assertFalse(transport.is_reading())
+            transport.write(b'hi\r')
+            # The program answers and exits, but nothing is read meanwhile.
+            await asyncio.sleep(0.5)
+            self.assertEqual(protocol.nbytes, 0)
+            self.assertFalse(protocol.lost.done())
+            transport.resume_reading()
+            self.assertTrue(transport.is_reading())
+            self.assertIsNone(await protocol.lost)
+            self.assertTrue(protocol.eof)
+            self.assertTrue(transport.is_closing())
+            return transport.vt, protocol
+        vt, protocol = self.run_async(run())
+        self.assertTrue(vt.closed)
+        # The line typed is echoed first.
+        self.assertEqual(self.row(vt, 0), b'hi')
+        self.assertEqual(self.row(vt, 1), b'got hi')
+        self.assertEqual(protocol.nbytes, len(b'hi\r\ngot hi'))
+
+    def test_close(self):
+        async def run():
+            transport, protocol = await vt_asyncio.open_pty(['sleep', '10'], _Protocol, size=_SIZE)
+            await asyncio.sleep(0)
+            transport.close()
+            self.assertTrue(transport.is_closing())
+            self.assertFalse(transport.is_reading())
+            self.assertIsNone(await protocol.lost)
+            self.assertFalse(protocol.eof)
+            return transport.vt
+        self.assertTrue(self.run_async(run()).closed)
@@ -0,0 +1,42 @@
+import unittest
+
+from vterm import c, core
+
+
+class DamageOnly(core.ScreenCallbacks):
+    def __init__(self, vt):
+        super().__init__(vt)
+        self.damage_rects = []
+
+    def damage(self, rect):
+        self.damage_rects.append(rect)
+        return 1
+
+
+class DefaultSlotsTest(unittest.TestCase):
+    ''' Slots that a class doesn't override must behave as if there were
+        no callback at all, not as the base class's stubs.
+    '''
+    def setUp(self):
+        self.vt = core.VTerm(core.Size(rows=3, cols=10))
+        self.callbacks = DamageOnly(self.vt)
+        self.vt.set_callbacks(self.callbacks)
+
+    def test_only_damage_is_wired(self):
+        struct = core._screen_callbacks_struct(self.callbacks)
+        self.assertNotEqual(struct.damage, c.ffi.NULL)
+        for name in ('moverect', 'movecursor', 'settermprop', 'bell', 'resize', 'sb_pushline', 'sb_popline'):
+            self.assertEqual(getattr(struct, name), c.ffi.NULL, name)
+
+    def test_termprops_are_accepted(self):
+        # A settermprop stub returning 0 would veto hiding the cursor.
+        self.vt.input_write(b'\x1b[?25l\x1b[?25$p')
+        self.assertEqual(self.vt.output_read(), b'\x1b[?25;2$y')
+
+    def test_scroll_falls_back_to_damage(self):
+        self.vt.input_write(b'a\r\nb\r\nc')
+        del self.callbacks.damage_rects[:]
+        # Without a moverect, the moved rows are reported as damage.
+        self.vt.input_write(b'\r\n')
+        self.assertIn(core.Rect(start_row=0, end_row=2, start_col=0, end_col=10), self.callbacks.damage_rects)
+        self.assertEqual(self.vt.get_text(core.Rect(start_row=0, end_row=3, start_col=0, end_col=1)), b'b\nc\n')
@@ -0,0 +1,89 @@
+import unittest
+
+from vterm import c, core
+
+
+class FromNativeTest(unittest.TestCase):
+    ''' The specialised converters must agree with the generic `from_native`.
+    '''
+    def test_structs(self):
+        rect = c.ffi.new('VTermRect*', [1, 2, 3, 4])
+        self.assertEqual(core._rect_from_native(rect[0]), core.from_native(rect[0], cls=core.Rect))
+        pos = c.ffi.new('VTermPos*', [5, 6])
+        self.assertEqual(core._pos_from_native(pos[0]), core.from_native(pos[0], cls=core.Pos))
+        color = c.ffi.new('VTermColor*', [7, 8, 9])
+        self.assertEqual(core._color_from_native(color[0]), core.from_native(color[0], cls=core.Color))
+        for doublewidth in (0, 1):
+            for doubleheight in (0, 1, 2):
+                info = c.ffi.new('VTermLineInfo*', [doublewidth, doubleheight])
+                self.assertEqual(core._lineinfo_from_native(info), core.from_native(info, cls=core.LineInfo))
+
+    def test_glyphinfo(self):
+        for text in ('a', 'é', '\U0001F600'):
+            chars = c.ffi.new('uint32_t[]', [ord(ch) for ch in text] + [0])
+            info = c.ffi.new('VTermGlyphInfo*')
+            info.chars = chars
+            info.width = 2
+            info.protected_cell = 1
+            info.dhl = 2
+            rv = core._glyphinfo_from_native(info)
+            self.assertEqual(rv, core.from_native(info, cls=core.GlyphInfo))
+            self.assertEqual(rv.chars, text)
+
+    def values(self, value_type):
+        val = c.ffi.new('VTermValue*')
+        if value_type is core.ValueType.BOOL:
+            for x in (0, 1):
+                val.boolean = x
+                yield val
+        elif value_type is core.ValueType.INT:
+            for x in (0, 3, -1):
+                val.number = x
+                yield val
+        elif value_type is core.ValueType.STRING:
+            s = c.ffi.new('char[]', b'title')
+            val.string = s
+            yield val
+        else:
+            val.color = [10, 20, 30]
+            yield val
+
+    def test_props(self):
+        for prop in core.Prop:
+            member, convert = core._prop_from_native[prop.value]
+            self.assertIs(member, prop)
+            for val in self.values(core._prop_value_types[prop]):
+                self.assertEqual(convert(val), core.from_native(val, prop=prop), prop)
+
+    def test_attrs(self):
+        for attr in core.Attr:
+            member, convert = core._attr_from_native[attr.value]
+            self.assertIs(member, attr)
+            for val in self.values(core._attr_value_types[attr]):
+                self.assertEqual(convert(val), core.from_native(val, attr=attr), attr)
+
+
+class InternedTest(unittest.TestCase):
+    ''' Interned values must be interchangeable with freshly built ones.
+    '''
+    def test_pos(self):
+        core._reserve_pos_cache(core.Size(rows=4, cols=5))
+        for row, col in [(0, 0), (3, 4), (-1, 0), (0, core._POS_CACHE_LIMIT)]:
+            pos = core._interned_pos(row, col)
+            fresh = core.Pos(row=row, col=col)
+            self.assertEqual(pos, fresh)
+            self.assertEqual(hash(pos), hash(fresh))
+        self.assertIs(core._interned_pos(3, 4), core._interned_pos(3, 4))
+
+    def test_color_and_size(self):
+        self.assertEqual(core._interned_color(1, 2, 3), core.Color(red=1, green=2, blue=3))
+        self.assertIs(core._interned_color(1, 2, 3), core._interned_color(1, 2, 3))
+        self.assertEqual(core._interned_size(24, 80), core.Size(rows=24, cols=80))
+        self.assertEqual({core._interned_size(24, 80): 1}, {core.Size(rows=24, cols=80): 1})
+
+    def test_enums(self):
+        for cls in (core.Attr, core.Prop, core.Key):
+            for member in cls:
+                self.assertIs(core.from_native(member.value, cls=cls), member)
+        for value in range(8):
+            self.assertEqual(core.from_native(value, cls=core.Modifier), core.Modifier(value))
@@ -0,0 +1,33 @@
+import unittest
+
+from vterm import core, damage
+
+
+class _Timer:
+    def cancel(self):
+        pass
+
+
+class DamageSchedulerTest(unittest.TestCase):
+    def flood(self, merge):
+        vt = core.VTerm(core.Size(rows=4, cols=10))
+        now = [0.0]
+        scheduler = damage.DamageScheduler(vt, lambda delay, fn: _Timer(), merge=merge, clock=lambda: now[0])
+        modes = []
+        for _ in range(3):
+            output = b'x' * 100
+            vt.input_write(output)
+            now[0] += 1
+            scheduler.input_processed(len(output))
+            modes.append(scheduler.mode)
+        now[0] += 1
+        scheduler.input_processed(1)
+        modes.append(scheduler.mode)
+        return modes
+
+    def test_flood_keeps_scroll(self):
+        self.assertEqual(self.flood(core.DamageSize.SCROLL), [core.DamageSize.SCROLL] * 4)
+
+    def test_flood_merges_as_scroll(self):
+        cell, scroll = core.DamageSize.CELL, core.DamageSize.SCROLL
+        self.assertEqual(self.flood(cell), [scroll, scroll, scroll, cell])
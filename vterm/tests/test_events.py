@@ -0,0 +1,114 @@
+import unittest
+
+from vterm import core
+
+
+_SIZE = core.Size(rows=4, cols=20)
+# No string termprops or scrolling off the screen: those reach the
+# callbacks at once, ahead of the batch.
+_OUTPUT = (
+    'plain \x1b[1;31mbold\x1b[38;5;208mcolor\x1b[m\r\n'
+    '中 é\x1b[?25l\x1b[2;3H\x1b[K\x1b[?25h\x07'
+    '\x1b[2;4r\x1b[3;1H\x1b[L\x1b[r\x1b#6\x1b[3;5H\x1b[2J'
+).encode('utf-8')
+
+
+class _Recorder:
+    ''' Notes every call, and returns what the batching C callbacks (see
+        c-sources/events.c) do.
+    '''
+    def __init__(self, vt):
+        super().__init__(vt)
+        self.events = []
+
+    def _record(self, name, *args):
+        self.events.append((name, args))
+        return 0 if name in ('scrollrect', 'moverect') else 1
+
+
+class _ScreenRecorder(_Recorder):
+    def damage(self, rect):
+        return self._record('damage', rect)
+    def moverect(self, dest, src):
+        return self._record('moverect', dest, src)
+    def movecursor(self, pos, oldpos, visible):
+        return self._record('movecursor', pos, oldpos, visible)
+    def settermprop(self, prop, val):
+        return self._record('settermprop', prop, val)
+    def bell(self):
+        return self._record('bell')
+    def resize(self, size):
+        return self._record('resize', size)
+
+
+class _StateRecorder(_Recorder):
+    def putglyph(self, info, pos):
+        return self._record('putglyph', info, pos)
+    def movecursor(self, pos, oldpos, visible):
+        return self._record('movecursor', pos, oldpos, visible)
+    def scrollrect(self, rect, downward, rightward):
+        return self._record('scrollrect', rect, downward, rightward)
+    def moverect(self, dest, src):
+        return self._record('moverect', dest, src)
+    def erase(self, rect, selective):
+        return self._record('erase', rect, selective)
+    def initpen(self):
+        return self._record('initpen')
+    def setpenattr(self, attr, val):
+        return self._record('setpenattr', attr, val)
+    def settermprop(self, prop, val):
+        return self._record('settermprop', prop, val)
+    def bell(self):
+        return self._record('bell')
+    def resize(self, size, delta):
+        return self._record('resize', size, delta)
+    def setlineinfo(self, row, newinfo, oldinfo):
+        return self._record('setlineinfo', row, newinfo, oldinfo)
+
+
+class ScreenRecorder(_ScreenRecorder, core.ScreenCallbacks):
+    pass
+
+class BatchedScreenRecorder(_ScreenRecorder, core.BatchedScreenCallbacks):
+    pass
+
+class StateRecorder(_StateRecorder, core.StateCallbacks):
+    pass
+
+class BatchedStateRecorder(_StateRecorder, core.BatchedStateCallbacks):
+    pass
+
+
+def _run(cls, install):
+    vt = core.VTerm(_SIZE)
+    callbacks = cls(vt)
+    install(vt, callbacks)
+    vt.input_write(_OUTPUT)
+    vt.set_size(core.Size(rows=5, cols=22))
+    vt.flush_damage()
+    return callbacks.events
+
+
+class EventBatchTest(unittest.TestCase):
+    ''' `EventBatch.replay` must make the same calls as ordinary callbacks.
+    '''
+    def test_screen(self):
+        plain = _run(ScreenRecorder, core.VTerm.screen_set_callbacks)
+        batched = _run(BatchedScreenRecorder, lambda vt, cb: vt.screen_set_batched_callbacks(cb, capacity=8))
+        self.assertIn('resize', [name for name, _ in plain])
+        self.assertEqual(batched, plain)
+        # Positions come from the same interned table either way.
+        plain_moves = [args[0] for name, args in plain if name == 'movecursor']
+        batched_moves = [args[0] for name, args in batched if name == 'movecursor']
+        for a, b in zip(plain_moves, batched_moves):
+            self.assertIs(a, b)
+
+    def test_state(self):
+        plain = _run(StateRecorder, core.VTerm._state_set_callbacks)
+        batched = _run(BatchedStateRecorder, lambda vt, cb: vt._state_set_batched_callbacks(cb, capacity=8))
+        names = {name for name, _ in plain}
+        self.assertTrue({'putglyph', 'setpenattr', 'settermprop', 'setlineinfo', 'resize', 'bell'} <= names, names)
+        self.assertEqual(batched, plain)
+        for (name, a), (_, b) in zip(plain, batched):
+            if name == 'setpenattr':
+                self.assertIs(a[0], b[0])
@@ -0,0 +1,44 @@
+import io
+import unittest
+
+from vterm import core, export
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        self.vt = core.VTerm(core.Size(rows=3, cols=40))
+        # Bold, and bold in another font (which CSS can't show), look the
+        # same, so they share a class.
+        self.vt.input_write(b'<b>&amp;</b> \x1b[1mbold\x1b[m \x1b[1;11mfont\x1b[m \x1b[1magain\x1b[m')
+
+    def export(self, format, **kwargs):
+        out = io.StringIO()
+        nchars = export.export(self.vt, out, format, **kwargs)
+        out = out.getvalue()
+        self.assertEqual(nchars, len(out))
+        return out
+
+    def test_html_escapes(self):
+        out = self.export('html', title='a<b')
+        self.assertIn('<title>a&lt;b</title>', out)
+        self.assertIn('&lt;b&gt;&amp;amp;&lt;/b&gt; ', out)
+        self.assertNotIn('<b>', out)
+
+    def test_html_classes_are_shared(self):
+        out = self.export('html')
+        self.assertEqual(out.count('.s0{font-weight:bold}'), 1)
+        self.assertNotIn('.s1', out)
+        self.assertEqual(out.count('<span class="s0">'), 3)
+
+    def test_chunks(self):
+        self.assertEqual(self.export('html', chunk_size=1).replace('</pre>\n<pre>\n', ''), self.export('html'))
+
+    def test_svg_escapes(self):
+        out = self.export('svg')
+        self.assertIn('>&lt;b&gt;&amp;amp;&lt;/b&gt; <', out)
+        self.assertEqual(out.count('.s0{font-weight:bold}'), 1)
+        self.assertEqual(out.count(' class="s0"'), 3)
+
+    def test_ansi(self):
+        self.assertEqual(self.export('ansi'),
+                '<b>&amp;</b> \x1b[0;1mbold\x1b[m \x1b[0;1;11mfont\x1b[m \x1b[0;1magain\x1b[m\n\n\n')
@@ -0,0 +1,47 @@
+import time
+import unittest
+
+from vterm import core, farm
+
+
+_SIZE = core.Size(rows=4, cols=20)
+
+
+class FarmTest(unittest.TestCase):
+    def setUp(self):
+        self.farm = farm.Farm(1)
+        self.addCleanup(self.farm.close)
+
+    def wait_for_exit(self, terminal):
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            for event, which, detail in self.farm.poll(1):
+                self.assertNotEqual(event, 'error', detail)
+                if event == 'exit' and which is terminal:
+                    return
+        self.fail('%r did not exit' % terminal)
+
+    def text(self, terminal, row=0):
+        screen = terminal.read()
+        return ''.join(screen.snapshot.get_chars(core.Pos(row=row, col=col)) or ' ' for col in range(screen.size.cols)).rstrip()
+
+    def test_close_exited_after_respawn(self):
+        first = self.farm.spawn(['sh', '-c', 'printf first'], size=_SIZE)
+        self.wait_for_exit(first)
+        self.assertFalse(first.read().alive)
+        # Likely gets the fd the first program's pty had.
+        second = self.farm.spawn(['sh', '-c', 'read x; printf "got $x"'], size=_SIZE)
+        first.close()
+        second.write(b'hi\r')
+        self.wait_for_exit(second)
+        # The line typed is echoed first.
+        self.assertEqual(self.text(second, 1), 'got hi')
+
+    def test_feed(self):
+        terminal = self.farm.open(size=_SIZE)
+        terminal.feed(b'fed \x1b[1mtext')
+        deadline = time.monotonic() + 10
+        while self.text(terminal) != 'fed text':
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+        self.assertEqual(terminal.read().cursor, core.Pos(row=0, col=8))
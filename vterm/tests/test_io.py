@@ -0,0 +1,65 @@
+import os
+import unittest
+
+from vterm import c, core
+
+
+class BufferReuseTest(unittest.TestCase):
+    def setUp(self):
+        self.vt = core.VTerm(core.Size(rows=2, cols=20))
+        self.r, self.w = os.pipe()
+        self.addCleanup(os.close, self.r)
+
+    def text(self):
+        return self.vt.get_text(core.Rect(start_row=0, end_row=1, start_col=0, end_col=20)).rstrip(b' ')
+
+    def test_input_from_fd(self):
+        os.write(self.w, b'abc')
+        self.assertEqual(self.vt.input_from_fd(self.r), 3)
+        buf = self.vt._get_input_buffer()[0]
+        os.write(self.w, b'def')
+        self.assertEqual(self.vt.input_from_fd(self.r), 3)
+        self.assertIs(self.vt._get_input_buffer()[0], buf)
+        self.assertEqual(self.text(), b'abcdef')
+        os.close(self.w)
+        self.assertEqual(self.vt.input_from_fd(self.r), 0)
+
+    def test_input_from_fd_into_own_buffer(self):
+        buf = bytearray(2)
+        os.write(self.w, b'xyz')
+        os.close(self.w)
+        self.assertEqual(self.vt.input_from_fd(self.r, buf), 2)
+        self.assertEqual(self.text(), b'xy')
+        self.assertEqual(self.vt.input_from_fd(self.r, buf), 1)
+        self.assertEqual(self.text(), b'xyz')
+        self.assertEqual(self.vt.input_from_fd(self.r, buf), 0)
+        self.assertIsNone(self.vt._input_buffer)
+
+    def test_output_read_into(self):
+        os.close(self.w)
+        reply = core.VTerm(core.Size(rows=2, cols=20))
+        reply.input_write(b'\x1b[c')
+        expected = reply.output_read()
+        self.assertGreater(len(expected), 4)
+
+        self.vt.input_write(b'\x1b[c')
+        buf = bytearray(4)
+        out = bytearray()
+        while True:
+            n = self.vt.output_read_into(buf)
+            out += buf[:n]
+            if n < len(buf):
+                break
+        self.assertEqual(out, expected)
+        self.assertEqual(self.vt.output_read_into(buf), 0)
+
+    def test_output_read_grows_buffer(self):
+        os.close(self.w)
+        self.vt._output_buffer = c.ffi.new('char[]', 2)
+        self.vt.input_write(b'\x1b[c')
+        out = self.vt.output_read()
+        buf = self.vt._output_buffer
+        self.assertGreater(len(buf), 2)
+        self.vt.input_write(b'\x1b[c')
+        self.assertEqual(self.vt.output_read(), out)
+        self.assertIs(self.vt._output_buffer, buf)
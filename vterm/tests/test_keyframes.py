@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+
+from vterm import core, keyframes, record, replay
+
+
+_SIZE = core.Size(rows=6, cols=24)
+
+
+def _outputs():
+    # Events that leave the cursor in the middle of a line, hidden, or
+    # after an absolute move, so that a keyframe has to restore it.
+    for i in range(40):
+        yield b'\x1b[%dmline %d' % (31 + i % 7, i)
+        if i % 3 == 0:
+            yield b'\x1b[?25l, more'
+        if i % 5 == 0:
+            yield b'\x1b[2;10H*\x1b[?25h'
+        if i % 4 == 0:
+            yield b'\x1b[m'
+        yield b'\r\n'
+
+
+class KeyframeSeekTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'rec.vtrec')
+        with record.Recorder(self.path, size=_SIZE, format='binary') as recorder:
+            for output in _outputs():
+                recorder.output(output)
+        self.output = b''.join(_outputs())
+
+    def full_replay(self, nbytes):
+        vt = replay.new_vterm(_SIZE)
+        vt.input_write(self.output[:nbytes])
+        return vt
+
+    def test_seek_matches_full_replay(self):
+        with keyframes.KeyframeIndex.build(self.path, bytes_interval=50) as index:
+            self.assertGreater(len(index.keyframes), 5)
+            for nbytes in range(0, len(self.output) + 1, 7):
+                expected = self.full_replay(nbytes)
+                vt = index.seek(nbytes=nbytes)
+                self.assertEqual(replay.screen_text(vt), replay.screen_text(expected), nbytes)
+                self.assertEqual(vt.state_get_cursorpos(), expected.state_get_cursorpos(), nbytes)
+
+    def test_keyframe_cursor(self):
+        vt = replay.new_vterm(_SIZE)
+        vt.input_write(b'abc\x1b[3;5Hx')
+        blob = keyframes.serialize_screen(vt, cursor_visible=False)
+        self.assertTrue(blob.endswith(b'\x1b[m'))
+        self.assertIn(b'\x1b[?25l', blob)
+        painted = replay.new_vterm(_SIZE)
+        painted.input_write(blob)
+        self.assertEqual(replay.screen_text(painted), replay.screen_text(vt))
+        self.assertEqual(painted.state_get_cursorpos(), core.Pos(row=2, col=5))
+
+    def test_closed(self):
+        index = keyframes.KeyframeIndex.build(self.path, bytes_interval=50)
+        self.assertFalse(index.closed)
+        index.seek(nbytes=10)
+        self.assertFalse(index.closed)
+        index.close()
+        self.assertTrue(index.closed)
+        with self.assertRaises(ValueError):
+            index.seek(nbytes=10)
@@ -0,0 +1,31 @@
+import unittest
+
+from vterm import core
+
+
+class ScreenGetLinesTest(unittest.TestCase):
+    def setUp(self):
+        self.vt = core.VTerm(core.Size(rows=4, cols=10))
+
+    def test_damaged_rows_are_read_again(self):
+        self.vt.input_write('one\r\nzwei 中'.encode('utf-8'))
+        self.assertEqual(self.vt.screen_get_lines(), ['one', 'zwei 中', '', ''])
+        self.vt.input_write(b'\x1b[3;1Hthree\x1b[1;1HON')
+        self.assertEqual(self.vt.screen_get_lines(), ['ONe', 'zwei 中', 'three', ''])
+        self.assertEqual(self.vt.screen_get_lines(1, 3), ['zwei 中', 'three'])
+
+    def test_join_wrapped(self):
+        self.vt.input_write(b'0123456789abc\r\nend')
+        self.assertEqual(self.vt.screen_get_lines(join_wrapped=True), ['0123456789abc', 'end', '', ''])
+
+    def test_altscreen_after_get_lines(self):
+        # Reading lines puts the damage tap in front of the (here absent)
+        # screen callbacks; the switch to the alternate screen must still
+        # be accepted.
+        self.vt.screen_enable_altscreen(1)
+        self.vt.input_write(b'primary')
+        self.assertEqual(self.vt.screen_get_lines(0, 1), ['primary'])
+        self.vt.input_write(b'\x1b[?1049h\x1b[Halt')
+        self.assertEqual(self.vt.screen_get_lines(0, 1), ['alt'])
+        self.vt.input_write(b'\x1b[?1049l')
+        self.assertEqual(self.vt.screen_get_lines(0, 1), ['primary'])
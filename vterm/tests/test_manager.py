@@ -0,0 +1,32 @@
+import unittest
+
+from vterm import core, manager
+
+
+_SIZE = core.Size(rows=4, cols=20)
+
+
+class SessionManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.exits = []
+        self.mgr = manager.SessionManager(on_exit=self.exits.append)
+        self.addCleanup(self.mgr.close)
+
+    def test_output_and_exit(self):
+        session = self.mgr.spawn(['sh', '-c', 'printf hello'], size=_SIZE)
+        self.mgr.run(timeout=10)
+        self.assertEqual(self.exits, [session])
+        self.assertEqual(len(self.mgr), 0)
+        self.assertEqual(session.stats.bytes_read, 5)
+        self.assertEqual(self.mgr.exited, 1)
+
+    def test_remove_after_fd_reuse(self):
+        old = self.mgr.spawn(['true'], size=_SIZE)
+        self.mgr.run(timeout=10)
+        self.assertEqual(self.exits, [old])
+        new = self.mgr.spawn(['sleep', '10'], size=_SIZE)
+        # Whether or not the fd was reused, removing the exited session
+        # must leave the new one alone.
+        self.mgr.remove(old)
+        self.assertEqual(list(self.mgr), [new])
+        self.assertEqual(self.mgr.poll(0), 0)
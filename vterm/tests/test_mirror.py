@@ -0,0 +1,60 @@
+import unittest
+
+from vterm import core, mirror
+
+
+_SIZE = core.Size(rows=5, cols=12)
+_LINES = ''.join('\x1b[%dm%d: 中é line\x1b[m\r\n' % (31 + i % 7, i) for i in range(8))
+
+
+class ScreenMirrorTest(unittest.TestCase):
+    def mirror(self, merge):
+        vt = core.VTerm(_SIZE)
+        vt.set_damage_merge(merge)
+        m = mirror.ScreenMirror(vt)
+        vt.set_callbacks(m)
+        return vt, m
+
+    def assert_matches_get_cell(self, vt, m):
+        vt.flush_damage()
+        for row in range(m.rows):
+            for col in range(m.cols):
+                pos = core.Pos(row=row, col=col)
+                cell = vt.screen_get_cell(pos)
+                text, width, attrs, fg, bg = m.cell(pos)
+                if text is None:
+                    self.assertEqual(cell.chars, '', pos)
+                else:
+                    self.assertEqual(text, cell.chars or ' ', pos)
+                    self.assertEqual(width, cell.width, pos)
+                self.assertEqual(core.unpack_attrs(attrs), cell.attrs, pos)
+                self.assertEqual(fg, bytes([cell.fg.red, cell.fg.green, cell.fg.blue]), pos)
+                self.assertEqual(bg, bytes([cell.bg.red, cell.bg.green, cell.bg.blue]), pos)
+
+    def check(self, *outputs):
+        for merge in (core.DamageSize.CELL, core.DamageSize.ROW, core.DamageSize.SCROLL):
+            with self.subTest(merge=merge):
+                vt, m = self.mirror(merge)
+                for output in outputs:
+                    vt.input_write(output.encode('utf-8'))
+                    self.assert_matches_get_cell(vt, m)
+
+    def test_scroll_screen(self):
+        self.check(_LINES, _LINES[:len(_LINES) // 2])
+
+    def test_scroll_region(self):
+        self.check(_LINES, '\x1b[2;4r\x1b[4;1H\n\n\x1b[2;1H\x1bM\x1b[r', '\x1b[3;1H\x1b[2L\x1b[1M')
+
+    def test_scroll_columns(self):
+        # DECSLRM: scrolls that move only part of each row.
+        self.check(_LINES, '\x1b[?69h\x1b[3;8s\x1b[5;4H\n\n\x1b[1;4H\x1b[2@\x1b[3P\x1b[s\x1b[?69l')
+
+    def test_changed_rows(self):
+        vt, m = self.mirror(core.DamageSize.SCROLL)
+        vt.input_write(_LINES.encode('utf-8'))
+        vt.flush_damage()
+        seen = m.generation
+        vt.input_write(b'\x1b[3;1Hx')
+        vt.flush_damage()
+        self.assertEqual(m.changed_rows(seen), [2])
+        self.assertEqual(m.row_text(2)[:1], 'x')
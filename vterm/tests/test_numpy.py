@@ -0,0 +1,54 @@
+import itertools
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from vterm import c, core
+
+if numpy is not None:
+    from vterm import numpy as vnumpy
+
+
+@unittest.skipIf(numpy is None, 'NumPy is not installed')
+class ScreenArraysTest(unittest.TestCase):
+    def setUp(self):
+        self.vt = core.VTerm(core.Size(rows=3, cols=10))
+        self.vt.input_write('ab\x1b[1;4;31mcd\x1b[m\r\n\x1b[44m中\x1b[m é\r\n\x1b[38;2;1;2;3mrgb'.encode('utf-8'))
+
+    def assert_matches_get_cell(self, arrays, rect):
+        for row in range(rect.start_row, rect.end_row):
+            for col in range(rect.start_col, rect.end_col):
+                pos = core.Pos(row=row, col=col)
+                cell = self.vt.screen_get_cell(pos)
+                i, j = row - rect.start_row, col - rect.start_col
+                chars = list(itertools.takewhile(bool, arrays.chars[i, j]))
+                if chars[:1] == [0xFFffFFff]:
+                    chars = []
+                self.assertEqual(''.join(map(chr, chars)), cell.chars, pos)
+                self.assertEqual(arrays.width[i, j], cell.width, pos)
+                for name in core.ScreenCell.Attrs.fields:
+                    self.assertEqual(arrays.get_attr(name)[i, j], getattr(cell.attrs, name), (pos, name))
+                self.assertEqual(tuple(arrays.fg[i, j]), (cell.fg.red, cell.fg.green, cell.fg.blue), pos)
+                self.assertEqual(tuple(arrays.bg[i, j]), (cell.bg.red, cell.bg.green, cell.bg.blue), pos)
+
+    def test_whole_screen(self):
+        arrays = vnumpy.screen_arrays(self.vt)
+        self.assertEqual(arrays.chars.shape, (3, 10, c.VTERM_MAX_CHARS_PER_CELL))
+        self.assert_matches_get_cell(arrays, core.Rect(start_row=0, end_row=3, start_col=0, end_col=10))
+
+    def test_rect_and_reuse(self):
+        rect = core.Rect(start_row=1, end_row=3, start_col=1, end_col=6)
+        arrays = vnumpy.screen_arrays(self.vt, rect)
+        before = vnumpy.snapshot_arrays(self.vt.screen_snapshot(rect))
+        self.vt.input_write(b'\x1b[3;3H\x1b[7mXY')
+        self.assertIs(vnumpy.screen_arrays(self.vt, rect, out=arrays), arrays)
+        self.assert_matches_get_cell(arrays, rect)
+        changed = vnumpy.changed_cells(before, arrays)
+        self.assertEqual(numpy.argwhere(changed).tolist(), [[1, 1], [1, 2]])
+
+    def test_color_keys(self):
+        arrays = vnumpy.screen_arrays(self.vt)
+        self.assertEqual(vnumpy.color_keys(arrays.fg)[2, 0], 0x010203)
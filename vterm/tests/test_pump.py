@@ -0,0 +1,48 @@
+import os
+import select
+import time
+import unittest
+
+from vterm import core, pty
+
+
+class _Callbacks(pty.PtyCallbacks):
+    ''' Records the cursor visibility; has no settermprop, so libvterm must
+        take its default for that slot through the damage tap.
+    '''
+    def __init__(self, vt, **kwargs):
+        super().__init__(vt, **kwargs)
+        self.visible = []
+
+    def movecursor(self, pos, oldpos, visible):
+        self.visible.append(visible)
+        return 1
+
+
+class PumpTest(unittest.TestCase):
+    def spawn(self, output, **kwargs):
+        vt = pty.VTermPty(['sh', '-c', 'printf "$1"', 'sh', output], size=core.Size(rows=4, cols=20), **kwargs)
+        self.addCleanup(vt.close)
+        vt.screen_enable_altscreen(1)
+        fd = vt._master_fd
+        os.set_blocking(fd, False)
+        deadline = time.monotonic() + 10
+        while not vt.pump().eof:
+            self.assertLess(time.monotonic(), deadline)
+            select.select([fd], [], [], 1)
+        return vt
+
+    def row(self, vt, row):
+        return vt.screen_get_text(core.Rect(start_row=row, end_row=row + 1, start_col=0, end_col=20)).rstrip(b' ')
+
+    def test_altscreen(self):
+        vt = self.spawn(r'primary\033[?1049h\033[Halt')
+        self.assertEqual(self.row(vt, 0), b'alt')
+
+        vt = self.spawn(r'primary\033[?1049h\033[Halt\033[?1049l')
+        self.assertEqual(self.row(vt, 0), b'primary')
+
+    def test_cursor_visible(self):
+        vt = self.spawn(r'\033[?25lhidden', callbacks_cls=_Callbacks)
+        self.assertEqual(vt.callbacks.visible[-1], 0)
+        self.assertEqual(self.row(vt, 0), b'hidden')
@@ -0,0 +1,69 @@
+import itertools
+import os
+import tempfile
+import unittest
+
+from vterm import core, record, replay
+
+
+_SIZE = core.Size(rows=4, cols=20)
+_WIDE = '中'.encode('utf-8')
+# (type, data) events; the wide character is split across two outputs.
+_EVENTS = [
+    ('o', b'hello \x1b[1mworld\x1b[m\r\n'),
+    ('o', b'split ' + _WIDE[:1]),
+    ('o', _WIDE[1:] + b' joined\r\n'),
+    ('r', core.Size(rows=6, cols=30)),
+    ('o', b'\x1b[6;1Hafter resize, a longer line'),
+]
+
+
+def _expected(events):
+    vt = core.VTerm(_SIZE)
+    for type_, data in events:
+        if type_ == 'o':
+            vt.input_write(data)
+        else:
+            vt.set_size(data)
+    return replay.screen_text(vt)
+
+
+class RecordReplayTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+    def record(self, name, events, **kwargs):
+        path = os.path.join(self.dir, name)
+        # One event every quarter second.
+        times = itertools.count(0, 0.25)
+        with record.Recorder(path, size=_SIZE, clock=lambda: next(times), **kwargs) as recorder:
+            for type_, data in events:
+                if type_ == 'o':
+                    recorder.output(data)
+                else:
+                    recorder.resize(data)
+        return path
+
+    def test_round_trip(self):
+        nbytes = sum(len(data) for type_, data in _EVENTS if type_ == 'o')
+        for format, compression in itertools.product(['asciicast', 'binary'], [None, 'gzip']):
+            with self.subTest(format=format, compression=compression):
+                path = self.record('%s-%s' % (format, compression), _EVENTS, format=format, compression=compression)
+                result = replay.replay(path, frames=[0.6])
+                self.assertEqual(result.text, _expected(_EVENTS))
+                self.assertEqual(result.nbytes, nbytes)
+                self.assertEqual(result.duration, 1.25)
+                self.assertEqual(result.frames, [replay.Frame(0.6, _expected(_EVENTS[:2]))])
+
+    def test_binary_keeps_bytes(self):
+        events = [('o', b'\xff\xfe not utf-8 \x1b[31m'), ('o', b'\x80')]
+        path = self.record('bytes', events, format='binary')
+        with open(path, 'rb') as f:
+            size, read = replay.read_binary(f.read())
+        self.assertEqual(size, _SIZE)
+        self.assertEqual([(t, type_, bytes(data)) for t, type_, data in read], [
+            (0.25, 'o', events[0][1]),
+            (0.5, 'o', events[1][1]),
+        ])
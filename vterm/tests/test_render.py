@@ -0,0 +1,98 @@
+import unittest
+
+from vterm import core, render
+
+
+_SIZE = core.Size(rows=5, cols=16)
+
+
+class _Callbacks(core.ScreenCallbacks):
+    def __init__(self, vt, renderer):
+        super().__init__(vt)
+        self.renderer = renderer
+
+    def damage(self, rect):
+        return self.renderer.damage(rect)
+
+    def moverect(self, dest, src):
+        return self.renderer.moverect(dest, src)
+
+    def movecursor(self, pos, oldpos, visible):
+        return self.renderer.movecursor(pos, oldpos, visible)
+
+    def settermprop(self, prop, val):
+        self.renderer.settermprop(prop, val)
+        return 1
+
+    def bell(self):
+        return self.renderer.bell()
+
+    def resize(self, size):
+        return self.renderer.resize(size)
+
+
+class _Host(core.ScreenCallbacks):
+    ''' The host terminal, noting whether its cursor is visible.
+    '''
+    def __init__(self, vt):
+        super().__init__(vt)
+        self.cursor_visible = True
+
+    def settermprop(self, prop, val):
+        if prop == core.Prop.CURSORVISIBLE:
+            self.cursor_visible = bool(val)
+        return 1
+
+
+class AnsiRendererTest(unittest.TestCase):
+    ''' Everything the renderer writes goes to a second VTerm, standing in
+        for the host terminal, which must end up showing the same screen.
+    '''
+    def setUp(self):
+        self.vt = core.VTerm(_SIZE)
+        self.vt.set_damage_merge(core.DamageSize.SCROLL)
+        self.host = core.VTerm(_SIZE)
+        self.host_callbacks = _Host(self.host)
+        self.host.set_callbacks(self.host_callbacks)
+        self.writes = []
+        self.renderer = render.AnsiRenderer(self.vt, self.writes.append)
+        self.vt.set_callbacks(_Callbacks(self.vt, self.renderer))
+
+    def feed(self, data):
+        self.vt.input_write(data)
+        self.vt.flush_damage()
+        self.renderer.render()
+        for chunk in self.writes:
+            self.host.input_write(chunk)
+        self.writes.clear()
+        self.assert_same_screen()
+
+    def assert_same_screen(self):
+        for row in range(_SIZE.rows):
+            for col in range(_SIZE.cols):
+                pos = core.Pos(row=row, col=col)
+                self.assertEqual(self.host.screen_get_cell(pos), self.vt.screen_get_cell(pos), pos)
+        self.assertEqual(self.host.state_get_cursorpos(), self.vt.state_get_cursorpos())
+
+    def test_text_and_pens(self):
+        self.feed(b'hello \x1b[1;31mbold red\x1b[m')
+        self.feed('\r\n\x1b[4;44munder\x1b[m 中 é \x1b[3;9mit\x1b[m'.encode('utf-8'))
+        self.feed(b'\x1b[3;5H\x1b[7m\x1b[38;5;208mreverse\x1b[m\x1b[1;3Hx')
+        self.feed(b'\x1b[2;1H\x1b[K\x1b[42m\x1b[Kgreen\x1b[m')
+
+    def test_scrolls(self):
+        self.feed(b''.join(b'line %d\r\n' % i for i in range(4)))
+        self.feed(b'\x1b[33mscrolled\r\n\x1b[m' * 3)
+        self.feed(b'\x1b[H\x1b[2L\x1b[4;1H\x1b[M')
+
+    def test_cursor_visibility(self):
+        self.feed(b'a\x1b[?25l')
+        self.assertFalse(self.host_callbacks.cursor_visible)
+        self.feed(b'\x1b[?25hb')
+        self.assertTrue(self.host_callbacks.cursor_visible)
+
+    def test_invalidate(self):
+        self.feed(b'one\r\ntwo')
+        self.host.input_write(b'\x1b[2J\x1b[Hgarbage')
+        self.renderer.invalidate()
+        self.feed(b'')
@@ -0,0 +1,52 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from vterm import replay
+
+
+class ReplayMainTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+    def write(self, name, data):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w' if isinstance(data, str) else 'wb') as f:
+            f.write(data)
+        return path
+
+    def main(self, *argv):
+        out = io.StringIO()
+        err = io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            replay.main(list(argv))
+        return out.getvalue(), err.getvalue()
+
+    def test_files(self):
+        a = self.write('a', b'Script started on today\nfirst\r\n\x1b[1mbold\x1b[m')
+        b = self.write('b', b'second')
+        out, err = self.main('-j', '1', '--size', '3x10', a, b)
+        self.assertEqual(out, '==> %s <==\nfirst\nbold\n\n==> %s <==\nsecond\n\n\n' % (a, b))
+        lines = err.splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith('%s: 18 bytes in ' % a), lines[0])
+        self.assertTrue(lines[1].startswith('%s: 6 bytes in ' % b), lines[1])
+        self.assertTrue(lines[2].startswith('total: 2 files, 24 bytes in '), lines[2])
+
+    def test_timing_and_frames(self):
+        path = self.write('typescript', b'one\r\ntwo\r\n')
+        timing = self.write('timing', '0.5 5\n1.0 5\n')
+        out, err = self.main('-q', '--size', '2x5', '--timing', timing, '--frame', '1', '--frame', '2', path)
+        self.assertEqual(out, '')
+        self.assertTrue(err.startswith('%s: 10 bytes in ' % path), err)
+        out, _ = self.main('--size', '2x5', '--timing', timing, '--frame', '1', path)
+        self.assertEqual(out, '==> %s at 1s <==\none\n\n==> %s <==\ntwo\n\n' % (path, path))
+
+    def test_timing_needs_one_file(self):
+        path = self.write('typescript', b'')
+        with self.assertRaises(SystemExit):
+            self.main('--timing', path, path, path)
@@ -0,0 +1,137 @@
+import tempfile
+import unittest
+
+from vterm import core, scrollback, search
+
+
+class _Callbacks(core.ScreenCallbacks):
+    ''' Saves the lines scrolled off in a scrollback, and what their cells
+        were.
+    '''
+    def __init__(self, vt, **kwargs):
+        super().__init__(vt)
+        self.scrollback = scrollback.Scrollback(**kwargs)
+        self.pushed = []
+
+    def sb_pushline(self, cells):
+        self.pushed.append([core.from_native(cells + i, cls=core.ScreenCell) for i in range(len(cells))])
+        self.scrollback.push(cells)
+        return 1
+
+
+def _scrolled(output, *, size=core.Size(rows=2, cols=12), **kwargs):
+    vt = core.VTerm(size)
+    callbacks = _Callbacks(vt, **kwargs)
+    vt.screen_set_callbacks(callbacks)
+    vt.input_write(output)
+    return vt, callbacks
+
+
+class LineCodecTest(unittest.TestCase):
+    def test_round_trip(self):
+        lines = [
+            b'plain',
+            b'\x1b[1;31mbold\x1b[m \x1b[4;44munder\x1b[m',
+            'wide 中文 é'.encode('utf-8'),
+            b'\x1b[42mgreen bg\x1b[K\x1b[m',
+            b'',
+            b'\x1b[7m0123456789ab',
+        ]
+        vt, callbacks = _scrolled(b'\r\n'.join(lines) + b'\x1b[m\r\n\r\n')
+        sb = callbacks.scrollback
+        self.assertEqual(len(sb), len(lines))
+        for i, expected in enumerate(callbacks.pushed):
+            cells = sb.get_cells(i)
+            self.assertEqual([core.from_native(cells + col, cls=core.ScreenCell) for col in range(len(cells))], expected, i)
+
+    def test_text(self):
+        vt, callbacks = _scrolled('a\x1b[1mb\x1b[mc\r\nwide 中!\r\n\r\n'.encode('utf-8'))
+        sb = callbacks.scrollback
+        self.assertEqual(sb.get_text(0), 'abc')
+        self.assertEqual(sb.get_text(1), 'wide 中!')
+
+
+class StyleTableTest(unittest.TestCase):
+    def test_styles_of_dropped_lines_are_released(self):
+        output = b''.join(b'\x1b[38;5;%dmline %d\x1b[m\r\n' % (i, i) for i in range(200))
+        vt, callbacks = _scrolled(output, max_lines=3)
+        styles = callbacks.scrollback.codec.styles
+        # The colors of the last three lines, and the default.
+        self.assertEqual(len(styles), 4)
+        self.assertLessEqual(len(styles.keys), 5)
+        self.assertGreaterEqual(callbacks.scrollback.nbytes, styles.nbytes)
+
+    def test_styles_dont_empty_the_ring(self):
+        # Lines of a dozen colors each, whose styles outweigh max_bytes.
+        output = b''.join(b''.join(b'\x1b[38;5;%dmx' % ((i * 12 + j) % 256) for j in range(12)) + b'\x1b[m\r\n' for i in range(20))
+        vt, callbacks = _scrolled(output, max_lines=None, max_bytes=1000)
+        sb = callbacks.scrollback
+        self.assertGreater(sb.codec.styles.nbytes, sb.max_bytes)
+        self.assertGreater(len(sb), 1)
+        self.assertEqual(sb.get_text(-1), 'x' * 12)
+
+    def test_refcounts(self):
+        styles = scrollback.StyleTable()
+        a = styles.intern(10)
+        self.assertEqual(styles.intern(10), a)
+        b = styles.intern(20)
+        styles.release(a)
+        self.assertEqual(styles.keys[a], 10)
+        styles.release(a)
+        self.assertIsNone(styles.keys[a])
+        self.assertEqual(len(styles), 1)
+        self.assertEqual(styles.intern(30), a)
+        self.assertEqual(styles.keys[b], 20)
+
+
+class SpillSearchTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        lines = []
+        for i in range(40):
+            if i == 17:
+                lines.append('中 needle %d' % i)
+            elif i in (3, 38):
+                lines.append('needle %d' % i)
+            else:
+                lines.append('line %d' % i)
+        # Scroll all 40 lines off a 2-row screen.
+        output = '\r\n'.join(lines) + '\r\n\r\n'
+        vt = core.VTerm(core.Size(rows=2, cols=16))
+        callbacks = _Callbacks(vt, max_lines=5, spill=scrollback.SpillStore(tmp.name, segment_lines=4))
+        self.sb = callbacks.scrollback
+        self.addCleanup(self.sb.close)
+        self.sb.index = search.TrigramIndex(chunk_lines=8)
+        vt.screen_set_callbacks(callbacks)
+        vt.input_write(output.encode('utf-8'))
+
+    def test_hits_in_spill_and_memory(self):
+        self.assertEqual(len(self.sb), 40)
+        self.assertEqual(len(self.sb.spill), 35)
+        self.assertEqual(self.sb.search('needle'), [
+            search.Match(3, 0, 6),
+            search.Match(17, 3, 9),
+            search.Match(38, 0, 6),
+        ])
+        self.assertEqual(self.sb.search('needle', backwards=True, limit=2), [
+            search.Match(38, 0, 6),
+            search.Match(17, 3, 9),
+        ])
+        self.assertEqual(self.sb.search(r'needle 1\d', regex=True), [search.Match(17, 3, 12)])
+
+    def test_anchored_patterns(self):
+        self.assertEqual(self.sb.search(r'^needle', regex=True), [search.Match(3, 0, 6), search.Match(38, 0, 6)])
+        self.assertEqual([m.line for m in self.sb.search(r'\d+$', regex=True)], list(range(40)))
+        # \s could take the line break, if lines were searched together.
+        self.assertEqual(self.sb.search(r'\s*\d7$', regex=True), [
+            search.Match(17, 9, 12),
+            search.Match(27, 4, 7),
+            search.Match(37, 4, 7),
+        ])
+
+    def test_after_compact(self):
+        self.sb.compact(20)
+        self.assertEqual(self.sb.first_line, 15)
+        self.assertEqual([m.line for m in self.sb.search('needle')], [17, 38])
+        self.assertEqual(self.sb.get_text(17 - self.sb.first_line), '中 needle 17')
@@ -0,0 +1,43 @@
+import unittest
+
+from vterm import core
+
+
+class ScreenSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.vt = core.VTerm(core.Size(rows=4, cols=12))
+        self.vt.input_write('plain \x1b[1;31mbold\x1b[m\r\n\x1b[4;44munder\x1b[m 中 é\r\n\x1b[7mrev'.encode('utf-8'))
+
+    def assert_matches_get_cell(self, snapshot):
+        rect = snapshot.rect
+        for row in range(rect.start_row, rect.end_row):
+            for col in range(rect.start_col, rect.end_col):
+                pos = core.Pos(row=row, col=col)
+                self.assertEqual(snapshot.get_cell(pos), self.vt.screen_get_cell(pos), pos)
+
+    def test_whole_screen(self):
+        self.assert_matches_get_cell(self.vt.screen_snapshot())
+
+    def test_rect(self):
+        self.assert_matches_get_cell(self.vt.screen_snapshot(core.Rect(start_row=1, end_row=3, start_col=2, end_col=9)))
+
+    def test_reuse(self):
+        rect = core.Rect(start_row=0, end_row=2, start_col=0, end_col=6)
+        snapshot = self.vt.screen_snapshot(rect)
+        self.vt.input_write(b'\x1b[H\x1b[32mGREEN!')
+        self.assertIs(self.vt.screen_snapshot(rect, out=snapshot), snapshot)
+        self.assert_matches_get_cell(snapshot)
+        self.assertEqual(snapshot.get_chars(core.Pos(row=0, col=0)), 'G')
+        with self.assertRaises(ValueError):
+            self.vt.screen_snapshot(core.Rect(start_row=0, end_row=1, start_col=0, end_col=6), out=snapshot)
+
+    def test_wide_and_combining(self):
+        snapshot = self.vt.screen_snapshot()
+        self.assertEqual(snapshot.get_chars(core.Pos(row=1, col=6)), '中')
+        self.assertEqual(snapshot.get_width(core.Pos(row=1, col=6)), 2)
+        self.assertEqual(snapshot.get_chars(core.Pos(row=1, col=9)), 'é')
+        self.assertEqual(snapshot.get_attrs(core.Pos(row=0, col=6)).bold, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+from vterm import core
+
+
+def _rgb(color):
+    return (color.red, color.green, color.blue)
+
+
+class ScreenGetSpansTest(unittest.TestCase):
+    def setUp(self):
+        self.size = core.Size(rows=3, cols=12)
+        self.vt = core.VTerm(self.size)
+        self.vt.input_write('plain \x1b[1;31mbold\x1b[m\r\n\x1b[4;44munder\x1b[m 中 é\r\n\x1b[7mrev'.encode('utf-8'))
+
+    def test_spans_match_cells(self):
+        for row, spans in enumerate(self.vt.screen_get_spans()):
+            self.assertEqual(spans[0][0], 0)
+            self.assertEqual(spans[-1][1], self.size.cols)
+            rect = core.Rect(start_row=row, end_row=row + 1, start_col=0, end_col=self.size.cols)
+            text = self.vt.screen_get_text(rect).decode('utf-8').rstrip(' ')
+            self.assertEqual(''.join(span[3] for span in spans).rstrip(' '), text)
+            for (start_col, end_col, style_id, _), following in zip(spans, spans[1:] + [None]):
+                if following is not None:
+                    self.assertEqual(end_col, following[0])
+                style = self.vt.screen_get_style(style_id)
+                for col in range(start_col, end_col):
+                    cell = self.vt.screen_get_cell(core.Pos(row=row, col=col))
+                    self.assertEqual(cell.attrs, style.attrs, (row, col))
+                    self.assertEqual((_rgb(cell.fg), _rgb(cell.bg)), (_rgb(style.fg), _rgb(style.bg)), (row, col))
+
+    def test_style_ids(self):
+        spans = self.vt.screen_get_spans()
+        bold = spans[0][1]
+        self.assertEqual(bold[3], 'bold')
+        self.assertEqual(self.vt.screen_get_style(bold[2]).attrs.bold, 1)
+        self.vt.input_write(b'\x1b[H\x1b[2Kx\x1b[1;31my')
+        self.assertEqual(self.vt.screen_get_spans()[0][1][2], bold[2])
+
+    def test_rect_is_clipped(self):
+        rect = core.Rect(start_row=-1, end_row=10, start_col=-3, end_col=40)
+        self.assertEqual(self.vt.screen_get_spans(rect), self.vt.screen_get_spans())
+        rect = core.Rect(start_row=1, end_row=10, start_col=6, end_col=40)
+        spans = self.vt.screen_get_spans(rect)
+        self.assertEqual(len(spans), 2)
+        self.assertEqual(spans[0][0][0], 6)
+        self.assertEqual(spans[0][-1][1], self.size.cols)
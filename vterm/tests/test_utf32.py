@@ -0,0 +1,57 @@
+import unittest
+
+from vterm import c, core
+
+
+# Wide, and beyond the BMP.
+_WIDE = '\U00020000'
+_E_ACUTE = 'e\u0301'
+_STACKED = 'a\u0323\u0301\u0308'
+
+
+class _Glyphs(core.StateCallbacks):
+    def __init__(self, vt):
+        super().__init__(vt)
+        self.glyphs = []
+
+    def putglyph(self, info, pos):
+        self.glyphs.append((info.chars, info.width))
+        return 1
+
+
+class DecodeUTF32Test(unittest.TestCase):
+    ''' Cell text beyond the BMP, and with combining characters, must
+        come back whole from every way of reading it.
+    '''
+    def setUp(self):
+        self.vt = core.VTerm(core.Size(rows=2, cols=12))
+        self.text = 'x' + _WIDE + _E_ACUTE + _STACKED + '中'
+
+    def write(self):
+        self.vt.input_write(self.text.encode('utf-8'))
+
+    def test_read_str(self):
+        for text in ['', 'a', _WIDE, _E_ACUTE, _STACKED, '\ud800']:
+            chars = c.ffi.new('uint32_t[]', [ord(ch) for ch in text] + [0])
+            self.assertEqual(core._read_str(chars, max_len=c.VTERM_MAX_CHARS_PER_CELL), text)
+        chars = c.ffi.new('uint32_t[]', [ord(ch) for ch in _STACKED])
+        self.assertEqual(core._read_str(chars, max_len=2), _STACKED[:2])
+
+    def test_cells(self):
+        self.write()
+        cells = [self.vt.screen_get_cell(core.Pos(row=0, col=col)) for col in range(8)]
+        self.assertEqual([(cell.chars, cell.width) for cell in cells],
+                [('x', 1), (_WIDE, 2), ('', 1), (_E_ACUTE, 1), (_STACKED, 1), ('中', 2), ('', 1), ('', 1)])
+
+    def test_glyphs(self):
+        callbacks = _Glyphs(self.vt)
+        self.vt._state_set_callbacks(callbacks)
+        self.write()
+        self.assertEqual(callbacks.glyphs, [('x', 1), (_WIDE, 2), (_E_ACUTE, 1), (_STACKED, 1), ('中', 2)])
+
+    def test_rows(self):
+        self.write()
+        rect = core.Rect(start_row=0, end_row=1, start_col=0, end_col=12)
+        self.assertEqual(self.vt.screen_get_chars(rect), self.text)
+        self.assertEqual(self.vt.screen_get_lines(0, 1), [self.text])
+        self.assertEqual(''.join(text for _, _, _, text in self.vt.screen_get_spans(rect)[0]).rstrip(), self.text)
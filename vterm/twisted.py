@@ -2,55 +2,60 @@ import sys
 
 from twisted.internet import abstract
 from twisted.internet import fdesc
+from twisted.internet.main import CONNECTION_DONE, CONNECTION_LOST
 #from twisted.internet import reactor # delay until as late as possible
 from twisted.internet import stdio
 
-from . import core, pty
-
-
-def same_attrs(a, b):
-    return a.attrs == b.attrs and a.fg == b.fg and a.bg == b.bg
+from . import damage, pty, render
 
 
 class TwistedPtyCallbacks(pty.PtyCallbacks):
     ''' These are callbacks for the VTerm's internal events.
     '''
-    def __init__(self, vt, *, reactor, exclusive=False):
-        super().__init__(vt)
+    def __init__(self, vt, *, reactor, exclusive=False, renderer=None, max_fps=None, **kwargs):
+        ''' If `renderer` (a `render.AnsiRenderer`) is given, the screen is
+            drawn with it instead of being dumped for debugging.
+
+            If `max_fps` is given, damage is flushed at most that many
+            times per second (see `damage.DamageScheduler`) rather than
+            after every read.
+        '''
+        super().__init__(vt, **kwargs)
         self.reactor = reactor
-        self.fd = TwistedVtermPtyFileDescriptor(vt, reactor=reactor, exclusive=exclusive)
+        self.renderer = renderer
+        self.fd = TwistedVtermPtyFileDescriptor(vt, reactor=reactor, exclusive=exclusive, max_fps=max_fps)
         self.fd.startReading()
-        self.saved_cells = []
 
     def damage(self, rect):
+        if self.renderer is not None:
+            return self.renderer.damage(rect)
         print('damage', rect)
-        for row in range(rect.start_row, rect.end_row):
-            cells = []
-            col_range = iter(range(rect.start_col, rect.end_col))
-            for col in col_range:
-                cell = self.vt.get_cell(core.Pos(row=row, col=col))
-                if cell.width == 2:
-                    next(col_range)
-                if cells and same_attrs(cells[-1][0], cell):
-                    cells[-1].append(cell)
-                else:
-                    cells.append([])
-                    cells[-1].append(cell)
-            print(' cells', cells)
+        for spans in self.vt.get_spans(rect):
+            print(' spans', [(start_col, end_col, self.vt.get_style(style_id), text) for start_col, end_col, style_id, text in spans])
         return 0
     def moverect(self, dest, src):
+        if self.renderer is not None:
+            return self.renderer.moverect(dest, src)
         print('moverect', dest, src)
         return 0
     def movecursor(self, pos, oldpos, visible):
+        if self.renderer is not None:
+            return self.renderer.movecursor(pos, oldpos, visible)
         print('movecursor', pos, oldpos, visible)
         return 0
     def settermprop(self, prop, val):
+        if self.renderer is not None:
+            return self.renderer.settermprop(prop, val)
         print('settermprop', prop, val)
         return 0
     def bell(self):
+        if self.renderer is not None:
+            return self.renderer.bell()
         print('bell')
         return 0
     def resize(self, size):
+        if self.renderer is not None:
+            return self.renderer.resize(size)
         print('resize', size)
         return 0
 
@@ -58,12 +63,17 @@ class TwistedPtyCallbacks(pty.PtyCallbacks):
 class TwistedVtermPtyFileDescriptor(abstract.FileDescriptor):
     ''' These are callbacks for file descriptor events.
     '''
-    def __init__(self, vt, *, reactor, exclusive=False):
+    def __init__(self, vt, *, reactor, exclusive=False, max_fps=None):
         super().__init__(reactor=reactor)
         self.vt = vt
         self.exclusive = exclusive
+        self.scheduler = None
+        if max_fps is not None:
+            self.scheduler = damage.DamageScheduler(vt, reactor.callLater, max_fps=max_fps, on_flush=self._damage_flushed)
 
     def connectionLost(self, reason):
+        if self.scheduler is not None:
+            self.scheduler.close()
         if self.exclusive:
             self.reactor.stop()
 
@@ -71,11 +81,37 @@ class TwistedVtermPtyFileDescriptor(abstract.FileDescriptor):
         return fdesc.writeToFD(self.fileno(), data)
 
     def doRead(self):
-        rv = fdesc.readFromFD(self.fileno(), self.vt.input_write)
+        # Like fdesc.readFromFD, but into the VTerm's own buffer.
+        try:
+            n = self.vt.input_from_fd(self.fileno())
+        except (BlockingIOError, InterruptedError):
+            return None
+        except OSError:
+            return CONNECTION_LOST
+        if not n:
+            return CONNECTION_DONE
         o = self.vt.output_read()
         self.write(o)
-        self.vt.flush_damage()
-        return rv
+        if self.scheduler is None:
+            self.vt.flush_damage()
+            self._damage_flushed()
+        else:
+            self.scheduler.input_processed(n)
+        return None
+
+    def _damage_flushed(self):
+        renderer = self.vt.callbacks.renderer
+        if renderer is not None:
+            renderer.render()
+
+    def user_input(self, data):
+        ''' Send what the user typed to the program.
+        '''
+        if self.vt.recorder is not None:
+            self.vt.recorder.input(data)
+        self.write(data)
+        if self.scheduler is not None:
+            self.scheduler.user_input()
 
     def fileno(self):
         return self.vt._master_fd
@@ -90,12 +126,17 @@ class TwistedTieProto():
         pass
 
     def dataReceived(self, data):
-        self.fd.write(data)
+        self.fd.user_input(data)
 
     def connectionLost(self, reason):
         pass
 
 
+def _write_stdout(data):
+    sys.stdout.buffer.write(data)
+    sys.stdout.buffer.flush()
+
+
 def main():
     want_stdio = sys.argv[1] != '--no-stdio'
     if not want_stdio:
@@ -104,9 +145,9 @@ def main():
     # for use with `python -i`
     global reactor, vt, tie_proto, tie_stdio
     from twisted.internet import reactor
-    vt = pty.VTermPty(sys.argv[1:], callbacks_cls=TwistedPtyCallbacks, reactor=reactor, exclusive=True)
-    vt.set_damage_merge(core.DamageSize.SCROLL)
+    vt = pty.VTermPty(sys.argv[1:], callbacks_cls=TwistedPtyCallbacks, reactor=reactor, exclusive=True, max_fps=60)
     if want_stdio:
+        vt.callbacks.renderer = render.AnsiRenderer(vt, _write_stdout)
         tie_proto = TwistedTieProto(vt.callbacks.fd)
         tie_stdio = stdio.StandardIO(tie_proto, reactor=reactor)
         tie_stdio.startReading()